@@ -0,0 +1,105 @@
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from youcademy.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class UserSnapshot:
+    """
+        Compact copy of the User fields the API needs to authenticate a request.
+    """
+    __slots__ = ('user_id', 'email', 'is_active', 'is_staff')
+
+    fields = __slots__
+
+    def __init__(self, user_id, email, is_active, is_staff):
+        self.user_id = user_id
+        self.email = email
+        self.is_active = is_active
+        self.is_staff = is_staff
+
+    def __getstate__(self):
+        return tuple(getattr(self, field) for field in self.fields)
+
+    def __setstate__(self, state):
+        for field, value in zip(self.fields, state):
+            setattr(self, field, value)
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.user_id, user.email, user.is_active, user.is_staff)
+
+    def to_user(self):
+        """
+        Rebuild a User instance without a query. Fields outside the snapshot
+        are deferred, so views that need them load them on first access.
+        """
+        return User.from_db(DEFAULT_DB_ALIAS, self.fields, self.__getstate__())
+
+
+class UserCache:
+    """
+        Shared cache of user snapshots keyed by the `user_id` claim.
+        Entries are dropped by the User post_save/post_delete signals.
+    """
+    cache_prefix = 'auth:user'
+
+    @property
+    def ttl(self) -> int:
+        return getattr(settings, 'USER_CACHE_TTL', 300)
+
+    def key(self, user_id) -> str:
+        return f'{self.cache_prefix}:{user_id}'
+
+    def get(self, user_id):
+        return cache.get(self.key(user_id))
+
+    def set(self, user) -> None:
+        cache.set(self.key(user.user_id), UserSnapshot.from_user(user), self.ttl)
+
+    def invalidate(self, user_id) -> None:
+        cache.delete(self.key(user_id))
+
+
+# Shared user cache used by CachedJWTAuthentication
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+        JWTAuthentication that resolves the token's user from the user cache,
+        so hot endpoints authenticate without a database query.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation by password hash needs the full row
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        snapshot = user_cache.get(user_id)
+        record_cache('user_snapshot', snapshot is not None)
+        if snapshot is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+            return user
+
+        if not snapshot.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return snapshot.to_user()
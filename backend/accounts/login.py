@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from django.core.cache import cache
+from django.utils.crypto import get_random_string
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class LoginEngine:
+    """
+        Verifies email/password credentials for the login endpoint.
+        - Looks the user up exactly once by email.
+        - Runs password hashing on a bounded thread pool, so it can be awaited from ASGI code.
+        - Hashes against a dummy password for unknown emails so response times don't leak which emails exist.
+        - Remembers recently failed credentials for a short TTL so repeated failures skip the hasher.
+        - Stands in for the password backends of AUTHENTICATION_BACKENDS (ModelBackend and
+          allauth's check the same email and password) and, like `django.contrib.auth.authenticate`,
+          sends `user_login_failed` on failure so auditing and lockout receivers still see it.
+    """
+    cache_prefix = 'login:failed'
+
+    def __init__(self, max_workers: Optional[int] = None, failure_ttl: Optional[int] = None):
+        self._max_workers = max_workers
+        self._failure_ttl = failure_ttl
+        self._executor = None
+        self._dummy_hashes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers or getattr(settings, 'LOGIN_PASSWORD_WORKERS', 4)
+
+    @property
+    def failure_ttl(self) -> int:
+        if self._failure_ttl is not None:
+            return self._failure_ttl
+        return getattr(settings, 'LOGIN_FAILURE_CACHE_TTL', 30)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='login-hasher'
+                    )
+        return self._executor
+
+    def _dummy_hash(self) -> str:
+        """
+        Return a per-process password hash made with the default hasher.
+
+        Unknown emails are checked against it so they cost as much as a real user.
+        """
+        algorithm = get_hasher().algorithm
+        encoded = self._dummy_hashes.get(algorithm)
+        if encoded is None:
+            encoded = make_password(get_random_string(32))
+            self._dummy_hashes[algorithm] = encoded
+        return encoded
+
+    def _failure_key(self, email: str, password: str, encoded: str) -> str:
+        """
+        Build the negative-cache key for a set of credentials.
+
+        The stored hash is part of the digest, so a password change (or a new
+        registration for an unknown email) never hits a stale entry.
+        """
+        message = '\x00'.join((email, password, encoded)).encode()
+        digest = hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+        return f'{self.cache_prefix}:{digest}'
+
+    def _lookup(self, email: str):
+        try:
+            return User.objects.get(email=email)
+        except User.DoesNotExist:
+            return None
+
+    async def _alookup(self, email: str):
+        try:
+            return await User.objects.aget(email=email)
+        except User.DoesNotExist:
+            return None
+
+    def _prepare(self, user, email: str, password: str):
+        encoded = user.password if user is not None and user.password else self._dummy_hash()
+        return encoded, self._failure_key(email, password, encoded)
+
+    def _needs_rehash(self, user, encoded: str) -> bool:
+        if user is None:
+            return False
+        try:
+            return identify_hasher(encoded).must_update(encoded)
+        except ValueError:
+            return False
+
+    def _failed(self, email: str, request):
+        # Credentials as django.contrib.auth.authenticate sends them, without the password
+        return {'sender': 'django.contrib.auth', 'credentials': {'email': email}, 'request': request}
+
+    def authenticate(self, email: str, password: str, request=None):
+        """
+        Verify credentials and return the matching active user, or None.
+
+        Args:
+            email: Email address the user registered with
+            password: Raw password from the request
+            request: The login request, passed on to `user_login_failed` receivers
+
+        Returns:
+            User instance on success, None otherwise
+        """
+        user = self._lookup(email)
+        encoded, key = self._prepare(user, email, password)
+        if cache.get(key):
+            logger.debug("Login rejected from failure cache")
+            user_login_failed.send(**self._failed(email, request))
+            return None
+
+        verified = self.executor.submit(check_password, password, encoded).result()
+        if verified and self._needs_rehash(user, encoded):
+            user.set_password(password)
+            user.save(update_fields=['password'])
+        if verified and user is not None and user.is_active:
+            return user
+        cache.set(key, True, self.failure_ttl)
+        user_login_failed.send(**self._failed(email, request))
+        return None
+
+    async def aauthenticate(self, email: str, password: str, request=None):
+        """
+        Async counterpart of `authenticate` for ASGI callers.
+
+        The hashing runs on the engine's thread pool and is awaited, so the
+        event loop stays free while PBKDF2 runs.
+        """
+        user = await self._alookup(email)
+        encoded, key = self._prepare(user, email, password)
+        if await cache.aget(key):
+            logger.debug("Login rejected from failure cache")
+            await user_login_failed.asend(**self._failed(email, request))
+            return None
+
+        future = self.executor.submit(check_password, password, encoded)
+        verified = await asyncio.wrap_future(future)
+        if verified and self._needs_rehash(user, encoded):
+            user.set_password(password)
+            await user.asave(update_fields=['password'])
+        if verified and user is not None and user.is_active:
+            return user
+        await cache.aset(key, True, self.failure_ttl)
+        await user_login_failed.asend(**self._failed(email, request))
+        return None
+
+
+# Shared engine used by the login views
+login_engine = LoginEngine()
@@ -0,0 +1,128 @@
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from youcademy.log import JSONFormatter, QueueingHandler, RequestIDFilter, RotatingFileHandler, SamplingFilter, request_id
+
+ERRORS = {
+    'email': ['Email is already in use.'],
+    'password': [
+        'Password must contain at least one uppercase letter.',
+        'Password must contain at least one special character.',
+    ],
+    'phone_number': ['Enter a valid phone number (9-15 digits, optionally starting with +).'],
+}
+
+
+def before(logger, email):
+    # What a registration, a failed registration and a login logged before
+    logger.info(f"Registration attempt for email: {email}")
+    logger.info(f"Successfully created new user: {email}")
+    logger.info(f"Successfully registered user: {email}")
+    logger.info(f"Registration attempt for email: {email}")
+    logger.warning(f"Attempted to use existing email: {email}")
+    logger.warning(f"Registration failed due to validation errors: {ERRORS}")
+    logger.info(f"Login attempt for email: {email}")
+    logger.info(f"Successful login for user: {email}")
+
+
+def after(logger, email):
+    logger.info("Registration attempt for email: %s", email)
+    logger.info("Successfully created new user: %s", email)
+    logger.info("Successfully registered user: %s", email)
+    logger.info("Registration attempt for email: %s", email)
+    logger.warning("Attempted to use existing email: %s", email)
+    logger.warning("Registration failed validation on: %s", ", ".join(ERRORS), extra={'invalid_fields': sorted(ERRORS)})
+    logger.info("Login attempt for email: %s", email)
+    logger.info("Successful login for user: %s", email)
+
+
+class Command(BaseCommand):
+    help = "Measure the logging cost per request on the request thread: synchronous file logging vs the queued JSON pipeline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help="Simulated requests per configuration.")
+        parser.add_argument('--sample-rate', type=float, default=0.1, help="INFO sample rate for the sampled run.")
+        parser.add_argument('--write-latency', type=float, default=0.0,
+                            help="Simulated seconds per write, for slow disks or a blocked log pipe.")
+
+    def handle(self, *args, **options):
+        self.requests = options['requests']
+        self.latency = options['write_latency']
+        self.stdout.write(
+            f"{'configuration':<34}{'µs/request':>12}{'cpu µs':>10}{'p99 µs':>10}{'drain s':>10}{'lines':>10}"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            self._run('file, eager f-strings', before, directory, self._file_handler)
+            self._run('queued JSON', after, directory, self._queued())
+            self._run(f"queued JSON, INFO sampled {options['sample_rate']:g}", after, directory,
+                      self._queued(options['sample_rate']))
+
+    def _file_handler(self, path):
+        # The previous settings.LOGGING 'file' handler
+        handler = self._slow(logging.FileHandler(path))
+        handler.setFormatter(logging.Formatter('{levelname} {asctime} {module} {process:d} {thread:d} {message}', style='{'))
+        return handler
+
+    def _queued(self, rate=1.0):
+        def build(path):
+            target = self._slow(RotatingFileHandler(path, max_bytes=0, when='midnight'))
+            target.setFormatter(JSONFormatter())
+            target.set_name(f'bench-{os.path.basename(path)}')
+            handler = QueueingHandler([target.name], queue_size=100000)
+            handler.addFilter(RequestIDFilter())
+            handler.addFilter(SamplingFilter(rate))
+            handler.target = target  # Keeps the weakly registered target alive
+            return handler
+        return build
+
+    def _slow(self, handler):
+        if self.latency:
+            emit = handler.emit
+
+            def slow_emit(record):
+                time.sleep(self.latency)
+                emit(record)
+            handler.emit = slow_emit
+        return handler
+
+    def _run(self, name, emit, directory, build):
+        run = len(os.listdir(directory))
+        path = os.path.join(directory, f'{run}.log')
+        handler = build(path)
+        logger = logging.getLogger(f'bench.logging.{run}')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+
+        timings = []
+        cpu = 0.0
+        try:
+            for i in range(self.requests):
+                token = request_id.set(f'{i:032x}')
+                started, started_cpu = time.perf_counter(), time.thread_time()
+                emit(logger, f'user{i}@example.com')
+                cpu += time.thread_time() - started_cpu
+                timings.append(time.perf_counter() - started)
+                request_id.reset(token)
+            started = time.perf_counter()
+            if isinstance(handler, QueueingHandler):
+                handler.flush_and_stop()
+            drained = time.perf_counter() - started
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+            getattr(handler, 'target', handler).close()
+
+        with open(path, encoding='utf-8') as log:
+            lines = sum(1 for _ in log)
+        timings.sort()
+        self.stdout.write(
+            f"{name:<34}{statistics.fmean(timings) * 1e6:>12.1f}{cpu / self.requests * 1e6:>10.1f}"
+            f"{timings[int(len(timings) * 0.99)] * 1e6:>10.1f}"
+            f"{drained:>10.2f}{lines:>10}"
+        )
@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from accounts.login import LoginEngine
+
+User = get_user_model()
+
+BENCH_DOMAIN = 'bench-login.youcademy.invalid'
+BENCH_PASSWORD = 'Bench#Passw0rd'
+
+
+class Command(BaseCommand):
+    help = "Benchmark logins per second for the legacy login path and the login engine."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help="Number of throwaway users to create.")
+        parser.add_argument('--attempts', type=int, default=200, help="Login attempts per scenario.")
+        parser.add_argument('--threads', type=int, default=4, help="Concurrent client threads.")
+
+    def handle(self, *args, **options):
+        users = options['users']
+        attempts = options['attempts']
+        threads = options['threads']
+
+        encoded = make_password(BENCH_PASSWORD)
+        emails = [f'user{i}@{BENCH_DOMAIN}' for i in range(users)]
+        User.objects.bulk_create([User(email=email, password=encoded) for email in emails])
+
+        try:
+            backend = ModelBackend()
+            engine = LoginEngine(max_workers=threads)
+
+            def legacy(email, password):
+                # What UserLoginAPIView did before: an existence check, then authenticate()
+                try:
+                    User.objects.get(email=email)
+                except User.DoesNotExist:
+                    return None
+                return backend.authenticate(None, email=email, password=password)
+
+            scenarios = [
+                ('valid credentials', lambda i: (emails[i % users], BENCH_PASSWORD)),
+                ('repeated wrong password', lambda i: (emails[i % users], 'wrong-password')),
+                ('unknown email', lambda i: (f'missing{i % users}@{BENCH_DOMAIN}', BENCH_PASSWORD)),
+            ]
+
+            self.stdout.write(f"{'scenario':<26}{'legacy/s':>12}{'engine/s':>12}{'speedup':>10}")
+            for name, credentials in scenarios:
+                cache.clear()
+                before = self._run(legacy, credentials, attempts, threads)
+                cache.clear()
+                after = self._run(engine.authenticate, credentials, attempts, threads)
+                self.stdout.write(f"{name:<26}{before:>12.1f}{after:>12.1f}{after / before:>9.2f}x")
+        finally:
+            User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').delete()
+
+    def _run(self, login, credentials, attempts, threads):
+        """
+        Run `attempts` logins over `threads` client threads and return logins per second.
+        """
+        def attempt(i):
+            login(*credentials(i))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(attempt, range(attempts)))
+        return attempts / (time.perf_counter() - started)
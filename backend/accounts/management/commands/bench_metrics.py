@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import resolve
+
+from youcademy.metrics import MetricsMiddleware, Registry, _time_query, registry
+
+
+def per_call(function, repeat) -> float:
+    """
+    Best of five runs, in microseconds per call.
+    """
+    runs = []
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        runs.append((time.perf_counter() - started) / repeat * 1e6)
+    return min(runs)
+
+
+class Command(BaseCommand):
+    help = "Measure what recording metrics costs per request, per query and per scrape."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help="Calls per measurement.")
+        parser.add_argument('--threads', type=int, default=4, help="Threads recording at once in the contention run.")
+        parser.add_argument('--workers', type=int, default=16, help="Simulated worker files per scrape.")
+
+    def handle(self, *args, **options):
+        repeat = options['requests']
+        self.stdout.write(f"{'measurement':<44}{'µs':>10}")
+
+        request = RequestFactory().get('/content/notes/')
+        request.resolver_match = resolve('/content/notes/')
+        response = HttpResponse()
+
+        def view(request):
+            return response
+        middleware = MetricsMiddleware(view)
+        bare = per_call(lambda: view(request), repeat)
+        measured = per_call(lambda: middleware(request), repeat)
+        self._row('request, no middleware', bare)
+        self._row('request through MetricsMiddleware', measured)
+        self._row('  recording overhead per request', measured - bare)
+
+        with connection.cursor() as cursor:
+            def query():
+                cursor.execute('SELECT 1')
+            connection.execute_wrappers[:] = [w for w in connection.execute_wrappers if w is not _time_query]
+            plain = per_call(query, repeat)
+            connection.execute_wrappers.insert(0, _time_query)
+            timed = per_call(query, repeat)
+        self._row('SELECT 1', plain)
+        self._row('  timing overhead per query', timed - plain)
+
+        self._row('histogram observe, 1 thread', self._contended(1, repeat))
+        self._row(f"histogram observe, {options['threads']} threads at once", self._contended(options['threads'], repeat))
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            # Every worker with this process's series (each route, status and cache seen so far)
+            registry.flush()
+            own = os.path.join(directory, f'{os.getpid()}.json')
+            for pid in range(options['workers']):
+                shutil.copyfile(own, os.path.join(directory, f'{pid}.json'))
+            os.remove(own)
+            scrape = per_call(registry.render, 20)
+        self._row(f"scrape merging {options['workers']} worker files", scrape)
+
+    def _contended(self, threads, repeat) -> float:
+        """
+        Wall time per observation with `threads` threads recording at once.
+        """
+        histogram = Registry().histogram('bench_seconds', "Bench.", ('route',))
+
+        def record():
+            for index in range(repeat):
+                histogram.observe(index / repeat, 'route')
+        workers = [threading.Thread(target=record) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        if histogram.get('route')[1] != threads * repeat:
+            raise CommandError("Observations were lost between threads")
+        return elapsed / (threads * repeat) * 1e6
+
+    def _row(self, name, micros):
+        self.stdout.write(f"{name:<44}{micros:>10.2f}")
+
@@ -0,0 +1,41 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import AnonRateThrottle
+
+from accounts.throttling import AnonThrottle
+
+
+class Command(BaseCommand):
+    help = "Measure per-check throttle overhead: DRF's timestamp-list throttle against the sliding window counter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=2000, help="Timed checks per scenario.")
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/'))
+        request.user = AnonymousUser()
+        checks = options['checks']
+
+        self.stdout.write(f"{'requests already in window':<30}{'drf us/check':>14}{'sliding us/check':>18}")
+        for history in (10, 1_000, 10_000, 50_000):
+            # High enough that every timed check is allowed and recorded
+            rate = f'{history + checks * 2}/day'
+            results = [self._measure(type('BenchThrottle', (throttle_class,), {'rate': rate}), request, history, checks)
+                       for throttle_class in (AnonRateThrottle, AnonThrottle)]
+            self.stdout.write(f"{history:<30,}{results[0]:>14.1f}{results[1]:>18.1f}")
+        cache.clear()
+
+    def _measure(self, throttle_class, request, history, checks):
+        cache.clear()
+        throttle = throttle_class()
+        for _ in range(history):
+            throttle.allow_request(request, None)
+        started = time.perf_counter()
+        for _ in range(checks):
+            throttle.allow_request(request, None)
+        return (time.perf_counter() - started) / checks * 1e6
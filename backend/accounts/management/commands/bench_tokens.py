@@ -0,0 +1,60 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.tokens import CustomRefreshToken, TokenMinter
+
+User = get_user_model()
+
+
+def legacy_generate_tokens(user):
+    # generate_tokens as it was before the minter; builds an extra access token and throws it away
+    refresh = CustomRefreshToken.for_user(user)
+    refresh.set_exp(lifetime=settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'])
+    refresh.access_token.set_exp(lifetime=settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'])
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token)
+    }
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark token minting (tokens per second on a single core)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help="Number of in-memory users to mint for.")
+        parser.add_argument('--rounds', type=int, default=3, help="Rounds per variant; the best one is reported.")
+
+    def handle(self, *args, **options):
+        # Every variant records its refresh tokens as outstanding, so the users are saved, then rolled back
+        with transaction.atomic():
+            self._run(options)
+            transaction.set_rollback(True)
+
+    def _run(self, options):
+        users = User.objects.bulk_create(
+            [User(user_id=uuid.uuid4(), email=f'bench{i}@example.com') for i in range(options['users'])]
+        )
+        minter = TokenMinter()
+
+        variants = [
+            ('legacy generate_tokens', lambda: [legacy_generate_tokens(user) for user in users]),
+            ('TokenMinter.mint', lambda: [minter.mint(user) for user in users]),
+            ('TokenMinter.mint_many', lambda: minter.mint_many(users)),
+        ]
+
+        self.stdout.write(f"{'variant':<26}{'pairs/s':>12}{'tokens/s':>12}")
+        for name, run in variants:
+            best = min(self._time(run) for _ in range(options['rounds']))
+            pairs = len(users) / best
+            # Both paths hand out two tokens per pair
+            self.stdout.write(f"{name:<26}{pairs:>12.0f}{pairs * 2:>12.0f}")
+
+    def _time(self, run):
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
@@ -0,0 +1,191 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from accounts.models import UserProfile
+from accounts.serializers import UserImportSerializer
+
+User = get_user_model()
+
+
+def _init_worker():
+    # Spawned workers need the app registry for the password hashers
+    django.setup()
+
+
+def read_rows(path, fmt):
+    """
+    Stream (row_number, row) pairs from a CSV or NDJSON file without loading it.
+    """
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(handle), start=1):
+                yield number, row
+        else:
+            for number, line in enumerate(handle, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, {'__error__': f'Invalid JSON: {e}'}
+                    continue
+                if not isinstance(row, dict):
+                    row = {'__error__': f'Expected a JSON object, got {type(row).__name__}'}
+                yield number, row
+
+
+class Command(BaseCommand):
+    help = "Bulk-import users from a CSV or NDJSON file with parallel password hashing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or NDJSON file with one user per row.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Input format (default: from the file extension).")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per transaction.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Hashing processes (0 hashes in this process).")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <path>.checkpoint).")
+        parser.add_argument('--errors', help="Per-row error report as NDJSON (default: <path>.errors.ndjson).")
+        parser.add_argument('--resume', action='store_true', help="Skip rows committed by a previous run.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        batch_size = options['batch_size']
+        self.checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        errors_path = options['errors'] or f'{path}.errors.ndjson'
+
+        start_after = self._read_checkpoint(path) if options['resume'] else 0
+        if start_after:
+            self.stdout.write(f"Resuming after row {start_after}")
+
+        self.seen_emails = set()
+        self.imported = 0
+        self.failed = 0
+        self.workers = workers = options['workers']
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers else None
+
+        started = time.perf_counter()
+        try:
+            with open(errors_path, 'a' if options['resume'] else 'w', encoding='utf-8') as errors:
+                self.errors = errors
+                rows = ((number, row) for number, row in read_rows(path, fmt) if number > start_after)
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    self._import_batch(batch, pool)
+                    self._write_checkpoint(path, batch[-1][0])
+                    self.stdout.write(f"Committed through row {batch[-1][0]} ({self.imported} imported)")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        rate = self.imported / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.imported} users, {self.failed} rejected in {elapsed:.1f}s ({rate:.0f} users/s)"
+        ))
+        if self.failed:
+            self.stdout.write(f"Error report: {errors_path}")
+
+    def _import_batch(self, batch, pool):
+        valid = []
+        for number, row in batch:
+            if '__error__' in row:
+                self._reject(number, row, {'row': [row['__error__']]})
+                continue
+            data = dict(row)
+            data.setdefault('password_confirmation', data.get('password'))
+            serializer = UserImportSerializer(data=data)
+            if not serializer.is_valid():
+                self._reject(number, row, serializer.errors)
+                continue
+            validated = serializer.validated_data
+            email = validated['email']
+            if email in self.seen_emails:
+                self._reject(number, row, {'email': ['Duplicate email in import file.']})
+                continue
+            self.seen_emails.add(email)
+            valid.append((number, row, validated))
+
+        # One query per batch for uniqueness against existing users
+        existing = set(User.objects.filter(
+            email__in=[validated['email'] for _, _, validated in valid]
+        ).values_list('email', flat=True))
+        rows = []
+        for number, row, validated in valid:
+            if validated['email'] in existing:
+                self._reject(number, row, {'email': ['Email is already in use.']})
+            else:
+                rows.append((number, row, validated))
+        if not rows:
+            return
+
+        passwords = [validated['password'] for _, _, validated in rows]
+        if pool is None:
+            hashes = [make_password(password) for password in passwords]
+        else:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashes = list(pool.map(make_password, passwords, chunksize=chunksize))
+
+        users = []
+        for (number, row, validated), encoded in zip(rows, hashes):
+            fields = {key: value for key, value in validated.items() if key not in ('password', 'password_confirmation')}
+            users.append((number, row, User(password=encoded, **fields)))
+
+        try:
+            with transaction.atomic():
+                self._write([user for _, _, user in users])
+            self.imported += len(users)
+        except IntegrityError:
+            # Someone registered one of these emails meanwhile; isolate the offending rows
+            for number, row, user in users:
+                try:
+                    with transaction.atomic():
+                        self._write([user])
+                    self.imported += 1
+                except IntegrityError as e:
+                    self._reject(number, row, {'non_field_errors': [str(e)]})
+
+    def _write(self, users):
+        # bulk_create skips post_save, so profiles are written here instead of by the signal
+        User.objects.bulk_create(users)
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+
+    def _reject(self, number, row, errors):
+        self.failed += 1
+        record = {
+            'row': number,
+            'email': row.get('email') if isinstance(row, dict) else None,
+            'errors': errors,
+        }
+        self.errors.write(json.dumps(record, default=str) + '\n')
+
+    def _read_checkpoint(self, path):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as handle:
+                checkpoint = json.load(handle)
+        except FileNotFoundError:
+            return 0
+        if checkpoint.get('source') != os.path.abspath(path):
+            raise CommandError(f"Checkpoint {self.checkpoint_path} belongs to {checkpoint.get('source')}")
+        return checkpoint['row']
+
+    def _write_checkpoint(self, path, row):
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump({'source': os.path.abspath(path), 'row': row}, handle)
+        os.replace(temporary, self.checkpoint_path)
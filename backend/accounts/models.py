@@ -1,10 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from .managers import UserManager
-from .utils import generate_user_id 
+from .utils import DirtyFieldsMixin, generate_user_id
 
 # User model
-class User(AbstractUser):
+class User(DirtyFieldsMixin, AbstractUser):
     user_id = models.UUIDField(primary_key=True, default=generate_user_id, editable=False, unique=True)
     username = None
     email = models.EmailField(unique=True)
@@ -26,7 +26,7 @@ class User(AbstractUser):
         return f'{self.first_name} {self.last_name}'
     
 # User profile
-class UserProfile(models.Model):
+class UserProfile(DirtyFieldsMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='userprofile')
     profile_picture = models.ImageField(upload_to="profile_pictures/", blank=True, null=True)
     bio = models.TextField(blank=True, null=True)
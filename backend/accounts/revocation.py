@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+        Fixed-size Bloom filter over strings.
+        - No false negatives: if `jti in filter` is False the JTI was never added.
+        - False positives happen at roughly `error_rate` once `capacity` items are in.
+    """
+    __slots__ = ('size', 'hash_count', 'bits', 'count')
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: two 64-bit halves of one digest give all k positions
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationFilter:
+    """
+        Answers "is this refresh token revoked?" by JTI without touching the
+        database in the common case.
+        - An in-process Bloom filter holds every blacklisted JTI; a miss means "not revoked".
+        - Possible hits are confirmed against the shared cache, then the database.
+        - New revocations are broadcast through the shared cache as a numbered log
+          that every process replays before answering.
+        - The Bloom filter is rebuilt from the database periodically, which also
+          drops expired and un-blacklisted JTIs.
+    """
+    cache_prefix = 'revocation'
+
+    def __init__(self, rebuild_interval=None, capacity=None, error_rate=None):
+        self._rebuild_interval = rebuild_interval
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._bloom = None
+        self._generation = 0
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rebuild_interval(self) -> int:
+        return self._rebuild_interval or getattr(settings, 'TOKEN_REVOCATION_REBUILD_INTERVAL', 300)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity or getattr(settings, 'TOKEN_REVOCATION_CAPACITY', 100000)
+
+    @property
+    def error_rate(self) -> float:
+        return self._error_rate or getattr(settings, 'TOKEN_REVOCATION_ERROR_RATE', 0.001)
+
+    def _key(self, *parts) -> str:
+        return ':'.join((self.cache_prefix,) + tuple(str(part) for part in parts))
+
+    @property
+    def _log_ttl(self) -> int:
+        # Log entries only need to outlive the next rebuild in every process
+        return self.rebuild_interval * 2
+
+    @property
+    def _hit_ttl(self) -> int:
+        return int(settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'].total_seconds())
+
+    def rebuild(self) -> None:
+        """
+        Reload every unexpired blacklisted JTI from the database into a fresh filter.
+        """
+        with self._lock:
+            # Read the generation first so revocations racing with the load are replayed
+            generation = cache.get(self._key('generation'), 0)
+            jtis = list(
+                BlacklistedToken.objects
+                .filter(token__expires_at__gt=timezone.now())
+                .values_list('token__jti', flat=True)
+            )
+            bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+            self._bloom = bloom
+            self._generation = generation
+            self._built_at = time.monotonic()
+        logger.info("Rebuilt token revocation filter with %s entries", len(jtis))
+
+    def _sync(self) -> None:
+        """
+        Make the local filter current: rebuild when stale, otherwise replay the
+        shared revocation log since the last generation seen.
+        """
+        if self._bloom is None or time.monotonic() - self._built_at > self.rebuild_interval:
+            self.rebuild()
+            return
+
+        generation = cache.get(self._key('generation'), 0)
+        if generation <= self._generation:
+            if generation < self._generation:
+                # The shared cache was flushed; our view may be ahead of it
+                self.rebuild()
+            return
+
+        keys = [self._key('log', number) for number in range(self._generation + 1, generation + 1)]
+        entries = cache.get_many(keys)
+        if len(entries) < len(keys):
+            # Some entries expired or are not written yet; the database is authoritative
+            self.rebuild()
+            return
+        with self._lock:
+            for key in keys:
+                self._bloom.add(entries[key])
+            self._generation = max(self._generation, generation)
+
+    def is_revoked(self, jti: str) -> bool:
+        """
+        Check whether the token with this JTI has been blacklisted.
+
+        Args:
+            jti: The token's JTI claim
+
+        Returns:
+            True if the token is revoked, False otherwise
+        """
+        if not jti:
+            return False
+        self._sync()
+        if jti not in self._bloom:
+            return False
+
+        hit_key = self._key('jti', jti)
+        if cache.get(hit_key):
+            return True
+        revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        if revoked:
+            cache.set(hit_key, True, self._hit_ttl)
+        return revoked
+
+    def revoke(self, jti: str) -> None:
+        """
+        Record a new revocation locally and broadcast it to other processes.
+
+        Call this after the BlacklistedToken row has been written.
+        """
+        cache.set(self._key('jti', jti), True, self._hit_ttl)
+        generation_key = self._key('generation')
+        cache.add(generation_key, 0, None)
+        try:
+            generation = cache.incr(generation_key)
+        except ValueError:
+            # The key was evicted between add and incr; the next sync will rebuild
+            generation = None
+        if generation is not None:
+            cache.set(self._key('log', generation), jti, self._log_ttl)
+
+        if self._bloom is not None:
+            with self._lock:
+                self._bloom.add(jti)
+
+    def forget(self, jti: str) -> None:
+        """
+        Drop the confirmed-hit cache entry for a JTI that is no longer blacklisted.
+
+        Bloom filters cannot delete, so the JTI stays a (cheap) possible match
+        until the next rebuild, where the database check answers "not revoked".
+        """
+        cache.delete(self._key('jti', jti))
+
+
+# Shared filter used by token verification
+revocation_filter = RevocationFilter()
@@ -4,6 +4,11 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.contrib.auth.hashers import make_password
 from django.core.validators import EmailValidator
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer, TokenVerifySerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from .revocation import revocation_filter
+from .tokens import CustomRefreshToken
 import re
 import logging
 
@@ -33,11 +38,11 @@ class UserSerializer(serializers.ModelSerializer):
         try:
             email_validator(value)
             if User.objects.filter(email=value).exists():
-                logger.warning(f"Attempted to use existing email: {value}")
+                logger.warning("Attempted to use existing email: %s", value)
                 raise ValidationError('Email is already in use.')
             return value
         except ValidationError as e:
-            logger.warning(f"Invalid email format: {value}")
+            logger.warning("Invalid email format: %s", value)
             raise ValidationError('Enter a valid email address.')
     
     def validate_phone_number(self, value: str) -> str:
@@ -55,7 +60,7 @@ class UserSerializer(serializers.ModelSerializer):
         """
         phone_pattern = r'^\+?1?\d{9,15}$'
         if not value or not re.match(phone_pattern, value):
-            logger.warning(f"Invalid phone number format: {value}")
+            logger.warning("Invalid phone number format: %s", value)
             raise ValidationError('Enter a valid phone number (9-15 digits, optionally starting with +).')
         return value
 
@@ -136,15 +141,26 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         try:
             validated_data.pop('password_confirmation')
             password = validated_data.pop('password')
-            user = User.objects.create(**validated_data)
+            # Hash before the first save so the user (and its profile) is written once
+            user = User(**validated_data)
             user.set_password(password)
             user.save()
-            logger.info(f"Successfully created new user: {user.email}")
+            logger.info("Successfully created new user: %s", user.email)
             return user
         except Exception as e:
-            logger.error(f"Failed to create user: {str(e)}")
+            logger.error("Failed to create user: %s", e)
             raise
 
+# User import serializer
+class UserImportSerializer(UserRegistrationSerializer):
+    """
+    Registration rules for bulk imports. Email uniqueness is checked per batch
+    by the importer instead of with one query per row.
+    """
+    class Meta(UserRegistrationSerializer.Meta):
+        extra_kwargs = {'email': {'validators': []}}
+
+
 # User update serializer
 class UserUpdateSerializer(serializers.ModelSerializer):
     """
@@ -172,11 +188,11 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             try:
                 email_validator(value)
                 if User.objects.filter(email=value).exists():
-                    logger.warning(f"Update attempted with existing email: {value}")
+                    logger.warning("Update attempted with existing email: %s", value)
                     raise ValidationError('Email is already in use.')
                 return value
             except ValidationError:
-                logger.warning(f"Invalid email format in update: {value}")
+                logger.warning("Invalid email format in update: %s", value)
                 raise ValidationError('Enter a valid email address.')
         return value
     
@@ -193,7 +209,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         if value:
             phone_pattern = r'^\+?1?\d{9,15}$'
             if not re.match(phone_pattern, value):
-                logger.warning(f"Invalid phone number format in update: {value}")
+                logger.warning("Invalid phone number format in update: %s", value)
                 raise ValidationError('Enter a valid phone number (9-15 digits, optionally starting with +).')
         return value
     
@@ -236,5 +252,25 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         instance.phone_number = validated_data.get('phone_number', instance.phone_number)
         instance.is_active = validated_data.get('is_active', instance.is_active)
         instance.is_staff = validated_data.get('is_staff', instance.is_staff)
-        instance.save()
-        return instance        
\ No newline at end of file
+        instance.save_dirty()  # Only write the columns that changed
+        return instance
+
+
+# Token refresh serializer
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh serializer whose revocation check goes through the revocation filter.
+    """
+    token_class = CustomRefreshToken
+
+
+# Token verify serializer
+class CustomTokenVerifySerializer(TokenVerifySerializer):
+    """
+    Verify serializer whose revocation check goes through the revocation filter.
+    """
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        token = UntypedToken(attrs['token'])
+        if revocation_filter.is_revoked(token.get(jwt_api_settings.JTI_CLAIM)):
+            raise serializers.ValidationError('Token is blacklisted')
+        return {}
@@ -1,7 +1,10 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .authentication import user_cache
 from .models import UserProfile
+from .revocation import revocation_filter
 import logging
 
 # For handling error reporting
@@ -23,23 +26,30 @@ def create_user_profile(sender, instance, created, **kwargs):
         if created:  # Only create the profile if the user is newly created
             UserProfile.objects.create(user=instance)  # Create a new UserProfile associated with the user
     except Exception as e:
-        logger.error(f"Error creating UserProfile for {instance}: {e}")
+        logger.error("Error creating UserProfile for %s: %s", instance, e)
 
 # Signal to save the UserProfile whenever the associated User instance is saved
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, created, **kwargs):
     """
     This function is triggered after a User instance is saved. 
-    It ensures that the associated UserProfile is saved whenever the User is saved.
+    It saves the associated UserProfile only when it is already loaded on the
+    user and has unsaved changes, so plain User saves (e.g. last_login updates)
+    cost no profile queries.
     
     Args:
         sender: The model class that sent the signal (in this case, the custom user model).
         instance: The actual instance of the user model that was saved.
+        created: A boolean indicating whether the instance was created (True) or updated (False).
     """
+    if created or not sender._meta.get_field('userprofile').is_cached(instance):
+        return  # New profiles are written by create_user_profile; unloaded ones can't be dirty
+    
     try:
-        instance.userprofile.save()  # Save the related UserProfile instance to reflect changes
+        if instance.userprofile.save_dirty():
+            logger.info("Saved changed UserProfile fields for %s", instance.email)
     except UserProfile.DoesNotExist:
-        logger.warning(f"UserProfile for {instance} does not exist, skipping save.")
+        logger.warning("UserProfile for %s does not exist, skipping save.", instance)
 
 # Automatically delete UserProfile when CustomUser is deleted
 @receiver(post_delete, sender=settings.AUTH_USER_MODEL)
@@ -55,4 +65,46 @@ def delete_user_profile(sender, instance, **kwargs):
     try:
         instance.userprofile.delete()  # Delete the associated UserProfile
     except UserProfile.DoesNotExist:
-        logger.info(f"UserProfile for {instance} does not exist, nothing to delete.")  # Log if the profile doesn't exist
\ No newline at end of file
+        logger.info("UserProfile for %s does not exist, nothing to delete.", instance)  # Log if the profile doesn't exist
+
+# Drop the cached authentication snapshot whenever the user changes
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    This function is triggered after a User instance is saved or deleted.
+    It removes that user's entry from the authentication user cache.
+    
+    Args:
+        sender: The model class that sent the signal (in this case, the custom user model).
+        instance: The actual instance of the user model that was saved or deleted.
+    """
+    user_cache.invalidate(instance.user_id)
+
+# Broadcast new refresh-token revocations to the revocation filter
+@receiver(post_save, sender=BlacklistedToken)
+def broadcast_token_revocation(sender, instance, created, **kwargs):
+    """
+    This function is triggered after a BlacklistedToken is saved.
+    New entries are pushed to the revocation filter so every process stops accepting the token.
+    
+    Args:
+        sender: The model class that sent the signal (BlacklistedToken).
+        instance: The BlacklistedToken instance that was saved.
+        created: A boolean indicating whether the instance was created (True) or updated (False).
+    """
+    if created:
+        revocation_filter.revoke(instance.token.jti)
+
+# Clear the confirmed-revocation cache when a blacklist entry is removed
+@receiver(post_delete, sender=BlacklistedToken)
+def forget_token_revocation(sender, instance, **kwargs):
+    """
+    This function is triggered after a BlacklistedToken is deleted.
+    It removes the cached revocation so the token is checked against the database again.
+    
+    Args:
+        sender: The model class that sent the signal (BlacklistedToken).
+        instance: The BlacklistedToken instance that was deleted.
+    """
+    revocation_filter.forget(instance.token.jti)
@@ -1,3 +1,455 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .authentication import CachedJWTAuthentication, UserSnapshot
+from .login import LoginEngine
+from .models import UserProfile
+from .revocation import BloomFilter, RevocationFilter
+from .serializers import CustomTokenRefreshSerializer, UserUpdateSerializer
+from .throttling import ScopedThrottle
+from .tokens import TokenMinter, blacklist_token, generate_tokens
+from .views import UserLoginAPIView
+
+User = get_user_model()
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LoginEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.engine = LoginEngine(max_workers=2)
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+
+    def test_valid_credentials_use_a_single_query(self):
+        with self.assertNumQueries(1):
+            user = self.engine.authenticate('ada@example.com', 'Secret#123')
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_unknown_email_is_hashed_against_dummy_password(self):
+        with mock.patch('accounts.login.check_password', return_value=False) as check:
+            self.assertIsNone(self.engine.authenticate('nobody@example.com', 'Secret#123'))
+        check.assert_called_once()
+
+    def test_repeated_failures_are_served_from_cache(self):
+        self.assertIsNone(self.engine.authenticate('ada@example.com', 'wrong'))
+        with mock.patch('accounts.login.check_password') as check:
+            self.assertIsNone(self.engine.authenticate('ada@example.com', 'wrong'))
+        check.assert_not_called()
+
+    def test_password_change_bypasses_cached_failure(self):
+        self.assertIsNone(self.engine.authenticate('ada@example.com', 'New#Secret1'))
+        self.user.set_password('New#Secret1')
+        self.user.save()
+        self.assertIsNotNone(self.engine.authenticate('ada@example.com', 'New#Secret1'))
+
+    def test_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.engine.authenticate('ada@example.com', 'Secret#123'))
+
+    def test_async_authenticate(self):
+        user = async_to_sync(self.engine.aauthenticate)('ada@example.com', 'Secret#123')
+        self.assertEqual(user.pk, self.user.pk)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class UserLoginAPIViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User.objects.create_user(email='ada@example.com', password='Secret#123')
+
+    def test_login_returns_tokens(self):
+        response = self.client.post(
+            reverse('user-login'), {'email': 'ada@example.com', 'password': 'Secret#123'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data['data'])
+        self.assertIn('refresh', response.data['data'])
+
+    def test_invalid_credentials(self):
+        response = self.client.post(
+            reverse('user-login'), {'email': 'ada@example.com', 'password': 'nope'}, format='json'
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_the_password_check_is_awaited(self):
+        self.assertTrue(UserLoginAPIView.view_is_async)
+        with mock.patch.object(LoginEngine, 'authenticate', side_effect=AssertionError('blocking call')):
+            response = self.client.post(
+                reverse('user-login'), {'email': 'ada@example.com', 'password': 'Secret#123'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_failed_logins_send_the_signal(self):
+        failures = []
+
+        def receiver(sender, credentials, request, **kwargs):
+            failures.append((credentials, request.path))
+
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        for _ in range(2):  # The second failure is served from the failure cache
+            self.client.post(reverse('user-login'), {'email': 'ada@example.com', 'password': 'nope'}, format='json')
+        self.assertEqual(failures, [({'email': 'ada@example.com'}, reverse('user-login'))] * 2)
+
+
+class TokenMinterTests(TestCase):
+    def setUp(self):
+        self.minter = TokenMinter()
+        self.user = User.objects.create(email='ada@example.com')
+
+    def test_minted_tokens_validate_with_simplejwt(self):
+        tokens = self.minter.mint(self.user)
+        access = AccessToken(tokens['access'])
+        refresh = RefreshToken(tokens['refresh'])
+        self.assertEqual(access['user_id'], str(self.user.user_id))
+        self.assertEqual(refresh['user_id'], str(self.user.user_id))
+        self.assertNotEqual(access['jti'], refresh['jti'])
+
+    def test_lifetimes_follow_settings(self):
+        tokens = self.minter.mint(self.user)
+        access = AccessToken(tokens['access'])
+        refresh = RefreshToken(tokens['refresh'])
+        self.assertEqual(access['exp'] - access['iat'], settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds())
+        self.assertEqual(refresh['exp'] - refresh['iat'], settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'].total_seconds())
+
+    def test_each_token_is_signed_once(self):
+        context = self.minter.context
+        with mock.patch.object(context.algorithm, 'sign', wraps=context.algorithm.sign) as sign:
+            self.minter.mint(self.user)
+        self.assertEqual(sign.call_count, 2)
+
+    def test_mint_many(self):
+        users = User.objects.bulk_create([User(email=f'user{i}@example.com') for i in range(5)])
+        with self.assertNumQueries(1):
+            issued = self.minter.mint_many(users)
+        self.assertEqual(len(issued), 5)
+        for user, tokens in zip(users, issued):
+            self.assertEqual(AccessToken(tokens['access'])['user_id'], str(user.user_id))
+
+    def test_refresh_tokens_are_recorded_as_outstanding(self):
+        tokens = self.minter.mint(self.user)
+        refresh = RefreshToken(tokens['refresh'])
+        outstanding = OutstandingToken.objects.get(jti=refresh['jti'])
+        self.assertEqual((outstanding.user_id, outstanding.token), (self.user.pk, tokens['refresh']))
+        self.assertEqual(outstanding.expires_at.timestamp(), refresh['exp'])
+        # So revoking a user's outstanding tokens covers minted ones
+        for token in OutstandingToken.objects.filter(user=self.user):
+            RefreshToken(token.token).blacklist()
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=refresh['jti']).exists())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RevocationFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.filter = RevocationFilter(capacity=1000)
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.refresh = generate_tokens(self.user)['refresh']
+        self.jti = RefreshToken(self.refresh)['jti']
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(500)
+        items = [f'jti-{i}' for i in range(500)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_unrevoked_token_skips_database(self):
+        self.filter.rebuild()
+        with self.assertNumQueries(0):
+            self.assertFalse(self.filter.is_revoked(self.jti))
+
+    def test_revocation_is_broadcast_to_other_processes(self):
+        other = RevocationFilter(capacity=1000)
+        other.rebuild()
+        self.filter.rebuild()
+        with mock.patch('accounts.signals.revocation_filter', self.filter):
+            self.assertTrue(blacklist_token(self.refresh))
+        with self.assertNumQueries(0):
+            self.assertTrue(other.is_revoked(self.jti))
+
+    def test_rebuild_loads_blacklist_from_database(self):
+        blacklist_token(self.refresh)
+        cache.clear()
+        fresh = RevocationFilter(capacity=1000)
+        self.assertTrue(fresh.is_revoked(self.jti))
+
+    def test_refresh_serializer_rejects_blacklisted_token(self):
+        serializer = CustomTokenRefreshSerializer(data={'refresh': self.refresh})
+        self.assertTrue(serializer.is_valid())
+        blacklist_token(self.refresh)
+        with self.assertRaises(TokenError):
+            CustomTokenRefreshSerializer(data={'refresh': self.refresh}).is_valid()
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.access = generate_tokens(self.user)['access']
+        self.authentication = CachedJWTAuthentication()
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        user, _ = self.authentication.authenticate(request)
+        return user
+
+    def test_second_request_needs_no_query(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, 'ada@example.com')
+        self.assertTrue(user.is_authenticated)
+
+    def test_save_invalidates_snapshot(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_delete_invalidates_snapshot(self):
+        self.authenticate()
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deferred_fields_load_on_access(self):
+        self.user.first_name = 'Ada'
+        self.user.save()
+        self.authenticate()
+        user = self.authenticate()
+        with self.assertNumQueries(1):
+            self.assertEqual(user.first_name, 'Ada')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryCountTests(TestCase):
+    """
+    Locks in how many queries the main account flows take.
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def register(self, email='grace@example.com'):
+        return self.client.post(reverse('user-registration'), {
+            'first_name': 'Grace',
+            'last_name': 'Hopper',
+            'email': email,
+            'phone_number': '+123456789',
+            'password': 'Secret#123',
+            'password_confirmation': 'Secret#123',
+        }, format='json')
+
+    def test_register(self):
+        # Email uniqueness check, user INSERT, profile INSERT
+        with self.assertNumQueries(3):
+            response = self.register()
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(UserProfile.objects.filter(user__email='grace@example.com').exists())
+
+    def test_login(self):
+        self.register()
+        # The user lookup, and the refresh token's OutstandingToken row
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                reverse('user-login'), {'email': 'grace@example.com', 'password': 'Secret#123'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_update(self):
+        self.register()
+        user = User.objects.get(email='grace@example.com')
+        serializer = UserUpdateSerializer(user, data={'first_name': 'Amazing Grace'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        # A single UPDATE of the changed column; the profile is untouched
+        with self.assertNumQueries(1):
+            serializer.save()
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, 'Amazing Grace')
+
+    def test_update_of_a_user_from_the_token_cache(self):
+        self.register()
+        user = User.objects.get(email='grace@example.com')
+        access = generate_tokens(user)['access']
+        for _ in range(2):  # The second request is served from the user cache
+            request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+            cached, _ = CachedJWTAuthentication().authenticate(request)
+        self.assertIn('first_name', cached.get_deferred_fields())
+        serializer = UserUpdateSerializer(cached, data={'first_name': 'Amazing Grace'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, 'Amazing Grace')
+
+        cached = UserSnapshot.from_user(user).to_user()
+        cached.last_name = 'Hopper'  # Assigned without being loaded
+        cached.save_dirty()
+        self.assertEqual(User.objects.get(pk=user.pk).last_name, 'Hopper')
+
+    def test_unchanged_update_writes_nothing(self):
+        self.register()
+        user = User.objects.get(email='grace@example.com')
+        with self.assertNumQueries(0):
+            user.save_dirty()
+
+    def test_last_login_update_skips_profile(self):
+        self.register()
+        user = User.objects.get(email='grace@example.com')
+        with self.assertNumQueries(1):
+            update_last_login(None, user)
+
+    def test_loaded_profile_changes_are_saved_with_user(self):
+        self.register()
+        user = User.objects.select_related('userprofile').get(email='grace@example.com')
+        user.userprofile.bio = 'Compiler pioneer'
+        user.first_name = 'Rear Admiral'
+        user.save()
+        self.assertEqual(UserProfile.objects.get(user=user).bio, 'Compiler pioneer')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ImportUsersCommandTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        User.objects.create_user(email='taken@example.com', password='Secret#123')
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_csv_import_with_error_report(self):
+        path = self.write('users.csv', [
+            'first_name,last_name,email,password',
+            'Ada,Lovelace,ada@example.com,Secret#123',
+            'Alan,Turing,alan@example.com,weak',
+            'Taken,User,taken@example.com,Secret#123',
+            'Ada,Again,ada@example.com,Secret#123',
+            'Grace,Hopper,grace@example.com,Secret#123',
+        ])
+        call_command('import_users', path, workers=2, batch_size=2, stdout=StringIO())
+
+        self.assertEqual(User.objects.filter(email__in=['ada@example.com', 'grace@example.com']).count(), 2)
+        self.assertEqual(UserProfile.objects.filter(user__email='grace@example.com').count(), 1)
+        self.assertTrue(User.objects.get(email='ada@example.com').check_password('Secret#123'))
+        with open(f'{path}.errors.ndjson', encoding='utf-8') as handle:
+            rejected = [json.loads(line)['row'] for line in handle]
+        self.assertEqual(sorted(rejected), [2, 3, 4])
+
+    def test_resume_skips_committed_rows(self):
+        path = self.write('users.ndjson', [
+            json.dumps({'email': 'ada@example.com', 'password': 'Secret#123'}),
+            json.dumps({'email': 'alan@example.com', 'password': 'Secret#123'}),
+        ])
+        with open(f'{path}.checkpoint', 'w', encoding='utf-8') as handle:
+            json.dump({'source': os.path.abspath(path), 'row': 1}, handle)
+        call_command('import_users', path, workers=0, resume=True, stdout=StringIO())
+
+        self.assertFalse(User.objects.filter(email='ada@example.com').exists())
+        self.assertTrue(User.objects.filter(email='alan@example.com').exists())
+
+    def test_ndjson_rows_that_are_not_objects_are_reported(self):
+        path = self.write('users.ndjson', [
+            '[1, 2]',
+            '"ada@example.com"',
+            '5',
+            json.dumps({'email': 'alan@example.com', 'password': 'Secret#123'}),
+        ])
+        call_command('import_users', path, workers=0, stdout=StringIO())
+
+        self.assertTrue(User.objects.filter(email='alan@example.com').exists())
+        with open(f'{path}.errors.ndjson', encoding='utf-8') as handle:
+            rejected = [json.loads(line)['row'] for line in handle]
+        self.assertEqual(rejected, [1, 2, 3])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User.objects.create_user(email='ada@example.com', password='Secret#123')
+
+    def check(self, throttle, now):
+        view = mock.Mock(throttle_scope='login')
+        throttle.timer = lambda: now
+        return throttle.allow_request(Request(APIRequestFactory().post('/')), view)
+
+    @override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={'login': '4/min'}))
+    def test_sliding_window_counts_previous_window(self):
+        throttle = ScopedThrottle()
+        self.assertEqual(sum(self.check(throttle, 600.0 + i) for i in range(12)), 4)
+        # 49s to the next window, then 15s until the old requests weigh less than 3
+        self.assertEqual(throttle.wait(), 64)
+        # Half-way through the next window half of the old requests still count
+        self.assertEqual(sum(self.check(throttle, 690.0) for _ in range(6)), 2)
+        self.assertEqual(throttle.wait(), 15)
+
+    def test_login_is_throttled_per_account_with_retry_after(self):
+        for _ in range(5):
+            response = self.client.post(reverse('user-login'), {'email': 'ada@example.com', 'password': 'nope'}, format='json')
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post(reverse('user-login'), {'email': 'ADA@example.com', 'password': 'Secret#123'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Other accounts are still reachable from the same address, up to the per-IP limit
+        response = self.client.post(reverse('user-login'), {'email': 'grace@example.com', 'password': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 401)
+        for _ in range(4):
+            self.client.post(reverse('user-login'), {'email': 'x@example.com', 'password': 'nope'}, format='json')
+        response = self.client.post(reverse('token_obtain_pair'), {'email': 'y@example.com', 'password': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_other_clients_failures_dont_lock_the_account_out(self):
+        for _ in range(5):
+            response = self.client.post(
+                reverse('user-login'), {'email': 'ada@example.com', 'password': 'nope'}, format='json', REMOTE_ADDR='10.0.0.2'
+            )
+            self.assertEqual(response.status_code, 401)
+        for _ in range(3):  # Successful logins don't count
+            response = self.client.post(reverse('user-login'), {'email': 'ada@example.com', 'password': 'Secret#123'}, format='json')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            reverse('user-login'), {'email': 'ada@example.com', 'password': 'Secret#123'}, format='json', REMOTE_ADDR='10.0.0.2'
+        )
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=dict(settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], login_account='6/15m'),
+    ))
+    def test_failures_from_many_addresses_hit_the_account_limit(self):
+        for address in range(6):
+            response = self.client.post(
+                reverse('user-login'), {'email': 'ada@example.com', 'password': 'nope'}, format='json',
+                REMOTE_ADDR=f'10.0.0.{address}',
+            )
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post(reverse('user-login'), {'email': 'ada@example.com', 'password': 'Secret#123'}, format='json')
+        self.assertEqual(response.status_code, 429)
@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import math
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+_RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])')
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+        Sliding-window-counter throttle on a shared cache.
+        - Each window of `duration` seconds has one counter, bumped with an atomic
+          `incr`; the estimate weights the previous window's count by how much of
+          it still overlaps the sliding window. Two cache calls per check, however
+          high the rate.
+        - Counters live in THROTTLE_CACHE, which must be shared (Redis, Memcached)
+          for limits to hold across workers.
+        - Rejected requests aren't counted, and a cache outage lets requests through.
+        - Rates accept a period multiplier, e.g. '5/15m'.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+        super().__init__()
+
+    def get_rate(self):
+        # Read the rates on each use rather than at import, so overrides apply
+        self.THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+        return super().get_rate()
+
+    def parse_rate(self, rate):
+        if rate is None:
+            return (None, None)
+        match = _RATE_RE.match(rate)
+        if match is None:
+            raise ValueError(f"Invalid throttle rate '{rate}'")
+        count, multiplier, period = match.groups()
+        return int(count), int(multiplier or 1) * _PERIODS[period]
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def _incr(self, key, timeout):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            if self.cache.add(key, 1, timeout):
+                return 1
+            return self.cache.incr(key)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, offset = divmod(self.now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        try:
+            self.current = self._incr(current_key, self.duration * 2)
+            self.previous = self.cache.get(f'{self.key}:{int(window) - 1}', 0)
+            self.overlap = 1 - offset / self.duration
+            if self.previous * self.overlap + self.current <= self.num_requests:
+                return True
+            self.cache.decr(current_key)
+        except Exception as e:
+            logger.warning("Throttle cache unavailable, allowing request: %s", e)
+            return True
+        self.current -= 1
+        return self.throttle_failure()
+
+    def wait(self):
+        """
+        Seconds until the estimate drops enough to admit one more request.
+        """
+        elapsed = (1 - self.overlap) * self.duration
+        room = self.num_requests - 1 - self.current
+        if room >= 0 and self.previous:
+            # The previous window's weight has to fall to `room`
+            seconds = self.duration * (1 - room / self.previous) - elapsed
+        else:
+            # Wait for this window to end, then for it to fade as the previous one
+            seconds = self.duration - elapsed
+            if self.current:
+                seconds += self.duration * max(0.0, 1 - (self.num_requests - 1) / self.current)
+        return max(1, math.ceil(seconds))
+
+
+class AnonThrottle(SlidingWindowThrottle):
+    """
+        Limits anonymous clients by IP address (scope `anon`).
+    """
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident_key(request)
+
+
+class UserThrottle(SlidingWindowThrottle):
+    """
+        Limits authenticated users: writes by scope `user`, reads (safe methods)
+        by the looser scope `user_read`.
+    """
+    scope = 'user'
+
+    def allow_request(self, request, view):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            self.scope = 'user_read'
+            self.rate = self.get_rate()
+            self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return self.get_ident_key(request)
+
+
+class ScopedThrottle(SlidingWindowThrottle):
+    """
+        Per-endpoint limit named by the view's `throttle_scope`, per user or IP.
+    """
+
+    def __init__(self):
+        # The rate depends on the view, so it is resolved in allow_request
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scope', None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        return self.get_ident_key(request)
+
+
+class FailedLoginThrottle(SlidingWindowThrottle):
+    """
+        Base for the per-account login limits. Only failed attempts count: the
+        login views call `record_failure()` once the credentials are rejected,
+        so someone else's guesses never make a correct password count against
+        the limit.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, offset = divmod(self.now, self.duration)
+        try:
+            self.current = self.cache.get(f'{self.key}:{int(window)}', 0)
+            self.previous = self.cache.get(f'{self.key}:{int(window) - 1}', 0)
+        except Exception as e:
+            logger.warning("Throttle cache unavailable, allowing request: %s", e)
+            return True
+        self.overlap = 1 - offset / self.duration
+        if self.previous * self.overlap + self.current < self.num_requests:
+            return True
+        return self.throttle_failure()
+
+    def record_failure(self, request):
+        key = self.get_cache_key(request, None)
+        if self.rate is None or key is None:
+            return
+        try:
+            self._incr(f'{key}:{int(self.timer() // self.duration)}', self.duration * 2)
+        except Exception as e:
+            logger.warning("Throttle cache unavailable, failed login not counted: %s", e)
+
+    def email_ident(self, request):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return hashlib.blake2b(email.strip().lower().encode(), digest_size=16).hexdigest()
+
+
+class LoginEmailThrottle(FailedLoginThrottle):
+    """
+        Limits failed logins per target account and address (scope `login_email`).
+    """
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        email = self.email_ident(request)
+        if email is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': f'{email}:{self.get_ident(request)}'}
+
+
+class LoginAccountThrottle(FailedLoginThrottle):
+    """
+        Looser limit on failed logins per target account from any address (scope
+        `login_account`), so guessing one user's password from many IPs is
+        throttled too.
+    """
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        email = self.email_ident(request)
+        if email is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': email}
+
+
+def record_failed_login(view, request):
+    """
+    Count a rejected login against the view's per-account limits.
+    """
+    for throttle in view.get_throttles():
+        if isinstance(throttle, FailedLoginThrottle):
+            throttle.record_failure(request)
@@ -1,8 +1,20 @@
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import settings as jwt_settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import datetime_from_epoch, datetime_to_epoch, get_md5_hash_password
+from jwt.api_jws import PyJWS
+from jwt.utils import base64url_encode
+import json
 import logging
+import threading
 import uuid
+from .revocation import revocation_filter
 
 logger = logging.getLogger(__name__)
 
@@ -26,28 +38,201 @@ class CustomRefreshToken(RefreshToken):
             return refresh  
          
         except AttributeError:
-            logger.error(f"User object has no attribute 'user_id'. Please check the user model.")
+            logger.error("User object has no attribute 'user_id'. Please check the user model.")
             raise  
 
+    def check_blacklist(self):
+        """
+            Check revocation through the shared revocation filter instead of
+            querying BlacklistedToken on every refresh.
+        """
+        jti = self.payload.get(jwt_settings.api_settings.JTI_CLAIM)
+        if revocation_filter.is_revoked(jti):
+            raise TokenError(_("Token is blacklisted"))
+
+class _SigningContext:
+    """
+        Per-process snapshot of everything needed to sign a token:
+        claim names, lifetimes, the algorithm object, the prepared key and the
+        pre-encoded JOSE header.
+    """
+    __slots__ = (
+        'algorithm', 'key', 'header_segment', 'json_encoder', 'extra_claims',
+        'token_type_claim', 'jti_claim', 'user_id_field', 'user_id_claim',
+        'revoke_claim', 'access_lifetime', 'refresh_lifetime',
+    )
+
+    def __init__(self):
+        api_settings = jwt_settings.api_settings
+        simple_jwt = getattr(settings, 'SIMPLE_JWT', {})
+
+        self.algorithm = PyJWS().get_algorithm_by_name(api_settings.ALGORITHM)
+        self.key = self.algorithm.prepare_key(api_settings.SIGNING_KEY)
+        self.json_encoder = api_settings.JSON_ENCODER
+        header = json.dumps(
+            {'typ': 'JWT', 'alg': api_settings.ALGORITHM},
+            separators=(',', ':'), cls=self.json_encoder, sort_keys=True,
+        )
+        self.header_segment = base64url_encode(header.encode())
+
+        self.extra_claims = {}
+        if api_settings.AUDIENCE is not None:
+            self.extra_claims['aud'] = api_settings.AUDIENCE
+        if api_settings.ISSUER is not None:
+            self.extra_claims['iss'] = api_settings.ISSUER
+
+        self.token_type_claim = api_settings.TOKEN_TYPE_CLAIM
+        self.jti_claim = api_settings.JTI_CLAIM
+        self.user_id_field = api_settings.USER_ID_FIELD
+        self.user_id_claim = api_settings.USER_ID_CLAIM
+        self.revoke_claim = api_settings.REVOKE_TOKEN_CLAIM if api_settings.CHECK_REVOKE_TOKEN else None
+        self.access_lifetime = simple_jwt.get('ACCESS_TOKEN_LIFETIME', api_settings.ACCESS_TOKEN_LIFETIME)
+        self.refresh_lifetime = simple_jwt.get('REFRESH_TOKEN_LIFETIME', api_settings.REFRESH_TOKEN_LIFETIME)
+
+    def sign(self, payload):
+        """
+        Sign a payload with the cached algorithm and key. Equivalent to
+        simplejwt's TokenBackend.encode, minus the per-call lookups.
+        """
+        if self.extra_claims:
+            payload = {**payload, **self.extra_claims}
+        body = json.dumps(payload, separators=(',', ':'), cls=self.json_encoder).encode()
+        signing_input = self.header_segment + b'.' + base64url_encode(body)
+        signature = self.algorithm.sign(signing_input, self.key)
+        return (signing_input + b'.' + base64url_encode(signature)).decode('utf-8')
+
+
+class TokenMinter:
+    """
+        Mints refresh/access token pairs for users.
+        - Each token is built and signed exactly once.
+        - The signing key, algorithm object and claim settings are prepared once per process.
+        - `mint_many` issues pairs for many users in one call (SSO migrations, load tests).
+        - With the token_blacklist app installed, each refresh token gets an
+          OutstandingToken row as with `RefreshToken.for_user`; `mint_many` inserts them in bulk.
+    """
+
+    def __init__(self):
+        self._context = None
+        self._lock = threading.Lock()
+
+    @property
+    def context(self) -> _SigningContext:
+        if self._context is None:
+            with self._lock:
+                if self._context is None:
+                    self._context = _SigningContext()
+        return self._context
+
+    def reset(self):
+        """Drop the cached signing context, e.g. after SIMPLE_JWT changes."""
+        self._context = None
+
+    def _pair(self, context, user, iat, access_exp, refresh_exp):
+        user_id = str(getattr(user, context.user_id_field))
+        refresh = {
+            context.token_type_claim: 'refresh',
+            'exp': refresh_exp,
+            'iat': iat,
+            context.jti_claim: uuid.uuid4().hex,
+            context.user_id_claim: user_id,
+        }
+        access = {
+            context.token_type_claim: 'access',
+            'exp': access_exp,
+            'iat': iat,
+            context.jti_claim: uuid.uuid4().hex,
+            context.user_id_claim: user_id,
+        }
+        if context.revoke_claim:
+            refresh[context.revoke_claim] = access[context.revoke_claim] = get_md5_hash_password(user.password)
+        tokens = {
+            'refresh': context.sign(refresh),
+            'access': context.sign(access),
+        }
+        return tokens, refresh
+
+    def _record(self, context, users, issued):
+        """
+        Store the refresh tokens as outstanding, so the blacklist app's admin,
+        flushexpiredtokens and revoking a user's tokens see them.
+        """
+        if 'rest_framework_simplejwt.token_blacklist' not in settings.INSTALLED_APPS:
+            return
+        OutstandingToken.objects.bulk_create([
+            OutstandingToken(
+                user=user, jti=payload[context.jti_claim], token=tokens['refresh'],
+                created_at=datetime_from_epoch(payload['iat']), expires_at=datetime_from_epoch(payload['exp']),
+            )
+            for user, (tokens, payload) in zip(users, issued)
+        ])
+
+    def _timestamps(self, context):
+        now = timezone.now()
+        return (
+            datetime_to_epoch(now),
+            datetime_to_epoch(now + context.access_lifetime),
+            datetime_to_epoch(now + context.refresh_lifetime),
+        )
+
+    def mint(self, user):
+        """
+        Mint a refresh/access pair for a single user.
+        
+        Args:
+            user: User instance the tokens are issued for
+            
+        Returns:
+            Dictionary with signed 'refresh' and 'access' tokens
+        """
+        context = self.context
+        issued = self._pair(context, user, *self._timestamps(context))
+        self._record(context, [user], [issued])
+        return issued[0]
+
+    def mint_many(self, users):
+        """
+        Mint refresh/access pairs for many users, sharing one issue time.
+        
+        Args:
+            users: Iterable of User instances
+            
+        Returns:
+            List of token dictionaries, in the same order as `users`
+        """
+        context = self.context
+        timestamps = self._timestamps(context)
+        users = list(users)
+        issued = [self._pair(context, user, *timestamps) for user in users]
+        self._record(context, users, issued)
+        return [tokens for tokens, _ in issued]
+
+
+# Shared minter used by the login views
+token_minter = TokenMinter()
+
+
+@receiver(setting_changed)
+def reset_token_minter(setting, **kwargs):
+    if setting in ('SIMPLE_JWT', 'SECRET_KEY'):
+        token_minter.reset()
+
+
 def generate_tokens(user):
-    refresh = CustomRefreshToken.for_user(user)
-    
-    # Use the settings for token expiration times
-    refresh.set_exp(lifetime=settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'])
-    refresh.access_token.set_exp(lifetime=settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'])
-    
-    return {
-        'refresh': str(refresh),
-        'access': str(refresh.access_token)
-    }
+    return token_minter.mint(user)
+
+
+def generate_tokens_bulk(users):
+    return token_minter.mint_many(users)
     
 # Function to blacklist token
 def blacklist_token(refresh_token):
     try:
-        # Create a new BlacklistedToken entry with the refresh token
-        BlacklistedToken.objects.create(token=refresh_token)
+        # Record the token as outstanding + blacklisted; the BlacklistedToken
+        # post_save signal broadcasts the revocation to every process
+        CustomRefreshToken(refresh_token).blacklist()
         return True
     except Exception as e:
         # Log the error for debugging
-        logger.error(f"Error blacklisting token: {str(e)}")
+        logger.error("Error blacklisting token: %s", e)
         return False
\ No newline at end of file
@@ -1,16 +1,11 @@
 from django.urls import path
-from .views import UserRegistrationAPIView, UserLoginAPIView
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-    TokenVerifyView
-)
+from .views import TokenObtainPairAPIView, TokenRefreshAPIView, TokenVerifyAPIView, UserRegistrationAPIView, UserLoginAPIView
 
 urlpatterns = [
     # Token
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
+    path('api/token/', TokenObtainPairAPIView.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', TokenRefreshAPIView.as_view(), name='token_refresh'),
+    path('api/token/verify/', TokenVerifyAPIView.as_view(), name='token_verify'),
     
     # Register
     path('register/', UserRegistrationAPIView.as_view(), name='user-registration'),
@@ -1,7 +1,107 @@
 import uuid
+from django.db.models import DateTimeField
 
 def generate_user_id():
     """
     Generates a unique UUID4 user ID.
     """
-    return uuid.uuid4()
\ No newline at end of file
+    return uuid.uuid4()
+
+
+def custom_exception_handler(exc, context):
+    """
+    Wrap DRF's error responses in the API's status/message envelope.
+    
+    Args:
+        exc: The exception raised while handling the request
+        context: Dictionary with the view and request
+        
+    Returns:
+        Response object, or None for exceptions DRF doesn't handle
+    """
+    # Imported here: accounts.models imports this module before DRF can be loaded
+    from rest_framework.views import exception_handler
+    
+    response = exception_handler(exc, context)
+    if response is None:
+        return None
+    
+    data = response.data
+    if isinstance(data, dict) and set(data) <= {'detail', 'code'}:
+        response.data = {'status': 'error', 'message': str(data.get('detail', ''))}
+    else:
+        response.data = {'status': 'error', 'message': 'Request failed.', 'errors': data}
+    return response
+
+
+class DirtyFieldsMixin:
+    """
+    Model mixin that tracks which concrete fields changed since the instance
+    was loaded from the database or last saved.
+    """
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+    
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # Also how deferred fields load on first access: they get their baseline then
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot_fields(fields)
+    
+    def _snapshot_fields(self, fields=None):
+        """
+        Remember the current value of the given (or all loaded) fields.
+        """
+        deferred = self.get_deferred_fields()
+        state = getattr(self, '_saved_state', {})
+        for field in self._meta.concrete_fields:
+            if field.attname in deferred or (fields is not None and field.name not in fields and field.attname not in fields):
+                continue
+            state[field.attname] = field.value_from_object(self)
+        self._saved_state = state
+    
+    def get_dirty_fields(self):
+        """
+        Return the names of concrete fields whose value differs from the saved state.
+        A deferred field that was assigned without being loaded has no saved
+        state and counts as dirty.
+        
+        Returns:
+            List of field names; every field for instances that were never saved
+        """
+        state = getattr(self, '_saved_state', None)
+        if self._state.adding or state is None:
+            return [field.name for field in self._meta.concrete_fields]
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname not in deferred
+            and (field.attname not in state or state[field.attname] != field.value_from_object(self))
+        ]
+    
+    def save_dirty(self, **kwargs):
+        """
+        Save only the fields that changed, plus any auto_now timestamps.
+        
+        Returns:
+            True if a write happened, False if nothing was dirty
+        """
+        if self._state.adding:
+            self.save(**kwargs)
+            return True
+        dirty = self.get_dirty_fields()
+        if not dirty:
+            return False
+        auto_now = [
+            field.name for field in self._meta.concrete_fields
+            if isinstance(field, DateTimeField) and field.auto_now
+        ]
+        self.save(update_fields=set(dirty) | set(auto_now), **kwargs)
+        return True
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_fields(kwargs.get('update_fields'))
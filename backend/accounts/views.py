@@ -1,14 +1,19 @@
+import asyncio
 from typing import Any
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.request import Request
-from django.contrib.auth import get_user_model, authenticate
-from rest_framework.exceptions import ValidationError, APIException
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed, ValidationError, APIException
 from rest_framework import permissions
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
 from social_django.utils import psa
 from .serializers import UserRegistrationSerializer
 from .tokens import generate_tokens
+from .login import login_engine
+from .throttling import AnonThrottle, LoginAccountThrottle, LoginEmailThrottle, ScopedThrottle, record_failed_login
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,6 +29,8 @@ class UserRegistrationAPIView(APIView):
     """
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
+    throttle_scope = 'register'
+    query_budget = 3
     
     def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
         """
@@ -35,7 +42,7 @@ class UserRegistrationAPIView(APIView):
         Returns:
             Response object with registration status and user data
         """
-        logger.info(f"Registration attempt for email: {request.data.get('email')}")
+        logger.info("Registration attempt for email: %s", request.data.get('email'))
         
         try:
             serializer = UserRegistrationSerializer(data=request.data)
@@ -55,10 +62,12 @@ class UserRegistrationAPIView(APIView):
                     'message': 'User registered successfully.',
                     'data': user_data
                 }
-                logger.info(f"Successfully registered user: {user.email}")
+                logger.info("Successfully registered user: %s", user.email)
                 return Response(response_data, status=status.HTTP_201_CREATED)
             
-            logger.warning(f"Registration failed due to validation errors: {serializer.errors}")
+            # Field names only: the full errors echo back user input and are already in the response
+            logger.warning("Registration failed validation on: %s", ", ".join(serializer.errors),
+                           extra={'invalid_fields': sorted(serializer.errors)})
             response_data = {
                 'status': 'error',
                 'message': 'Registration failed.',
@@ -67,7 +76,7 @@ class UserRegistrationAPIView(APIView):
             return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
             
         except Exception as e:
-            logger.error(f"Registration failed with error: {str(e)}")
+            logger.error("Registration failed with error: %s", e)
             raise APIException("An error occurred during registration")
 
 
@@ -76,11 +85,39 @@ class UserLoginAPIView(APIView):
         Handles user login.
         - Authenticates the user with email and password.
         - Returns JWT tokens (access and refresh tokens) on successful login.
+        - An async view: under ASGI the password check is awaited on the login
+          engine's pool, so no request thread waits on the hasher. DRF's sync
+          steps (throttling, token minting) run through sync_to_async.
     """ 
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
+    throttle_classes = [AnonThrottle, ScopedThrottle, LoginEmailThrottle, LoginAccountThrottle]
+    throttle_scope = 'login'
+    query_budget = 2  # The user, and the refresh token's OutstandingToken row
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        APIView.dispatch, awaiting the handler. DRF has no async views yet.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
            
-    def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+    async def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
         """
         Handle POST request for user login.
         
@@ -93,34 +130,26 @@ class UserLoginAPIView(APIView):
         email = request.data.get('email')
         password = request.data.get('password')
         
-        logger.info(f"Login attempt for email: {email}")
+        logger.info("Login attempt for email: %s", email)
         
         if not email or not password:
             logger.warning("Login attempt with missing credentials")
             raise ValidationError("Email and password are required fields.")
             
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            logger.warning(f"Login attempt with non-existent email: {email}")
-            return Response(
-                {'status': 'error', 'message': 'Invalid credentials.'}, 
-                status=status.HTTP_401_UNAUTHORIZED
-            ) 
-        
-        # Authenticate the user
-        user = authenticate(request, email=email, password=password)
+        # Authenticate the user (single lookup, hashing awaited on the login engine's pool)
+        user = await login_engine.aauthenticate(email, password, request=request._request)
         
         if user is None:
-            logger.warning(f"Failed login attempt for email: {email}")
+            logger.warning("Failed login attempt for email: %s", email)
+            await sync_to_async(record_failed_login)(self, request)
             return Response(
                 {'status': 'error', 'message': 'Invalid credentials.'}, 
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
         # Generate JWT tokens for the authenticated user
-        token = generate_tokens(user)
-        logger.info(f"Successful login for user: {email}")
+        token = await sync_to_async(generate_tokens)(user)
+        logger.info("Successful login for user: %s", email)
         
         # Return response with tokens and user details
         response_data = {
@@ -145,3 +174,36 @@ class UserLoginAPIView(APIView):
             
                   
 
+
+class TokenObtainPairAPIView(TokenObtainPairView):
+    """
+        SimpleJWT's token endpoint, throttled like UserLoginAPIView since it
+        also takes a password.
+    """
+    throttle_classes = UserLoginAPIView.throttle_classes
+    throttle_scope = 'login'
+    query_budget = 3
+
+    def post(self, request, *args, **kwargs):
+        try:
+            return super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            record_failed_login(self, request)
+            raise
+
+
+class TokenRefreshAPIView(TokenRefreshView):
+    """
+        SimpleJWT's refresh endpoint, with a query budget.
+    """
+    query_budget = 4
+
+
+class TokenVerifyAPIView(TokenVerifyView):
+    """
+        SimpleJWT's verify endpoint, with a query budget. Revocation is checked
+        in memory; only a filter rebuild or a possible match queries.
+    """
+    query_budget = 2
+
+
@@ -0,0 +1,295 @@
+import atexit
+import fcntl
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils.dateparse import parse_datetime
+from youcademy import fastjson
+
+from .models import AnswerEvent, Question
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class BufferFull(Exception):
+    """
+    Raised when a process already holds ANSWER_EVENTS_MAX_PENDING unwritten events.
+    """
+
+
+def make_event(quiz_id, question_id, user_id, answer, idempotency_key, answered_at) -> list:
+    """
+    An event as it is queued and spooled: a JSON-ready list.
+    """
+    return [quiz_id, question_id, str(user_id), answer, idempotency_key, answered_at.isoformat()]
+
+
+def store_events(events, batch_size) -> int:
+    """
+    Insert events with bulk inserts of `batch_size` rows. Events already stored
+    under the same (user, idempotency_key) are skipped, so this is safe to repeat.
+
+    Returns:
+        Number of events written, counting skipped duplicates
+    """
+    rows = [
+        AnswerEvent(quiz_id=quiz_id, question_id=question_id, user_id=user_id, answer=answer,
+                    idempotency_key=idempotency_key, answered_at=parse_datetime(answered_at))
+        for quiz_id, question_id, user_id, answer, idempotency_key, answered_at in events
+    ]
+    try:
+        with transaction.atomic():
+            AnswerEvent.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    except IntegrityError:
+        # A question or user was deleted while its answers were queued
+        questions = set(Question.objects.filter(pk__in={row.question_id for row in rows}).values_list('pk', flat=True))
+        users = {str(pk) for pk in User.objects.filter(pk__in={row.user_id for row in rows}).values_list('pk', flat=True)}
+        live = [row for row in rows if row.question_id in questions and str(row.user_id) in users]
+        logger.warning("Dropped %s answer events for deleted questions or users", len(rows) - len(live))
+        rows = live
+        with transaction.atomic():
+            AnswerEvent.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    return len(rows)
+
+
+class Segment:
+    """
+        One spool file of JSON lines. Its owner holds an exclusive flock on it
+        until the events are stored, so anyone who can take the lock may replay it.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        name = f'{os.getpid()}-{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+        # Locked before it gets a name replay() looks at, so it's never taken for an orphan
+        partial = os.path.join(directory, f'{name}.tmp')
+        self.file = open(partial, 'ab')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        self.path = os.path.join(directory, f'{name}.jsonl')
+        os.replace(partial, self.path)
+
+    def append(self, content, sync=False):
+        self.file.write(content)
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def discard(self):
+        """
+        Delete the file, once its events are stored.
+        """
+        try:
+            os.remove(self.path)
+        finally:
+            self.file.close()
+
+    def release(self):
+        """
+        Give the file up for replay.
+        """
+        self.file.close()
+
+
+def replay(directory=None, batch_size=None) -> int:
+    """
+    Store the events of every spool segment no live buffer holds: those of
+    crashed workers and of flushes that failed. Each segment is deleted once
+    its events are stored; a line cut short by a crash was never acknowledged
+    and is skipped.
+
+    Returns:
+        Number of events replayed
+    """
+    directory = directory or answer_events.directory
+    batch_size = batch_size or answer_events.batch_size
+    if not os.path.isdir(directory):
+        return 0
+    replayed = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.jsonl'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            segment = open(path, 'rb')
+        except FileNotFoundError:
+            continue  # Stored and deleted by its owner
+        with segment:
+            try:
+                fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # Its owner is alive and will store it
+            if os.fstat(segment.fileno()).st_nlink == 0:
+                continue  # Deleted by its owner while we waited for the lock
+            events = []
+            for line in segment:
+                try:
+                    events.append(fastjson.loads(line))
+                except ValueError:
+                    logger.warning("Skipped a partly written answer event in %s", name)
+            replayed += store_events(events, batch_size)
+            os.remove(path)
+    if replayed:
+        logger.info("Replayed %s spooled answer events", replayed)
+    return replayed
+
+
+class AnswerEventBuffer:
+    """
+        Write-behind buffer for quiz answer events, so a live quiz costs one bulk
+        insert per batch instead of an INSERT per answer.
+        - `add()` appends the events to this process's spool file and a bounded
+          in-memory queue, then returns; the request never waits on the database.
+        - A flusher thread stores the queue once it holds ANSWER_EVENTS_BATCH_SIZE
+          events, and at least every ANSWER_EVENTS_FLUSH_INTERVAL seconds. With
+          ANSWER_EVENTS_FLUSHER off, `add()` stores a full batch on the caller's thread.
+        - At least once: a spool segment is deleted only after its events are
+          committed. Segments of crashed workers and failed flushes are replayed
+          by the flusher of any process sharing the spool directory, or by
+          `manage.py replay_answer_events`. Replays and client retries land on
+          the (user, idempotency_key) constraint and are stored once.
+        - Past ANSWER_EVENTS_MAX_PENDING queued events `add()` raises BufferFull
+          rather than grow; clients retry with the same keys.
+        - The flusher starts on first use, again in each forked worker, and the
+          queue is stored at exit.
+    """
+
+    def __init__(self):
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.stop)
+
+    def _reset(self):
+        # Also the fork handler: the parent's queue, spool file and flusher aren't the child's
+        segment = getattr(self, '_segment', None)
+        if segment is not None:
+            segment.file.close()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._pending = []
+        self._segment = None
+        self._flusher = None
+        self._pid = None
+
+    @property
+    def directory(self) -> str:
+        return getattr(settings, 'ANSWER_EVENTS_SPOOL_DIR', os.path.join(settings.BASE_DIR, 'spool', 'answer_events'))
+
+    @property
+    def batch_size(self) -> int:
+        return getattr(settings, 'ANSWER_EVENTS_BATCH_SIZE', 1000)
+
+    @property
+    def max_pending(self) -> int:
+        return getattr(settings, 'ANSWER_EVENTS_MAX_PENDING', 50000)
+
+    @property
+    def interval(self) -> float:
+        return getattr(settings, 'ANSWER_EVENTS_FLUSH_INTERVAL', 1.0)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if getattr(settings, 'ANSWER_EVENTS_FLUSHER', True):
+                self._stopping.clear()
+                self._flusher = threading.Thread(target=self._run, name='answer-events-flusher', daemon=True)
+                self._flusher.start()
+
+    def add(self, events) -> int:
+        """
+        Queue events made with make_event(). They are on disk when this returns.
+
+        Raises:
+            BufferFull: if the queue has no room for all of them (none are queued)
+
+        Returns:
+            Number of events queued
+        """
+        if self._pid != os.getpid():
+            self._start()
+        content = b''.join(fastjson.dumps(event) + b'\n' for event in events)
+        with self._lock:
+            if len(self._pending) + len(events) > self.max_pending:
+                raise BufferFull(f"{len(self._pending)} answer events are already waiting to be stored")
+            if self._segment is None:
+                self._segment = Segment(self.directory)
+            self._segment.append(content, getattr(settings, 'ANSWER_EVENTS_FSYNC', False))
+            self._pending.extend(events)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            if self._flusher is not None:
+                self._wake.set()
+            else:
+                self.flush()
+        return len(events)
+
+    def flush(self) -> int:
+        """
+        Store everything queued so far. If that fails the events stay spooled
+        for replay and the error is raised.
+
+        Returns:
+            Number of events stored
+        """
+        with self._flush_lock:
+            with self._lock:
+                segment, events = self._segment, self._pending
+                self._segment, self._pending = None, []
+            if segment is None:
+                return 0
+            try:
+                stored = store_events(events, self.batch_size)
+            except BaseException:
+                segment.release()
+                raise
+            segment.discard()
+            return stored
+
+    def _run(self):
+        next_replay = 0
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+                if time.monotonic() >= next_replay:
+                    next_replay = time.monotonic() + getattr(settings, 'ANSWER_EVENTS_REPLAY_INTERVAL', 60)
+                    replay(self.directory, self.batch_size)
+            except Exception:
+                logger.exception("Couldn't store answer events; they stay spooled for replay")
+        connection.close()
+
+    def stop(self):
+        """
+        Stop the flusher and store what is still queued.
+        """
+        flusher = self._flusher
+        if flusher is not None and self._pid == os.getpid():
+            self._stopping.set()
+            self._wake.set()
+            flusher.join()
+        self._flusher = self._pid = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Couldn't store answer events at exit; they stay spooled for replay")
+
+
+# Shared buffer used by the answer events API
+answer_events = AnswerEventBuffer()
@@ -0,0 +1,297 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from youcademy.metrics import record_cache
+
+from .llm import QUIZ_PROMPT, get_llm_client
+from .models import Question, Quiz
+from .scheduler import BACKGROUND, llm_scheduler
+from .search import get_search_backend, question_document
+from .snapshots import quiz_snapshots
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prompt or the parsing changes, so memoized results are not reused
+PROMPT_VERSION = 1
+
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+def content_hash(*parts) -> str:
+    return hashlib.sha256('\0'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def chunk_text(text, max_chars):
+    """
+    Split text into chunks of at most max_chars, on paragraph boundaries where
+    possible, then on sentence boundaries, then anywhere.
+    """
+    pieces = []
+    for paragraph in _PARAGRAPH_RE.split(text or ''):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END_RE.split(paragraph):
+            pieces.extend(sentence[start:start + max_chars] for start in range(0, len(sentence), max_chars))
+
+    chunks, current = [], ''
+    for piece in filter(None, pieces):
+        if current and len(current) + 2 + len(piece) > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f'{current}\n\n{piece}' if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def parse_questions(response):
+    """
+    Pull valid questions out of a model response, dropping malformed entries.
+    """
+    try:
+        items = json.loads(_FENCE_RE.sub('', response.strip()))
+    except (AttributeError, json.JSONDecodeError):
+        return []
+    if not isinstance(items, list):
+        return []
+    questions = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        question, choices, answer = item.get('question'), item.get('choices'), item.get('answer')
+        if not (isinstance(question, str) and question.strip() and isinstance(answer, str)):
+            continue
+        if not (isinstance(choices, list) and 2 <= len(choices) <= 5 and all(isinstance(c, str) for c in choices)):
+            continue
+        if answer not in choices or len(answer) > 255:
+            continue
+        questions.append({'question': question.strip(), 'choices': choices, 'answer': answer})
+    return questions
+
+
+@dataclass
+class GenerationReport:
+    note_id: int
+    quiz_id: int = None
+    chunks: int = 0
+    llm_calls: int = 0
+    cache_hits: int = 0
+    questions: int = 0
+    unchanged: bool = False
+    timings: dict = field(default_factory=dict)  # stage -> milliseconds
+
+    def as_dict(self):
+        return asdict(self)
+
+
+class QuizGenerator:
+    """
+        Turns a Note into a Quiz in three timed stages:
+        - chunk: split the note and hash it; an unchanged note stops here.
+        - generate: fan the chunks out to the LLM client on a bounded thread pool.
+          Responses are memoized by chunk content hash, so editing one paragraph
+          only re-generates that paragraph.
+        - write: bulk insert the questions; on a refresh, only the changed ones
+          are rewritten and answered questions are never deleted.
+    """
+    cache_prefix = 'ai:quiz-chunk'
+
+    @property
+    def chunk_size(self) -> int:
+        return getattr(settings, 'AI_QUIZ_CHUNK_SIZE', 2000)
+
+    @property
+    def questions_per_chunk(self) -> int:
+        return getattr(settings, 'AI_QUIZ_QUESTIONS_PER_CHUNK', 3)
+
+    @property
+    def concurrency(self) -> int:
+        return getattr(settings, 'AI_QUIZ_CONCURRENCY', 4)
+
+    @property
+    def cache_ttl(self) -> int:
+        return getattr(settings, 'AI_QUIZ_CACHE_TTL', 7 * 24 * 3600)
+
+    @contextmanager
+    def _stage(self, report, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            report.timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+    def generate(self, note, priority=BACKGROUND) -> GenerationReport:
+        """
+        Create or refresh the quiz generated from a note.
+
+        Args:
+            note: Note instance
+            priority: Scheduler lane for the LLM calls; INTERACTIVE when a request is waiting
+
+        Returns:
+            GenerationReport with counts and per-stage timings
+        """
+        client = llm_scheduler.client(get_llm_client(), user=note.user_id, priority=priority)
+        report = GenerationReport(note_id=note.pk)
+
+        with self._stage(report, 'chunk'):
+            chunks = chunk_text(note.content, self.chunk_size)
+            report.chunks = len(chunks)
+            source_hash = content_hash(client.model, PROMPT_VERSION, self.questions_per_chunk, note.title, note.content)
+            quiz = Quiz.objects.filter(source_note=note).first()
+        if quiz is not None and quiz.source_hash == source_hash:
+            report.quiz_id = quiz.pk
+            report.unchanged = True
+            return report
+
+        with self._stage(report, 'generate'):
+            prompts = [QUIZ_PROMPT.format(count=self.questions_per_chunk, notes=chunk) for chunk in chunks]
+            keys = [f'{self.cache_prefix}:{content_hash(client.model, PROMPT_VERSION, prompt)}' for prompt in prompts]
+            cached = cache.get_many(keys)
+            report.cache_hits = len(cached)
+            missing = [(key, prompt) for key, prompt in zip(keys, prompts) if key not in cached]
+            record_cache('quiz_chunks', len(cached), len(missing))
+            if missing:
+                responses, error = self._fan_out(client, [prompt for _, prompt in missing])
+                report.llm_calls = len(missing)
+                fresh = {
+                    key: parse_questions(response)
+                    for (key, _), response in zip(missing, responses) if response is not None
+                }
+                # Keep the chunks that succeeded, so a retry only pays for the ones that failed
+                cache.set_many(fresh, self.cache_ttl)
+                if error is not None:
+                    raise error
+                cached.update(fresh)
+            questions = [question for key in keys for question in cached[key]]
+
+        with self._stage(report, 'write'):
+            quiz = self._write(note, quiz, source_hash, questions)
+            report.quiz_id = quiz.pk
+            report.questions = len(questions)
+
+        logger.info("Generated quiz %s from note %s: %s", quiz.pk, note.pk, report.as_dict())
+        return report
+
+    def _fan_out(self, client, prompts):
+        """
+        Run the prompts with at most `concurrency` calls in flight.
+
+        Returns:
+            (responses, error): responses in prompt order, None where a call failed,
+            and the first error raised, if any
+        """
+        if len(prompts) == 1 or self.concurrency <= 1 or client.supports_batching:
+            try:
+                return client.generate_many(prompts), None
+            except Exception as e:
+                return [None] * len(prompts), e
+
+        responses, error = [], None
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(prompts)), thread_name_prefix='quiz-llm') as pool:
+            for future in [pool.submit(client.generate, prompt) for prompt in prompts]:
+                try:
+                    responses.append(future.result())
+                except Exception as e:
+                    responses.append(None)
+                    error = error or e
+        return responses, error
+
+    def _title(self, note) -> str:
+        """
+        The note's title, or the first variant of it no other quiz of the user has.
+        """
+        stem = note.title[:230]
+        taken = set(Quiz.objects.filter(user_id=note.user_id, title__startswith=stem).values_list('title', flat=True))
+        candidates = [note.title, f'{stem} (note {note.pk})']
+        candidates += (f'{stem} (note {note.pk}, {number})' for number in range(2, len(taken) + 3))
+        return next(title for title in candidates if title not in taken)
+
+    def _create_questions(self, quiz, questions) -> list:
+        return Question.objects.bulk_create([
+            Question(quiz=quiz, content=question['question'], answer_choices=question['choices'],
+                     correct_answer=question['answer'])
+            for question in questions
+        ])
+
+    def _replace_questions(self, quiz, questions) -> list:
+        """
+        Bring the quiz's questions in line with the generated ones without
+        touching what students have answered: unchanged questions stay as they
+        are, and the rest replace questions nobody has answered, rewritten in
+        place, or are appended. Questions no longer generated are deleted
+        unless they have results or answer events, which would go with them.
+
+        Returns:
+            The questions written
+        """
+        stale = {}
+        for question in quiz.questions.order_by('pk'):
+            stale.setdefault((question.content, json.dumps(question.answer_choices), question.correct_answer), []).append(question)
+        fresh = []
+        for question in questions:
+            kept = stale.get((question['question'], json.dumps(question['choices']), question['answer']))
+            if kept:
+                kept.pop(0)
+            else:
+                fresh.append(question)
+        stale = [question for kept in stale.values() for question in kept]
+        if not stale:
+            return self._create_questions(quiz, fresh)
+
+        unanswered = set(Question.objects.filter(
+            pk__in=[question.pk for question in stale], results__isnull=True, answer_events__isnull=True,
+        ).values_list('pk', flat=True))
+        reusable = [question for question in stale if question.pk in unanswered]
+        rewritten, now = [], timezone.now()
+        for question, generated in zip(reusable, fresh):
+            question.content, question.answer_choices = generated['question'], generated['choices']
+            question.correct_answer, question.updated_at = generated['answer'], now
+            rewritten.append(question)
+        Question.objects.bulk_update(rewritten, ['content', 'answer_choices', 'correct_answer', 'updated_at'])
+        created = self._create_questions(quiz, fresh[len(rewritten):])
+
+        Question.objects.filter(pk__in=[question.pk for question in reusable[len(rewritten):]]).delete()
+        answered = len(stale) - len(unanswered)
+        if answered:
+            logger.warning("Kept %s answered questions of quiz %s that its note no longer yields", answered, quiz.pk)
+        return rewritten + created
+
+    def _write(self, note, quiz, source_hash, questions):
+        with transaction.atomic():
+            if quiz is None:
+                quiz = Quiz.objects.create(
+                    user_id=note.user_id, title=self._title(note), description=f'Generated from the note "{note.title}".',
+                    source_note=note, source_hash=source_hash,
+                )
+                written = self._create_questions(quiz, questions)
+            else:
+                quiz.source_hash = source_hash
+                quiz.save(update_fields=['source_hash', 'updated_at'])
+                written = self._replace_questions(quiz, questions)
+
+            # bulk_create and bulk_update skip the signals that version the quiz and index questions
+            quiz_snapshots.bump_version(quiz.pk)
+            backend = get_search_backend()
+            if backend.is_available():
+                backend.index([question_document(question, quiz.user_id) for question in written])
+        return quiz
+
+
+# Shared generator used by the Celery task and the views
+quiz_generator = QuizGenerator()
+
@@ -0,0 +1,217 @@
+import logging
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from youcademy.metrics import record_cache
+
+from .models import QuestionResult, Quiz, QuizAttempt
+from .snapshots import quiz_snapshots
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_answer(value) -> str:
+    """
+    Canonical form used for comparisons: surrounding whitespace and case are ignored.
+    """
+    if value is None:
+        return ''
+    return str(value).strip().casefold()
+
+
+@dataclass
+class Submission:
+    user_id: object
+    answers: dict = field(default_factory=dict)  # question id -> submitted answer
+
+    def __post_init__(self):
+        # Answers that went through JSON (Celery, request bodies) are keyed by strings
+        if any(not isinstance(question_id, int) for question_id in self.answers):
+            self.answers = {int(question_id): answer for question_id, answer in self.answers.items()}
+
+    def answer(self, question_id) -> str:
+        answer = self.answers.get(question_id)
+        return '' if answer is None else str(answer)[:255]
+
+
+class AnswerKey:
+    """
+        A quiz's correct answers as a NumPy array, one column per question.
+        - Answers are interned to integer codes, so grading a batch is a single
+          int32 matrix comparison; anything that matches no correct answer is -1.
+        - Built from one query and cached against the quiz version, so a burst of
+          submissions for the same quiz shares a single load.
+    """
+    __slots__ = ('quiz_id', 'version', 'question_ids', 'codes', '_vocabulary')
+
+    def __init__(self, quiz_id, version, question_ids, answers):
+        self.quiz_id = quiz_id
+        self.version = version
+        self.question_ids = list(question_ids)
+        vocabulary = {}
+        for answer in answers:
+            vocabulary.setdefault(normalize_answer(answer), len(vocabulary))
+        # Exact spellings of the correct answers skip normalization on the hot path
+        for answer in answers:
+            vocabulary.setdefault(answer, vocabulary[normalize_answer(answer)])
+        self._vocabulary = vocabulary
+        self.codes = np.array([vocabulary[answer] for answer in answers], dtype=np.int32)
+
+    def __getstate__(self):
+        return (self.quiz_id, self.version, self.question_ids, self.codes, self._vocabulary)
+
+    def __setstate__(self, state):
+        self.quiz_id, self.version, self.question_ids, self.codes, self._vocabulary = state
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def _code(self, answer) -> int:
+        code = self._vocabulary.get(answer)
+        if code is None:
+            code = self._vocabulary.get(normalize_answer(answer), -1)
+        return code
+
+    def encode(self, submissions):
+        """
+        Lay submitted answers out as an (n_submissions, n_questions) matrix of answer codes.
+        Unanswered questions and answers to unknown questions are ignored.
+        """
+        code = self._code
+        question_ids = self.question_ids
+        return np.array(
+            [[code(submission.answers.get(question_id)) for question_id in question_ids] for submission in submissions],
+            dtype=np.int32,
+        ).reshape(len(submissions), len(question_ids))
+
+    def grade(self, matrix):
+        """
+        Compare a matrix of answer codes against the key in one vectorized pass.
+
+        Returns:
+            (correct, scores): boolean matrix of per-question outcomes and per-row scores
+        """
+        correct = matrix == self.codes
+        return correct, correct.sum(axis=1)
+
+
+class GradingEngine:
+    """
+        Grades quiz submissions in batches.
+        - The answer key is loaded once per quiz version and shared through the cache.
+        - A batch is graded with NumPy comparisons and persisted with two bulk inserts.
+        - `grade()` is the synchronous single-submission API; bursts go through `grade_batch()`
+          directly or `enqueue()` to Celery.
+    """
+    cache_suffix = 'answer_key'
+
+    @property
+    def batch_size(self) -> int:
+        return getattr(settings, 'QUIZ_GRADING_BATCH_SIZE', 500)
+
+    def _key_cache_key(self, quiz_id) -> str:
+        return f'{quiz_snapshots.cache_prefix}:{quiz_id}:{self.cache_suffix}'
+
+    def answer_key(self, quiz_id) -> AnswerKey:
+        """
+        Return the quiz's answer key, loading it with one query on a cache miss.
+
+        Raises:
+            Quiz.DoesNotExist: if there is no such quiz
+        """
+        version_key = quiz_snapshots.version_key(quiz_id)
+        key_cache_key = self._key_cache_key(quiz_id)
+        cached = cache.get_many([version_key, key_cache_key])
+        key = cached.get(key_cache_key)
+        hit = key is not None and key.version == cached.get(version_key)
+        record_cache('answer_key', hit)
+        if hit:
+            return key
+
+        rows = list(
+            Quiz.objects.filter(pk=quiz_id)
+            .values_list('version', 'questions__id', 'questions__correct_answer')
+            .order_by('questions__id')
+        )
+        if not rows:
+            raise Quiz.DoesNotExist(f"Quiz {quiz_id} does not exist.")
+        questions = [(question_id, answer) for _, question_id, answer in rows if question_id is not None]
+        key = AnswerKey(
+            quiz_id,
+            rows[0][0],
+            [question_id for question_id, _ in questions],
+            [answer for _, answer in questions],
+        )
+        cache.add(version_key, key.version, quiz_snapshots.ttl)
+        cache.set(key_cache_key, key, quiz_snapshots.ttl)
+        return key
+
+    def grade(self, quiz_id, user_id, answers) -> QuizAttempt:
+        """
+        Grade and store a single submission.
+        """
+        return self.grade_batch(quiz_id, [Submission(user_id, answers)])[0]
+
+    def grade_batch(self, quiz_id, submissions):
+        """
+        Grade and store many submissions for one quiz.
+
+        Args:
+            quiz_id: Primary key of the quiz
+            submissions: Iterable of Submission instances
+
+        Returns:
+            List of saved QuizAttempt instances, in submission order
+        """
+        submissions = list(submissions)
+        if not submissions:
+            return []
+        key = self.answer_key(quiz_id)
+        matrix = key.encode(submissions)
+        correct, scores = key.grade(matrix)
+
+        attempts = [
+            QuizAttempt(quiz_id=quiz_id, user_id=submission.user_id, quiz_version=key.version,
+                        score=int(score), total=len(key))
+            for submission, score in zip(submissions, scores.tolist())
+        ]
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                QuizAttempt.objects.bulk_create(attempts, batch_size=self.batch_size)
+            else:
+                # Without RETURNING the results below would have no attempt ids to point at
+                for attempt in attempts:
+                    attempt.save()
+            question_ids = key.question_ids
+            QuestionResult.objects.bulk_create(
+                (
+                    QuestionResult(attempt_id=attempt.pk, question_id=question_id,
+                                   answer=submission.answer(question_id), is_correct=is_correct)
+                    for attempt, submission, outcomes in zip(attempts, submissions, correct.tolist())
+                    for question_id, is_correct in zip(question_ids, outcomes)
+                ),
+                batch_size=self.batch_size,
+            )
+        return attempts
+
+    def enqueue(self, quiz_id, submissions) -> int:
+        """
+        Hand a burst of submissions to Celery in chunks of QUIZ_GRADING_BATCH_SIZE.
+
+        Returns:
+            Number of tasks dispatched
+        """
+        from .tasks import grade_submissions
+
+        payload = [[str(submission.user_id), submission.answers] for submission in submissions]
+        chunks = [payload[start:start + self.batch_size] for start in range(0, len(payload), self.batch_size)]
+        for chunk in chunks:
+            transaction.on_commit(lambda chunk=chunk: grade_submissions.delay(quiz_id, chunk))
+        return len(chunks)
+
+
+# Shared grading engine used by the views and Celery tasks
+grading_engine = GradingEngine()
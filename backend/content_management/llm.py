@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """Raised when the language model can't produce a usable response."""
+
+
+class LLMClient:
+    """
+        Interface for text generation backends. Set AI_LLM_CLIENT to the dotted
+        path of a subclass to plug in another provider.
+    """
+    # Used in memoization keys: changing the model must not serve old results
+    model = ''
+    # True if generate_many sends the prompts to the provider as one request
+    supports_batching = False
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def generate_many(self, prompts):
+        """
+        Generate one response per prompt. Providers with a batch API override this.
+        """
+        return [self.generate(prompt) for prompt in prompts]
+
+    async def astream(self, prompt: str):
+        """
+        Yield the response in pieces as the model produces them. Providers with a
+        streaming API override this; the fallback yields the whole response at once.
+        """
+        yield await sync_to_async(self.generate, thread_sensitive=False)(prompt)
+
+
+class GeminiClient(LLMClient):
+    """
+        Google Gemini through the google-genai SDK.
+    """
+
+    def __init__(self):
+        from google import genai
+
+        self.model = getattr(settings, 'AI_LLM_MODEL', 'gemini-2.5-flash')
+        self._client = genai.Client(api_key=getattr(settings, 'GEMINI_API_KEY', '') or None)
+
+    def generate(self, prompt: str) -> str:
+        try:
+            response = self._client.models.generate_content(model=self.model, contents=prompt)
+        except Exception as e:
+            raise LLMError(f"Gemini request failed: {e}") from e
+        return response.text or ''
+
+    async def astream(self, prompt: str):
+        try:
+            stream = await self._client.aio.models.generate_content_stream(model=self.model, contents=prompt)
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+        except (asyncio.CancelledError, GeneratorExit):
+            raise
+        except Exception as e:
+            raise LLMError(f"Gemini stream failed: {e}") from e
+
+
+_SENTENCE_RE = re.compile(r'[^.!?\n]+[.!?]?')
+_WORD_RE = re.compile(r'[^\W\d_]{4,}', re.UNICODE)
+
+
+class StubLLMClient(LLMClient):
+    """
+        Deterministic offline client for tests and local development.
+        Turns the notes in a quiz-generation prompt into fill-in-the-blank
+        questions, so the same prompt always yields the same response.
+    """
+    model = 'stub'
+
+    @property
+    def stream_delay(self) -> float:
+        return getattr(settings, 'AI_STUB_STREAM_DELAY', 0.0)
+
+    def generate(self, prompt: str) -> str:
+        if prompt.startswith(ANSWER_PROMPT_PREFIX):
+            return self._answer(prompt)
+        text = prompt.rsplit(NOTES_MARKER, 1)[-1]
+        count = _requested_count(prompt)
+        words = sorted(set(word.lower() for word in _WORD_RE.findall(text)))
+        questions = []
+        for sentence in _SENTENCE_RE.findall(text):
+            candidates = _WORD_RE.findall(sentence)
+            if not candidates or len(questions) >= count:
+                continue
+            answer = max(candidates, key=len)
+            distractors = [word for word in words if word != answer.lower()]
+            # Stable pseudo-random pick of distractors, seeded by the sentence
+            seed = int(hashlib.blake2b(sentence.encode(), digest_size=4).hexdigest(), 16)
+            choices = [answer] + [distractors[(seed + i) % len(distractors)] for i in range(min(3, len(distractors)))]
+            questions.append({
+                'question': sentence.strip().replace(answer, '_____', 1),
+                'choices': sorted(set(choices), key=str.lower),
+                'answer': answer,
+            })
+        return json.dumps(questions)
+
+    def _answer(self, prompt):
+        question, _, notes = prompt.partition(NOTES_MARKER)
+        question = question.rsplit(QUESTION_MARKER, 1)[-1].strip()
+        sentences = [sentence.strip() for sentence in _SENTENCE_RE.findall(notes) if sentence.strip()]
+        if not sentences:
+            return "I couldn't find anything about that in your notes."
+        terms = set(word.lower() for word in _WORD_RE.findall(question))
+        best = sorted(sentences, key=lambda sentence: -len(terms & set(w.lower() for w in _WORD_RE.findall(sentence))))
+        return 'From your notes: ' + ' '.join(best[:2])
+
+    async def astream(self, prompt: str):
+        # Word by word, with an optional delay to mimic a remote model
+        for index, word in enumerate(self.generate(prompt).split(' ')):
+            if self.stream_delay:
+                await asyncio.sleep(self.stream_delay)
+            yield f' {word}' if index else word
+
+
+@lru_cache(maxsize=None)
+def _load_client(path):
+    return import_string(path)()
+
+
+def get_llm_client() -> LLMClient:
+    return _load_client(getattr(settings, 'AI_LLM_CLIENT', 'content_management.llm.StubLLMClient'))
+
+
+# Prompt for quiz generation. The notes always come last, after NOTES_MARKER.
+NOTES_MARKER = '\nNotes:\n'
+QUIZ_PROMPT = (
+    "Write {count} multiple-choice questions that test understanding of the notes below. "
+    "Reply with only a JSON array of objects with the keys \"question\", \"choices\" "
+    "(a list of 2 to 5 strings) and \"answer\" (one of the choices)."
+    + NOTES_MARKER + "{notes}"
+)
+
+# Prompt for answering questions about a user's notes
+QUESTION_MARKER = '\nQuestion:\n'
+ANSWER_PROMPT_PREFIX = 'Answer the question using only the notes below.'
+ANSWER_PROMPT = (
+    ANSWER_PROMPT_PREFIX + " If the notes don't cover it, say so. Be concise."
+    + QUESTION_MARKER + "{question}" + NOTES_MARKER + "{notes}"
+)
+
+_COUNT_RE = re.compile(r'^Write (\d+) ')
+
+
+def _requested_count(prompt) -> int:
+    match = _COUNT_RE.match(prompt)
+    return int(match.group(1)) if match else 3
@@ -0,0 +1,97 @@
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+
+from content_management.answer_events import AnswerEventBuffer, make_event
+from content_management.models import AnswerEvent, Question, Quiz
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench-answers@youcademy.invalid'
+
+CHOICES = ['Mitochondria', 'Nucleus', 'Ribosome', 'Chloroplast']
+
+
+class Command(BaseCommand):
+    help = "Compare an INSERT per quiz answer with the write-behind answer event buffer (events per second)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=50_000, help="Answer events through the buffer.")
+        parser.add_argument('--single', type=int, default=2_000, help="Answer events inserted one at a time.")
+        parser.add_argument('--threads', type=int, default=8, help="Threads adding events at once.")
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        owner = User.objects.get_or_create(email=f'owner-{BENCH_EMAIL}')[0]
+        students = [User.objects.get_or_create(email=f'user{i}-{BENCH_EMAIL}')[0] for i in range(options['users'])]
+        try:
+            quiz = Quiz.objects.create(user=owner, title='Answer events benchmark', description='...')
+            questions = Question.objects.bulk_create([
+                Question(quiz=quiz, content=f'Question {i}', answer_choices=CHOICES, correct_answer=CHOICES[0])
+                for i in range(options['questions'])
+            ])
+
+            def events(count):
+                now = timezone.now()
+                return [
+                    make_event(quiz.pk, rng.choice(questions).pk, rng.choice(students).pk, rng.choice(CHOICES),
+                               uuid.uuid4().hex, now)
+                    for _ in range(count)
+                ]
+
+            self.stdout.write(f"{'mode':<36}{'events/s':>12}{'stored':>10}")
+            single = events(options['single'])
+            self._report('INSERT per answer', single, lambda: [
+                AnswerEvent.objects.create(quiz_id=quiz_id, question_id=question_id, user_id=user_id, answer=answer,
+                                           idempotency_key=key, answered_at=answered_at)
+                for quiz_id, question_id, user_id, answer, key, answered_at in single
+            ])
+
+            with tempfile.TemporaryDirectory() as directory:
+                batch = events(options['events'])
+                with override_settings(ANSWER_EVENTS_SPOOL_DIR=directory, ANSWER_EVENTS_FLUSHER=False,
+                                       ANSWER_EVENTS_MAX_PENDING=len(batch)):
+                    buffer = AnswerEventBuffer()
+                    self._report('buffer, inline flushes', batch, lambda: [buffer.add([event]) for event in batch],
+                                 after=buffer.stop)
+
+                batch = events(options['events'])
+                with override_settings(ANSWER_EVENTS_SPOOL_DIR=directory, ANSWER_EVENTS_MAX_PENDING=len(batch)):
+                    buffer = AnswerEventBuffer()
+                    threads = options['threads']
+
+                    def add_concurrently():
+                        workers = [
+                            threading.Thread(target=lambda part: [buffer.add([event]) for event in part],
+                                             args=(batch[index::threads],))
+                            for index in range(threads)
+                        ]
+                        for worker in workers:
+                            worker.start()
+                        for worker in workers:
+                            worker.join()
+                    self._report(f'buffer, flusher, {threads} threads', batch, add_concurrently, after=buffer.stop)
+        finally:
+            User.objects.filter(email__endswith=BENCH_EMAIL).delete()
+
+    def _report(self, name, events, run, after=None):
+        before = AnswerEvent.objects.count()
+        started = time.perf_counter()
+        run()
+        if after is not None:
+            after()
+        elapsed = time.perf_counter() - started
+        stored = AnswerEvent.objects.count() - before
+        if stored != len(events):
+            raise CommandError(f"{name}: stored {stored} of {len(events)} events")
+        self.stdout.write(f"{name:<36}{len(events) / elapsed:>12,.0f}{stored:>10}")
@@ -0,0 +1,271 @@
+import http.client
+import itertools
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.tokens import generate_tokens
+from content_management.models import Note, Question, Quiz
+
+User = get_user_model()
+
+BENCH_DOMAIN = 'bench-api.youcademy.invalid'
+BENCH_PASSWORD = 'Bench#Passw0rd'
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'api_baseline.json')
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+NO_THROTTLING = {
+    scope: '1000000/s' for scope in ('anon', 'user', 'user_read', 'login', 'login_email', 'login_account', 'register')
+}
+
+
+class InProcessTransport:
+    """
+    Sends requests through Django's test client, one client per thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = APIClient()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        response = getattr(client, method.lower())(path, body, format='json', **headers)
+        return response.status_code, response.get('X-DB-Queries')
+
+
+class HTTPTransport:
+    """
+    Sends requests to a running server over one keep-alive connection per thread.
+    Query counts need the server to run with QUERY_METRICS_HEADERS on.
+    """
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = json.dumps(body) if body is not None else None
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                connection.request(method, self.prefix + path, payload, headers)
+                response = connection.getresponse()
+                response.read()
+                return response.status, response.getheader('X-DB-Queries')
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed the kept-alive connection; reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+class Fixture:
+    """
+    A throwaway user with tokens, notes and a quiz for the scenarios to use.
+    """
+
+    def __init__(self):
+        self.run = uuid.uuid4().hex[:8]
+        self.counter = itertools.count()
+        self.user = User.objects.create_user(email=f'user-{self.run}@{BENCH_DOMAIN}', password=BENCH_PASSWORD)
+        tokens = generate_tokens(self.user)
+        self.access, self.refresh = tokens['access'], tokens['refresh']
+        Note.objects.bulk_create([
+            Note(user=self.user, title=f'Note {index}', content='Cells turn nutrients into energy. ' * 20)
+            for index in range(50)
+        ])
+        self.quiz = Quiz.objects.create(user=self.user, title='Cells', description='Bench quiz')
+        self.questions = Question.objects.bulk_create([
+            Question(quiz=self.quiz, content=f'Question {index}', answer_choices=['A', 'B', 'C'], correct_answer='A')
+            for index in range(20)
+        ])
+
+    def unique(self) -> str:
+        return f'{self.run}-{next(self.counter)}'
+
+    def cleanup(self):
+        User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').delete()
+
+
+def scenarios(fixture):
+    """
+    (name, method, path, body factory, token) for every benchmarked endpoint.
+    """
+    answers = {str(question.pk): 'A' for question in fixture.questions}
+    return [
+        ('register', 'POST', reverse('user-registration'), lambda: {
+            'first_name': 'Bench', 'last_name': 'User', 'email': f'register-{fixture.unique()}@{BENCH_DOMAIN}',
+            'phone_number': '+1234567890', 'password': BENCH_PASSWORD, 'password_confirmation': BENCH_PASSWORD,
+        }, None),
+        ('login', 'POST', reverse('user-login'), lambda: {
+            'email': fixture.user.email, 'password': BENCH_PASSWORD,
+        }, None),
+        ('token refresh', 'POST', reverse('token_refresh'), lambda: {'refresh': fixture.refresh}, None),
+        ('token verify', 'POST', reverse('token_verify'), lambda: {'token': fixture.access}, None),
+        ('note list', 'GET', reverse('note-list'), lambda: None, fixture.access),
+        ('note create', 'POST', reverse('note-list'), lambda: {
+            'title': f'Bench {fixture.unique()}', 'content': 'Ribosomes assemble proteins from amino acids.',
+        }, fixture.access),
+        ('quiz list', 'GET', reverse('quiz-list'), lambda: None, fixture.access),
+        ('quiz create', 'POST', reverse('quiz-list'), lambda: {
+            'title': f'Bench {fixture.unique()}', 'description': '...',
+        }, fixture.access),
+        ('quiz detail', 'GET', reverse('quiz-detail', args=[fixture.quiz.pk]), lambda: None, fixture.access),
+        ('quiz attempt', 'POST', reverse('quiz-attempt-create', args=[fixture.quiz.pk]), lambda: {
+            'answers': answers,
+        }, fixture.access),
+    ]
+
+
+def run_scenario(transport, method, path, body, token, requests, concurrency) -> dict:
+    """
+    Send `requests` requests from `concurrency` threads and summarize them.
+    """
+    def call(_):
+        started = time.perf_counter()
+        try:
+            status, queries = transport.request(method, path, body(), token)
+        except Exception:
+            status, queries = None, None
+        return time.perf_counter() - started, status, queries
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        calls = [call(index) for index in range(requests)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            calls = list(pool.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(seconds * 1000 for seconds, _, _ in calls)
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    queries = [int(queries) for _, _, queries in calls if queries is not None]
+    return {
+        'requests': requests,
+        'errors': sum(1 for _, status, _ in calls if status is None or not 200 <= status < 300),
+        'throughput': round(requests / elapsed, 1),
+        'p50_ms': round(cuts[49], 2),
+        'p95_ms': round(cuts[94], 2),
+        'p99_ms': round(cuts[98], 2),
+        'queries': statistics.median(queries) if queries else None,
+        'max_queries': max(queries) if queries else None,
+    }
+
+
+def compare(results, baseline, tolerance) -> list:
+    """
+    Regressions of `results` against a baseline: any new errors or extra
+    queries, or latency and throughput worse by more than `tolerance`.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current['errors'] > before['errors']:
+            regressions.append(f"{name}: {current['errors']} errors, baseline {before['errors']}")
+        if None not in (current['queries'], before['queries']) and current['queries'] > before['queries']:
+            regressions.append(f"{name}: {current['queries']:g} queries per request, baseline {before['queries']:g}")
+        if current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']:.1f} ms, baseline {before['p95_ms']:.1f} ms")
+        if current['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: {current['throughput']:.0f} req/s, baseline {before['throughput']:.0f} req/s")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the auth and content endpoints in-process (default) or against a running server, "
+        "and fail on regressions against a baseline JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server, e.g. http://127.0.0.1:8000. "
+                                          "It should share this database and have throttling relaxed.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario.")
+        parser.add_argument('--concurrency', type=int, default=1, help="Client threads.")
+        parser.add_argument('--scenarios', help="Comma-separated scenario names (default: all).")
+        parser.add_argument('--real-hashers', action='store_true',
+                            help="In-process: keep the configured password hashers instead of a fast one.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON to compare against.")
+        parser.add_argument('--no-baseline', action='store_true', help="Don't compare against a baseline.")
+        parser.add_argument('--save-baseline', action='store_true', help="Write the results to --baseline.")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="Allowed relative slowdown of p95 latency and throughput.")
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            if options['url']:
+                transport = HTTPTransport(options['url'])
+            else:
+                transport = InProcessTransport()
+                # DEBUG off as in production, which also keeps console logging out of the timings
+                stack.enter_context(override_settings(
+                    DEBUG=False,
+                    ALLOWED_HOSTS=['testserver'],
+                    QUERY_METRICS_HEADERS=True,
+                    REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=NO_THROTTLING),
+                    **({} if options['real_hashers'] else {'PASSWORD_HASHERS': FAST_HASHERS}),
+                ))
+            fixture = Fixture()
+            stack.callback(fixture.cleanup)
+            selected = options['scenarios'].split(',') if options['scenarios'] else None
+
+            results = {}
+            self.stdout.write(f"{'scenario':<16}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+            for name, method, path, body, token in scenarios(fixture):
+                if selected and name not in selected:
+                    continue
+                result = results[name] = run_scenario(
+                    transport, method, path, body, token, options['requests'], options['concurrency'],
+                )
+                queries = '-' if result['queries'] is None else f"{result['queries']:g}"
+                self.stdout.write(
+                    f"{name:<16}{result['throughput']:>9.1f}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                    f"{result['p99_ms']:>9.2f}{queries:>9}{result['errors']:>8}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+                output.write('\n')
+            self.stdout.write(f"Saved baseline {options['baseline']}")
+            return
+        if options['no_baseline'] or not os.path.exists(options['baseline']):
+            return
+
+        with open(options['baseline'], encoding='utf-8') as baseline:
+            regressions = compare(results, json.load(baseline), options['tolerance'])
+        for regression in regressions:
+            self.stderr.write(f"REGRESSION {regression}")
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressions against {options['baseline']}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
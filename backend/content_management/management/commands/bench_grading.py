@@ -0,0 +1,84 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from content_management.grading import Submission, grading_engine, normalize_answer
+from content_management.models import Question, Quiz
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench-grading@youcademy.invalid'
+
+CHOICES = ['Mitochondria', 'Nucleus', 'Ribosome', 'Chloroplast']
+
+
+def grade_naive(correct_answers, submissions):
+    """
+    Per-answer Python loop, as a baseline for the vectorized grader.
+    """
+    scores = []
+    for submission in submissions:
+        score = 0
+        for question_id, answer in correct_answers.items():
+            if normalize_answer(submission.answers.get(question_id)) == normalize_answer(answer):
+                score += 1
+        scores.append(score)
+    return scores
+
+
+class Command(BaseCommand):
+    help = "Measure quiz grading throughput (grades per second)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=20_000, help="Synthetic submissions to grade.")
+        parser.add_argument('--questions', type=int, default=20, help="Questions in the quiz.")
+        parser.add_argument('--users', type=int, default=50, help="Students the submissions are spread over.")
+        parser.add_argument('--single', type=int, default=500, help="Submissions graded one at a time.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        owner = User.objects.get_or_create(email=f'owner-{BENCH_EMAIL}')[0]
+        students = [User.objects.get_or_create(email=f'user{i}-{BENCH_EMAIL}')[0] for i in range(options['users'])]
+        try:
+            quiz = Quiz.objects.create(user=owner, title='Grading benchmark', description='...')
+            Question.objects.bulk_create([
+                Question(quiz=quiz, content=f'Question {i}', answer_choices=CHOICES, correct_answer=rng.choice(CHOICES))
+                for i in range(options['questions'])
+            ])
+            correct_answers = dict(quiz.questions.values_list('id', 'correct_answer'))
+            submissions = [
+                Submission(students[i % len(students)].pk, {
+                    question_id: rng.choice(CHOICES) for question_id in correct_answers
+                })
+                for i in range(options['submissions'])
+            ]
+
+            self.stdout.write(f"{len(submissions)} submissions x {len(correct_answers)} questions")
+            self.stdout.write(f"{'mode':<28}{'grades/s':>12}")
+
+            self._report('python loop (no writes)', len(submissions), lambda: grade_naive(correct_answers, submissions))
+
+            key = grading_engine.answer_key(quiz.pk)
+            self._report('numpy (no writes)', len(submissions), lambda: key.grade(key.encode(submissions)))
+
+            batch_size = grading_engine.batch_size
+            self._report('batch + bulk_create', len(submissions), lambda: [
+                grading_engine.grade_batch(quiz.pk, submissions[start:start + batch_size])
+                for start in range(0, len(submissions), batch_size)
+            ])
+
+            single = submissions[:options['single']]
+            self._report('single (sync API)', len(single), lambda: [
+                grading_engine.grade(quiz.pk, submission.user_id, submission.answers) for submission in single
+            ])
+        finally:
+            User.objects.filter(email__endswith=BENCH_EMAIL).delete()
+
+    def _report(self, name, count, run):
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{name:<28}{count / elapsed:>12,.0f}")
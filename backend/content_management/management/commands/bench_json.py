@@ -0,0 +1,115 @@
+import io
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from content_management.models import Note
+from content_management.serializers import NoteSerializer
+from youcademy import fastjson
+
+WORDS = (
+    'photosynthesis chlorophyll mitochondria enzyme substrate catalyst velocity momentum '
+    'integral derivative theorem lemma proof vector matrix eigenvalue équation naïve résumé'
+).split()
+
+
+def text(rng, words) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def note_rows(rng, count) -> list:
+    """
+    A notes list page as the API sends it: serializer output, so plain strings and ints.
+    """
+    now = timezone.now()
+    notes = [
+        Note(id=index + 1, title=text(rng, 6), content=text(rng, 300),
+             created_at=now - timedelta(minutes=index), updated_at=now)
+        for index in range(count)
+    ]
+    return NoteSerializer(notes, many=True).data
+
+
+def quiz_rows(rng, count) -> list:
+    """
+    Quizzes with their questions and answer choices, keeping the model values
+    (UUID user IDs, aware datetimes) for the encoder to handle.
+    """
+    now = timezone.now()
+    return [
+        {
+            'id': index + 1,
+            'user_id': uuid.uuid4(),
+            'title': text(rng, 5),
+            'version': 1,
+            'created_at': now - timedelta(hours=index),
+            'questions': [
+                {
+                    'id': index * 10 + number,
+                    'content': text(rng, 20),
+                    'answer_choices': [text(rng, 4) for _ in range(4)],
+                }
+                for number in range(10)
+            ],
+        }
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSON renderer and parser with youcademy.fastjson on list payloads of increasing size."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000,10000', help="Comma-separated rows per payload.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per measurement; the median is reported.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        backends = ['stdlib'] + (['orjson'] if fastjson.orjson is not None else [])
+        self.stdout.write(
+            f"{'payload':<10}{'rows':>7}{'KiB':>9}{'step':>8}{'drf ms':>10}"
+            + ''.join(f'{name + " ms":>12}{"x":>6}' for name in backends)
+        )
+        for payload, build in (('notes', note_rows), ('quizzes', quiz_rows)):
+            for size in sizes:
+                data = build(rng, size)
+                body = JSONRenderer().render(data)
+                kib = len(body) / 1024
+                self._row(payload, size, kib, 'render', backends,
+                          lambda: JSONRenderer().render(data),
+                          lambda: fastjson.FastJSONRenderer().render(data),
+                          options['repeat'])
+                self._row(payload, size, kib, 'parse', backends,
+                          lambda: JSONParser().parse(io.BytesIO(body)),
+                          lambda: fastjson.FastJSONParser().parse(io.BytesIO(body)),
+                          options['repeat'])
+                self._row(payload, size, kib, 'stream', backends,
+                          lambda: JSONRenderer().render(data),
+                          lambda: b''.join(fastjson.iter_json_array(data)),
+                          options['repeat'])
+
+    def _row(self, payload, size, kib, step, backends, baseline, candidate, repeat):
+        before = self._median(baseline, repeat)
+        line = f"{payload:<10}{size:>7}{kib:>9.0f}{step:>8}{before:>10.2f}"
+        for name in backends:
+            with override_settings(JSON_BACKEND=name):
+                after = self._median(candidate, repeat)
+            line += f"{after:>12.2f}{before / after:>6.1f}"
+        self.stdout.write(line)
+
+    def _median(self, function, repeat) -> float:
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            runs.append((time.perf_counter() - started) * 1000)
+        return statistics.median(runs)
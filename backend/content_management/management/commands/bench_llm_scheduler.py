@@ -0,0 +1,76 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from content_management.llm import StubLLMClient
+from content_management.scheduler import BACKGROUND, INTERACTIVE, LLMScheduler
+
+
+class SlowClient(StubLLMClient):
+    """
+    Stub with a fixed per-call latency that tracks how many calls overlap.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        return prompt
+
+
+class Command(BaseCommand):
+    help = "Fire a burst of LLM calls with and without the scheduler and report calls, waits and concurrency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help="Calls in the burst.")
+        parser.add_argument('--prompts', type=int, default=20, help="Distinct prompts among them.")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--interactive', type=float, default=0.25, help="Share of interactive calls.")
+        parser.add_argument('--latency', type=float, default=0.05, help="Stub model latency (seconds).")
+        parser.add_argument('--limit', type=int, default=8, help="AI_LLM_MAX_CONCURRENT for the run.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        burst = [
+            (f'prompt {rng.randrange(options["prompts"])}', f'user{rng.randrange(options["users"])}',
+             INTERACTIVE if rng.random() < options['interactive'] else BACKGROUND)
+            for _ in range(options['requests'])
+        ]
+
+        client = SlowClient(options['latency'])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            list(pool.map(lambda call: client.generate(call[0]), burst))
+        self._report('direct', client, time.perf_counter() - started)
+
+        scheduler = LLMScheduler()
+        client = SlowClient(options['latency'])
+        with override_settings(AI_LLM_MAX_CONCURRENT=options['limit']):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=64) as pool:
+                list(pool.map(lambda call: scheduler.generate(client, *call), burst))
+            self._report('scheduled', client, time.perf_counter() - started)
+
+        stats = scheduler.stats()
+        self.stdout.write(f"coalesced calls     {stats['coalesced']}")
+        for lane, wait in stats['wait'].items():
+            self.stdout.write(f"{lane + ' wait':<20}avg {wait['avg_ms']:.1f} ms  max {wait['max_ms']:.1f} ms  ({wait['count']} slots)")
+
+    def _report(self, name, client, elapsed):
+        self.stdout.write(f"{name:<20}{client.calls} upstream calls, peak {client.peak} in flight, {elapsed:.2f}s")
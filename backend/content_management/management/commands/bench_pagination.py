@@ -0,0 +1,82 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from content_management.models import Note
+from content_management.pagination import KeysetCursorPagination
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench-pagination@youcademy.invalid'
+
+
+class Command(BaseCommand):
+    help = "Compare OFFSET/COUNT pagination with keyset pagination at increasing page depths."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2_000_000, help="Synthetic notes for the benchmark user.")
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per depth; the median is reported.")
+        parser.add_argument('--keep', action='store_true', help="Keep the synthetic dataset for later runs.")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        page_size = options['page_size']
+        user, _ = User.objects.get_or_create(email=BENCH_EMAIL)
+        try:
+            self._populate(user, rows)
+            queryset = Note.objects.filter(user=user)
+            factory = APIRequestFactory()
+
+            depths = [1, 10, 100, 1_000, 10_000, 100_000]
+            depths = [depth for depth in depths if depth * page_size < rows]
+            self.stdout.write(f"{'page':>10}{'offset ms':>14}{'keyset ms':>14}")
+            for depth in depths:
+                offset = (depth - 1) * page_size
+
+                def offset_page():
+                    # What PageNumberPagination does: COUNT(*) then OFFSET
+                    queryset.count()
+                    list(queryset.order_by('-created_at', '-id')[offset:offset + page_size])
+
+                cursor = None
+                if offset:
+                    # Position a cursor at the same depth (untimed)
+                    anchor = queryset.order_by('-created_at', '-id')[offset - 1]
+                    cursor = KeysetCursorPagination().make_cursor(anchor, reverse=False)
+
+                def keyset_page():
+                    params = {'page_size': page_size}
+                    if cursor:
+                        params['cursor'] = cursor
+                    request = Request(factory.get('/content/notes/', params))
+                    KeysetCursorPagination().paginate_queryset(queryset, request)
+
+                before = self._median(offset_page, options['repeat'])
+                after = self._median(keyset_page, options['repeat'])
+                self.stdout.write(f"{depth:>10}{before:>14.2f}{after:>14.2f}")
+        finally:
+            if not options['keep']:
+                user.delete()
+
+    def _populate(self, user, rows, batch_size=20_000):
+        existing = Note.objects.filter(user=user).count()
+        for start in range(existing, rows, batch_size):
+            Note.objects.bulk_create([
+                Note(user=user, title=f'Note {i}', content=f'Synthetic note body {i}')
+                for i in range(start, min(start + batch_size, rows))
+            ])
+            self.stdout.write(f"Inserted {min(start + batch_size, rows)}/{rows} notes", ending='\r')
+        self.stdout.write('')
+
+    def _median(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,100 @@
+import json
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from content_management.llm import ANSWER_PROMPT, StubLLMClient
+from content_management.response_cache import EXACT, SIMILAR, response_cache
+
+MATERIAL = [
+    'Mitochondria produce most of the energy of the cell as ATP through cellular respiration.',
+    'Photosynthesis in chloroplasts turns light, water and carbon dioxide into sugar and oxygen.',
+    'Ribosomes translate messenger RNA into chains of amino acids that fold into proteins.',
+    'Osmosis is the diffusion of water across a semi-permeable membrane towards higher solute concentration.',
+]
+
+QUESTIONS = [
+    'What do mitochondria produce?',
+    'How does photosynthesis work?',
+    'What do ribosomes do?',
+    'What is osmosis?',
+    'Where is ATP made in the cell?',
+    'What are the products of photosynthesis?',
+]
+
+
+def paraphrase(question, rng) -> str:
+    """
+    A near-identical rewording, the way students retype the same question.
+    """
+    variant = rng.choice([
+        lambda q: q,
+        lambda q: q.lower(),
+        lambda q: q.rstrip('?'),
+        lambda q: f'  {q}  ',
+        lambda q: f'Please tell me: {q}',
+        lambda q: q.replace('What', 'So what'),
+    ])
+    return variant(question)
+
+
+def synthetic_log(prompts, students, shared, rng):
+    scopes = [None] if shared else [str(uuid.uuid4()) for _ in range(students)]
+    for _ in range(prompts):
+        topic = rng.randrange(len(QUESTIONS))
+        notes = MATERIAL[topic % len(MATERIAL)]
+        question = paraphrase(QUESTIONS[topic], rng)
+        yield {'scope': rng.choice(scopes), 'prompt': ANSWER_PROMPT.format(question=question, notes=notes)}
+
+
+class CountingClient(StubLLMClient):
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        return super().generate(prompt)
+
+
+class Command(BaseCommand):
+    help = "Replay a prompt log through the LLM response cache and report the model calls it saves."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help="JSON lines recorded with AI_PROMPT_LOG. Synthetic prompts if omitted.")
+        parser.add_argument('--prompts', type=int, default=5000, help="Synthetic prompts.")
+        parser.add_argument('--students', type=int, default=100, help="Synthetic students asking.")
+        parser.add_argument('--shared', action='store_true', help="Treat the synthetic material as shared course notes.")
+        parser.add_argument('--latency', type=float, default=1.5, help="Assumed seconds per model call.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['log']:
+            with open(options['log'], encoding='utf-8') as handle:
+                log = [json.loads(line) for line in handle if line.strip()]
+        else:
+            rng = random.Random(options['seed'])
+            log = list(synthetic_log(options['prompts'], options['students'], options['shared'], rng))
+
+        self.stdout.write(f"{len(log)} prompts, {len({entry['scope'] for entry in log})} scopes")
+        self.stdout.write(f"{'similarity':<12}{'calls':>8}{'saved':>8}{'exact':>8}{'similar':>9}{'hit rate':>10}{'saved s':>10}{'us/prompt':>11}")
+        for threshold in (0.0, 0.9, 0.8):
+            client = CountingClient()
+            with override_settings(AI_RESPONSE_CACHE_SIMILARITY=threshold, AI_PROMPT_LOG=''):
+                response_cache.clear()
+                cache.clear()
+                started = time.perf_counter()
+                for entry in log:
+                    response_cache.generate(client, entry['prompt'], scope=entry['scope'])
+                elapsed = time.perf_counter() - started
+            stats = response_cache.stats()
+            saved = len(log) - client.calls
+            self.stdout.write(
+                f"{threshold or 'off':<12}{client.calls:>8}{saved:>8}{stats[EXACT]:>8}{stats[SIMILAR]:>9}"
+                f"{stats['hit_rate']:>10.1%}{saved * options['latency']:>10,.0f}{elapsed / len(log) * 1e6:>11.0f}"
+            )
+        response_cache.clear()
+        cache.clear()
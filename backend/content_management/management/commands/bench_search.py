@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from content_management.models import Note
+from content_management.search import get_search_backend, note_document
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench-search@youcademy.invalid'
+
+VOCABULARY = (
+    'photosynthesis chlorophyll mitochondria enzyme protein membrane nucleus osmosis diffusion '
+    'algebra polynomial derivative integral matrix vector theorem proof lemma equation '
+    'revolution empire treaty parliament constitution monarchy republic colony trade war '
+    'velocity acceleration momentum energy friction gravity electron photon wave particle '
+    'sonnet metaphor narrative character theme symbolism stanza rhyme novel author'
+).split()
+
+
+class Command(BaseCommand):
+    help = "Measure search latency over a synthetic set of notes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Synthetic notes to index.")
+        parser.add_argument('--users', type=int, default=100, help="Owners the notes are spread over.")
+        parser.add_argument('--repeat', type=int, default=50, help="Timed runs per query.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if not backend.is_available():
+            raise CommandError(f"{type(backend).__name__} is not available on this database.")
+        rng = random.Random(options['seed'])
+        users = [
+            User.objects.get_or_create(email=f'user{i}-{BENCH_EMAIL}')[0]
+            for i in range(options['users'])
+        ]
+        try:
+            self._populate(backend, users, options['rows'], rng)
+            queries = {
+                'single word': 'photosynthesis',
+                'prefix': 'mito',
+                'two words': 'gravity energy',
+                'phrase': '"matrix vector"',
+            }
+            self.stdout.write(f"{'query':<14}{'p50 ms':>10}{'p95 ms':>10}")
+            for name, query in queries.items():
+                timings = []
+                for _ in range(options['repeat']):
+                    user = rng.choice(users)
+                    started = time.perf_counter()
+                    backend.search(user.pk, query, limit=20)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                self.stdout.write(f"{name:<14}{statistics.median(timings):>10.2f}{p95:>10.2f}")
+        finally:
+            self._cleanup(backend, users)
+
+    def _populate(self, backend, users, rows, rng, batch_size=20_000):
+        for start in range(0, rows, batch_size):
+            notes = []
+            for i in range(start, min(start + batch_size, rows)):
+                words = rng.choices(VOCABULARY, k=60)
+                notes.append(Note(user=users[i % len(users)], title=' '.join(words[:4]), content=' '.join(words)))
+            with transaction.atomic():
+                # bulk_create skips the indexing signals, so index the batch directly
+                Note.objects.bulk_create(notes)
+                backend.index([note_document(note) for note in notes])
+            self.stdout.write(f"Indexed {min(start + batch_size, rows)}/{rows} notes", ending='\r')
+        self.stdout.write('')
+
+    def _cleanup(self, backend, users):
+        with transaction.atomic():
+            for user in users:
+                backend.purge_owner(user.pk)
+            # Raw delete: going through the ORM would fire one unindex signal per note
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {Note._meta.db_table} WHERE user_id IN ({', '.join(['%s'] * len(users))})",
+                    [user.pk.hex for user in users],
+                )
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
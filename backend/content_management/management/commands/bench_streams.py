@@ -0,0 +1,130 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+
+from accounts.tokens import generate_tokens
+from content_management.models import Note
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench-streams@youcademy.invalid'
+
+SENTENCE = (
+    'The mitochondria convert nutrients into usable chemical energy through a long chain '
+    'of reactions that also regulate cell growth signalling and programmed cell death.'
+)
+
+
+async def open_stream(application, path, access_token, body, disconnect_after=None):
+    """
+    Drive one request through an ASGI application like a server would.
+
+    Args:
+        disconnect_after: Disconnect once this many body chunks have arrived
+
+    Returns:
+        (status, chunks, seconds to the first body chunk)
+    """
+    started = time.perf_counter()
+    status, chunks, first = None, [], None
+    disconnected = asyncio.Event()
+    sent_request = False
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status, first
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message.get('body'):
+            if first is None:
+                first = time.perf_counter() - started
+            chunks.append(message['body'])
+            if disconnect_after is not None and len(chunks) >= disconnect_after:
+                disconnected.set()
+        if message['type'] == 'http.response.body' and not message.get('more_body'):
+            disconnected.set()
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [
+            (b'host', b'testserver'),
+            (b'content-type', b'application/json'),
+            (b'authorization', f'Bearer {access_token}'.encode()),
+        ],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    await application(scope, receive, send)
+    return status, chunks, first
+
+
+class Command(BaseCommand):
+    help = "Open many concurrent answer streams against the ASGI app and report latency and thread usage."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=500, help="Concurrent streams.")
+        parser.add_argument('--delay', type=float, default=0.02, help="Stub model delay per token (seconds).")
+
+    def handle(self, *args, **options):
+        user = User.objects.get_or_create(email=BENCH_EMAIL)[0]
+        try:
+            Note.objects.create(user=user, title='Mitochondria', content=' '.join([SENTENCE] * 3))
+            access_token = generate_tokens(user)['access']
+            limit = options['streams'] + 1
+            with override_settings(AI_STUB_STREAM_DELAY=options['delay'], AI_STREAM_MAX_CONCURRENT=limit,
+                                   ALLOWED_HOSTS=['testserver']):
+                baseline_threads = threading.active_count()
+                results, elapsed, peak_threads = asyncio.run(self._run(access_token, options['streams']))
+        finally:
+            user.delete()
+
+        ok = [result for result in results if result[0] == 200]
+        first_bytes = sorted(first * 1000 for _, _, first in ok)
+        tokens = sum(sum(chunk.count(b'event: token') for chunk in chunks) for _, chunks, _ in ok)
+        per_stream = tokens / len(ok) if ok else 0
+        self.stdout.write(f"streams ok          {len(ok)}/{len(results)}")
+        self.stdout.write(f"tokens per stream   {per_stream:.0f} (stub delay {options['delay'] * 1000:.0f} ms/token)")
+        self.stdout.write(f"wall time           {elapsed:.2f}s (one stream alone: ~{per_stream * options['delay']:.2f}s)")
+        if first_bytes:
+            self.stdout.write(
+                f"first byte ms       p50 {statistics.median(first_bytes):.1f}  "
+                f"p95 {first_bytes[int(len(first_bytes) * 0.95) - 1]:.1f}"
+            )
+        self.stdout.write(f"tokens/s            {tokens / elapsed:,.0f}")
+        self.stdout.write(f"peak threads        {peak_threads} (before the run: {baseline_threads})")
+
+    async def _run(self, access_token, streams):
+        from youcademy.asgi import application
+
+        path = reverse('content-ask')
+        body = json.dumps({'question': 'What do mitochondria do?'}).encode()
+        peak = threading.active_count()
+        done = asyncio.Event()
+
+        async def sample_threads():
+            nonlocal peak
+            while not done.is_set():
+                peak = max(peak, threading.active_count())
+                await asyncio.sleep(0.005)
+
+        sampler = asyncio.create_task(sample_threads())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(open_stream(application, path, access_token, body) for _ in range(streams)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+        return results, elapsed, peak
@@ -0,0 +1,78 @@
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from content_management.models import Note
+from content_management.vectors import vector_index
+
+WORDS = (
+    'cell energy protein enzyme membrane nucleus gene molecule reaction acid sugar light plant '
+    'photosynthesis respiration mitochondria ribosome chloroplast osmosis diffusion tissue organ '
+    'force motion velocity mass gravity orbit planet star galaxy atom electron charge field wave '
+    'history empire treaty war trade revolution economy market price supply demand tax law court'
+).split()
+
+
+class Command(BaseCommand):
+    help = "Measure vector index build time, query latency and footprint for one large shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunks', type=int, default=100_000, help="Synthetic note chunks in the shard.")
+        parser.add_argument('--queries', type=int, default=200, help="Single queries to time.")
+        parser.add_argument('--batch', type=int, default=32, help="Queries per batched search.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user_id = uuid.uuid4()
+        # One note per chunk: each note fits in a single chunk
+        notes = [
+            Note(pk=i + 1, user_id=user_id, title=f'Note {i}', content=' '.join(rng.choices(WORDS, k=60)))
+            for i in range(options['chunks'])
+        ]
+        queries = [' '.join(rng.choices(WORDS, k=4)) for _ in range(options['queries'])]
+
+        with tempfile.TemporaryDirectory() as root, override_settings(AI_VECTOR_INDEX_DIR=root):
+            started = time.perf_counter()
+            for start in range(0, len(notes), 5000):
+                vector_index.update_notes(user_id, notes[start:start + 5000])
+            build = time.perf_counter() - started
+
+            path = vector_index.shard_path(user_id)
+            disk = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            vector_index.search(user_id, queries[0])  # Load the snapshot
+
+            single = []
+            for query in queries:
+                started = time.perf_counter()
+                vector_index.search(user_id, query, k=5)
+                single.append((time.perf_counter() - started) * 1000)
+
+            batches = [queries[start:start + options['batch']] for start in range(0, len(queries), options['batch'])]
+            started = time.perf_counter()
+            for batch in batches:
+                vector_index.search_many(user_id, batch, k=5)
+            batched = (time.perf_counter() - started) * 1000 / len(queries)
+
+            started = time.perf_counter()
+            vector_index.update_notes(user_id, [notes[0]])
+            update = (time.perf_counter() - started) * 1000
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        chunks = options['chunks']
+        single.sort()
+        self.stdout.write(f"chunks              {chunks:,}")
+        self.stdout.write(f"build               {build:.1f}s ({chunks / build:,.0f} chunks/s)")
+        self.stdout.write(f"query ms            p50 {statistics.median(single):.2f}  p95 {single[int(len(single) * 0.95) - 1]:.2f}")
+        self.stdout.write(f"batched query ms    {batched:.2f} per query ({options['batch']} per batch)")
+        self.stdout.write(f"single-note update  {update:.1f} ms")
+        self.stdout.write(f"on disk             {disk / 2 ** 20:.1f} MiB ({disk / chunks * 100_000 / 2 ** 20:.1f} MiB per 100k chunks)")
+        self.stdout.write(f"peak RSS growth     {(rss_after - rss_before) / 1024:.1f} MiB while querying")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from youcademy.openapi import FORMATS, schema_cache
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema into OPENAPI_SCHEMA_DIR, so no request has to. Run it at build time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', action='append', choices=tuple(FORMATS),
+                            help="Format to write; repeatable (default: all).")
+        parser.add_argument('--check', action='store_true',
+                            help="Only check that the schema for the current URLconf exists; fail if it doesn't.")
+
+    def handle(self, *args, **options):
+        formats = options['format'] or list(FORMATS)
+        version = schema_cache.version()
+        if options['check']:
+            missing = [schema_cache.path(version, format) for format in formats if schema_cache.read(version, format) is None]
+            if missing:
+                raise CommandError(f"No schema for URLconf {version}: {', '.join(missing)}")
+            self.stdout.write(f"Schema for URLconf {version} is up to date")
+            return
+
+        started = time.perf_counter()
+        bodies = schema_cache.build(formats)
+        elapsed = time.perf_counter() - started
+        for format, body in bodies.items():
+            self.stdout.write(f"Wrote {schema_cache.path(version, format)} ({len(body)} bytes)")
+        self.stdout.write(self.style.SUCCESS(f"Generated the schema for URLconf {version} in {elapsed:.2f}s"))
@@ -0,0 +1,87 @@
+import datetime
+import io
+import pstats
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from youcademy.profiling import DumpStore
+
+
+class Command(BaseCommand):
+    help = (
+        "List request profile dumps, summarize one, or render one as collapsed stacks "
+        "for flamegraph.pl, speedscope or inferno."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', nargs='?', default='list', choices=('list', 'show', 'collapse'))
+        parser.add_argument('dump_id', nargs='?', default='latest', help="A dump ID, an ID prefix, or 'latest'.")
+        parser.add_argument('--dir', help="Dump directory (default: PROFILING_DIR).")
+        parser.add_argument('--limit', type=int, default=20, help="Rows to list or show.")
+        parser.add_argument('--output', help="collapse: write the stacks to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        store = DumpStore(options['dir'])
+        if options['action'] == 'list':
+            return self._list(store, options['limit'])
+
+        dump_id = self._resolve(store, options['dump_id'])
+        meta = store.load(dump_id)
+        if options['action'] == 'show':
+            return self._show(store, dump_id, meta, options['limit'])
+
+        stacks = meta['stacks']
+        lines = ''.join(f'{stack} {value}\n' for stack, value in sorted(stacks.items()))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(lines)
+            self.stdout.write(f"Wrote {len(stacks)} stacks to {options['output']}")
+        else:
+            self.stdout.write(lines, ending='')
+
+    def _resolve(self, store, dump_id):
+        ids = store.ids()
+        if not ids:
+            raise CommandError(f"No profile dumps in {store.directory}")
+        if dump_id == 'latest':
+            return ids[-1]
+        matches = [candidate for candidate in ids if candidate.startswith(dump_id)]
+        if len(matches) != 1:
+            raise CommandError(f"{len(matches)} dumps match {dump_id!r}")
+        return matches[0]
+
+    def _list(self, store, limit):
+        ids = store.ids()
+        self.stdout.write(f"{'id':<29}{'started':<21}{'mode':<10}{'status':>7}{'ms':>10}{'queries':>9}{'db ms':>9}  request")
+        for dump_id in ids[-limit:]:
+            meta = store.load(dump_id)
+            started = datetime.datetime.fromtimestamp(meta['started']).strftime('%Y-%m-%d %H:%M:%S')
+            self.stdout.write(
+                f"{dump_id:<29}{started:<21}{meta['mode']:<10}{meta['status']:>7}{meta['duration_ms']:>10.1f}"
+                f"{meta['db_queries']:>9}{meta['db_ms']:>9.1f}  {meta['method']} {meta['path']}"
+            )
+        self.stdout.write(f"{len(ids)} dumps in {store.directory}")
+
+    def _show(self, store, dump_id, meta, limit):
+        self.stdout.write(
+            f"{meta['method']} {meta['path']} -> {meta['status']} in {meta['duration_ms']} ms "
+            f"({meta['mode']}, request {meta['request_id']})"
+        )
+        self.stdout.write(f"\n{meta['db_queries']} queries, {meta['db_ms']} ms; slowest:")
+        for query in sorted(meta['queries'], key=lambda query: -query['ms'])[:limit]:
+            self.stdout.write(f"{query['ms']:>9.3f} ms  {query['sql'][:160]}")
+
+        if meta['mode'] == 'cprofile':
+            output = io.StringIO()
+            stats = pstats.Stats(store.path(dump_id, 'prof'), stream=output)
+            stats.sort_stats('cumulative').print_stats(limit)
+            self.stdout.write(output.getvalue())
+        total = sum(meta['stacks'].values()) or 1
+        leaves = Counter()
+        for stack, count in meta['stacks'].items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        self.stdout.write(f"\n{total} samples every {meta['interval'] * 1000:g} ms; hottest frames:")
+        for leaf, count in leaves.most_common(limit):
+            self.stdout.write(f"{count / total:>8.1%}  {leaf}")
+        self.stdout.write(f"\nFlamegraph: python manage.py profiles collapse {dump_id} --output {dump_id}.folded")
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from content_management.models import Note, Question
+from content_management.search import KINDS, NOTE, get_search_backend, note_document, question_document
+
+
+class Command(BaseCommand):
+    help = "Rebuild the content search index from the Note and Question tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=KINDS, help="Only rebuild one kind of document.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if not backend.is_available():
+            raise CommandError(f"{type(backend).__name__} is not available on this database.")
+        backend.setup()
+
+        kinds = [options['kind']] if options['kind'] else list(KINDS)
+        for kind in kinds:
+            started = time.perf_counter()
+            if kind == NOTE:
+                objects = Note.objects.order_by('pk')
+                to_document = note_document
+            else:
+                objects = Question.objects.select_related('quiz').only('pk', 'content', 'quiz__user_id').order_by('pk')
+                to_document = lambda question: question_document(question, question.quiz.user_id)  # noqa: E731
+
+            count = 0
+            with transaction.atomic():
+                backend.clear(kind)
+                batch = []
+                for obj in objects.iterator(chunk_size=options['batch_size']):
+                    batch.append(to_document(obj))
+                    if len(batch) >= options['batch_size']:
+                        backend.index(batch)
+                        count += len(batch)
+                        batch = []
+                backend.index(batch)
+                count += len(batch)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} {kind} documents in {elapsed:.1f}s"))
@@ -0,0 +1,38 @@
+import time
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+
+from content_management.models import Note
+from content_management.vectors import vector_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user vector index from the Note table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only rebuild this user's shard (user id).")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        notes = Note.objects.only('pk', 'user_id', 'title', 'content').order_by('user_id', 'pk')
+        if options['user']:
+            notes = notes.filter(user_id=options['user'])
+
+        users = count = 0
+        for user_id, user_notes in groupby(notes.iterator(chunk_size=options['batch_size']), key=lambda note: note.user_id):
+            vector_index.purge_user(user_id)
+            batch = []
+            for note in user_notes:
+                batch.append(note)
+                if len(batch) >= options['batch_size']:
+                    vector_index.update_notes(user_id, batch)
+                    count += len(batch)
+                    batch = []
+            vector_index.update_notes(user_id, batch)
+            count += len(batch)
+            users += 1
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Embedded {count} notes for {users} users in {elapsed:.1f}s"))
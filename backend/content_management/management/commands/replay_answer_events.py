@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from content_management.answer_events import replay
+
+
+class Command(BaseCommand):
+    help = (
+        "Store answer events left in the spool by workers that stopped before writing them. "
+        "Segments still held by a running worker are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Spool directory (default: ANSWER_EVENTS_SPOOL_DIR).")
+
+    def handle(self, *args, **options):
+        count = replay(options['dir'])
+        self.stdout.write(self.style.SUCCESS(f"Replayed {count} answer events"))
@@ -0,0 +1,36 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into the SQLite replica files (local development only)."
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("Only SQLite primaries can be copied; real replicas are kept in sync by the database.")
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured, set DATABASE_REPLICA_URLS.")
+
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                replica = settings.DATABASES[alias]
+                if replica['ENGINE'] != 'django.db.backends.sqlite3':
+                    self.stderr.write(f"Skipping {alias}: not SQLite")
+                    continue
+                connections[alias].close()
+                started = time.perf_counter()
+                target = sqlite3.connect(replica['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(self.style.SUCCESS(f"Copied the primary to {alias} ({replica['NAME']}) in {elapsed:.2f}s"))
+        finally:
+            source.close()
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='note_user_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='quiz_user_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from content_management.search import get_search_backend
+
+    backend = get_search_backend()
+    if backend.is_available(schema_editor.connection):
+        backend.setup(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from content_management.search import get_search_backend
+
+    backend = get_search_backend()
+    if backend.is_available(schema_editor.connection):
+        backend.teardown(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0002_note_quiz_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
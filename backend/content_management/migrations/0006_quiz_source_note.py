@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content_management', '0005_quiz_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='source_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='source_note',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generated_quiz', to='content_management.note'),
+        ),
+    ]
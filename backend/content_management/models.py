@@ -11,6 +11,12 @@ class Note(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination: WHERE user = ? AND (created_at, id) < (?, ?)
+            models.Index(fields=['user', 'created_at', 'id'], name='note_user_created_id_idx')
+        ]
+    
     def __str__(self):
         return f"Note: {self.title} (by {self.user.get_full_name()})"
 
@@ -20,6 +26,11 @@ class Quiz(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quizzes')
     title = models.CharField(max_length=255, blank=False)
     description = models.TextField()
+    version = models.PositiveIntegerField(default=1, editable=False)  # Bumped on any quiz or question change
+    source_note = models.OneToOneField(
+        Note, on_delete=models.SET_NULL, null=True, blank=True, related_name='generated_quiz'
+    )
+    source_hash = models.CharField(max_length=64, blank=True)  # Content hash of the note the questions came from
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -27,6 +38,17 @@ class Quiz(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['user', 'title'], name='unique_user_quiz_title')
         ]
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='quiz_user_created_id_idx')
+        ]
+    
+    def save(self, *args, **kwargs):
+        # version is only ever bumped in the database; never write back a stale in-memory copy
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'version'
+            ]
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Quiz: {self.title} (by {self.user.get_full_name()})"     
@@ -43,3 +65,54 @@ class Question(models.Model):
     
     def __str__(self):
         return f"Question: {self.content[:30]}... (in quiz {self.quiz.title})"
+
+
+# Class for a graded quiz submission
+class QuizAttempt(models.Model):
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
+    quiz_version = models.PositiveIntegerField()  # Version of the answer key the attempt was graded against
+    score = models.PositiveIntegerField()
+    total = models.PositiveIntegerField()
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['quiz', 'user'], name='attempt_quiz_user_idx')
+        ]
+    
+    def __str__(self):
+        return f"Attempt: {self.score}/{self.total} (in quiz {self.quiz_id})"
+
+
+# Class for the outcome of one question in an attempt
+class QuestionResult(models.Model):
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='results')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='results')
+    answer = models.CharField(max_length=255, blank=True)
+    is_correct = models.BooleanField()
+    
+    def __str__(self):
+        return f"Result: {'correct' if self.is_correct else 'wrong'} (question {self.question_id})"
+
+
+# Class for one answer given during a live quiz, as it was sent (see answer_events.py)
+class AnswerEvent(models.Model):
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='answer_events')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answer_events')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='answer_events')
+    answer = models.CharField(max_length=255, blank=True)
+    idempotency_key = models.CharField(max_length=64)  # Chosen by the client; a resent event reuses it
+    answered_at = models.DateTimeField()  # When the API accepted it
+    recorded_at = models.DateTimeField(auto_now_add=True)  # When the batch holding it was written
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_user_answer_event')
+        ]
+        indexes = [
+            models.Index(fields=['quiz', 'user'], name='answer_event_quiz_user_idx')
+        ]
+
+    def __str__(self):
+        return f"Answer event: {self.answer!r} (question {self.question_id})"
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+        Keyset (cursor) pagination over (created_at, id), newest first.
+        - No COUNT(*) and no OFFSET: every page is an index range scan, so deep pages cost the same as the first.
+        - Cursors are signed, so clients can't forge or tamper with positions.
+        - Pair it with a composite index on (user, created_at, id).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    salt = 'content_management.pagination'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def get_page_size(self, request) -> int:
+        page_size = api_settings.PAGE_SIZE or 10
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return min(max(requested, 1), self.max_page_size)
+
+    def make_cursor(self, row, reverse: bool) -> str:
+        return signing.dumps([row.created_at.isoformat(), row.pk, reverse], salt=self.salt, compress=True)
+
+    def encode_cursor(self, row, reverse: bool) -> str:
+        return replace_query_param(self.base_url, self.cursor_query_param, self.make_cursor(row, reverse))
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            created_at, pk, reverse = signing.loads(token, salt=self.salt)
+            return datetime.fromisoformat(created_at), int(pk), bool(reverse)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        reverse = False
+        if cursor is not None:
+            created_at, pk, reverse = cursor
+            # (created_at, id) < (c, i), written so the planner can range-scan the index on created_at
+            if reverse:
+                queryset = queryset.filter(created_at__gte=created_at).filter(Q(created_at__gt=created_at) | Q(pk__gt=pk))
+            else:
+                queryset = queryset.filter(created_at__lte=created_at).filter(Q(created_at__lt=created_at) | Q(pk__lt=pk))
+
+        ordering = ('created_at', 'pk') if reverse else ('-created_at', '-pk')
+        # Fetch one extra row to learn whether another page exists
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
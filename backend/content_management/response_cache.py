@@ -0,0 +1,261 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from youcademy.metrics import record_cache
+
+from .llm import NOTES_MARKER, QUESTION_MARKER
+from .vectors import get_embedder
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]+', re.UNICODE)
+
+EXACT = 'exact'
+SIMILAR = 'similar'
+MISS = 'miss'
+
+
+def normalize_prompt(text) -> str:
+    """
+    Casefold, drop punctuation and collapse whitespace, so trivially different
+    spellings of the same question share a cache key.
+    """
+    return ' '.join(_PUNCTUATION_RE.sub(' ', text.casefold()).split())
+
+
+def split_prompt(prompt):
+    """
+    Split a prompt into (instructions, question, context). Prompts in this app
+    put the notes last after NOTES_MARKER and the user's question, if any,
+    after QUESTION_MARKER.
+    """
+    head, marker, context = prompt.rpartition(NOTES_MARKER)
+    if not marker:
+        head, context = prompt, ''
+    instructions, marker, question = head.rpartition(QUESTION_MARKER)
+    if not marker:
+        instructions, question = head, ''
+    return instructions, question, context
+
+
+def _digest(*parts) -> str:
+    return hashlib.blake2b('\x1f'.join(str(part) for part in parts).encode(), digest_size=16).hexdigest()
+
+
+class Lookup:
+    """
+        Result of a cache lookup: the response if there was a hit, and
+        what is needed to store the response after a miss.
+    """
+    __slots__ = ('key', 'bucket', 'embedding', 'response', 'kind')
+
+    def __init__(self, key, bucket, embedding=None, response=None, kind=MISS):
+        self.key = key
+        self.bucket = bucket
+        self.embedding = embedding
+        self.response = response
+        self.kind = kind
+
+
+class ResponseCache:
+    """
+        Caches LLM responses by prompt so repeated questions don't call the model.
+        - Exact hits: keyed on model, scope, the normalized instructions and
+          question, and a hash of the context (the notes). Entries live in an
+          in-process LRU bounded by count and bytes, and in the shared cache so
+          other processes hit too.
+        - Similar hits (AI_RESPONSE_CACHE_SIMILARITY > 0): a question whose
+          embedding is at least that similar to a cached one, asked against the
+          same instructions and context, reuses its response. In-process only.
+        - Pass `scope` (the user id) when the context is private; entries are
+          only ever shared within a scope.
+    """
+    cache_prefix = 'ai:response'
+
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> (response, expires, size, bucket)
+        self._buckets = {}  # bucket -> {key: embedding}
+        self._bytes = 0
+        self._stats = {EXACT: 0, SIMILAR: 0, MISS: 0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'AI_RESPONSE_CACHE_ENABLED', True)
+
+    @property
+    def ttl(self) -> int:
+        return getattr(settings, 'AI_RESPONSE_CACHE_TTL', 24 * 3600)
+
+    @property
+    def max_entries(self) -> int:
+        return getattr(settings, 'AI_RESPONSE_CACHE_MAX_ENTRIES', 10000)
+
+    @property
+    def max_bytes(self) -> int:
+        return getattr(settings, 'AI_RESPONSE_CACHE_MAX_BYTES', 64 * 2 ** 20)
+
+    @property
+    def similarity(self) -> float:
+        return getattr(settings, 'AI_RESPONSE_CACHE_SIMILARITY', 0.0)
+
+    def _key(self, *parts) -> str:
+        return ':'.join((self.cache_prefix,) + tuple(str(part) for part in parts))
+
+    # Lookups
+
+    def lookup(self, model, prompt, scope=None) -> Lookup:
+        instructions, question, context = split_prompt(prompt)
+        question = normalize_prompt(question)
+        bucket = _digest(model, scope or '', normalize_prompt(instructions), hashlib.sha256(context.encode()).hexdigest())
+        key = _digest(bucket, question)
+        result = Lookup(key, bucket)
+
+        if self.enabled:
+            result.response = self._get_local(key)
+            if result.response is None:
+                result.response = cache.get(self._key(key))
+                if result.response is not None:
+                    self._put_local(key, bucket, result.response, None)
+            if result.response is not None:
+                result.kind = EXACT
+            elif self.similarity > 0 and question:
+                result.embedding = get_embedder().embed([question])[0]
+                result.response = self._get_similar(bucket, result.embedding)
+                if result.response is not None:
+                    result.kind = SIMILAR
+        with self._lock:
+            self._stats[result.kind] += 1
+        if self.enabled:
+            record_cache('llm_response', result.response is not None)
+        return result
+
+    def store(self, lookup, response) -> None:
+        if not self.enabled or lookup.response is not None or not response:
+            return
+        self._put_local(lookup.key, lookup.bucket, response, lookup.embedding)
+        cache.set(self._key(lookup.key), response, self.ttl)
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _get_similar(self, bucket, embedding):
+        with self._lock:
+            candidates = self._buckets.get(bucket)
+            if not candidates:
+                return None
+            keys = list(candidates)
+            scores = np.stack([candidates[key] for key in keys]) @ embedding
+        for index in np.argsort(-scores):
+            if scores[index] < self.similarity:
+                break
+            response = self._get_local(keys[index])
+            if response is not None:
+                return response
+        return None
+
+    def _put_local(self, key, bucket, response, embedding):
+        size = len(response.encode())
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (response, time.monotonic() + self.ttl, size, bucket)
+            self._bytes += size
+            if embedding is not None:
+                self._buckets.setdefault(bucket, {})[key] = embedding
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        # Caller holds the lock
+        _, _, size, bucket = self._entries.pop(key)
+        self._bytes -= size
+        candidates = self._buckets.get(bucket)
+        if candidates is not None:
+            candidates.pop(key, None)
+            if not candidates:
+                del self._buckets[bucket]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._bytes = 0
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def stats(self) -> dict:
+        """
+        Lookup counts and hit rate since the process started (or the last clear()).
+        """
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+        lookups = stats[EXACT] + stats[SIMILAR] + stats[MISS]
+        stats['hit_rate'] = (stats[EXACT] + stats[SIMILAR]) / lookups if lookups else 0.0
+        return stats
+
+    # Cached model calls
+
+    def generate(self, client, prompt, scope=None) -> str:
+        _record(prompt, scope)
+        lookup = self.lookup(client.model, prompt, scope)
+        if lookup.response is not None:
+            return lookup.response
+        response = client.generate(prompt)
+        self.store(lookup, response)
+        return response
+
+    async def astream(self, client, prompt, scope=None):
+        """
+        Stream a response, replaying it in one piece on a hit. A response is
+        only cached when its stream ran to the end.
+        """
+        await sync_to_async(_record, thread_sensitive=False)(prompt, scope)
+        lookup = await sync_to_async(self.lookup, thread_sensitive=False)(client.model, prompt, scope)
+        if lookup.response is not None:
+            yield lookup.response
+            return
+        pieces = []
+        upstream = client.astream(prompt)
+        try:
+            async for piece in upstream:
+                pieces.append(piece)
+                yield piece
+        finally:
+            await upstream.aclose()
+        await sync_to_async(self.store, thread_sensitive=False)(lookup, ''.join(pieces))
+
+
+# Shared response cache for calls to the language model
+response_cache = ResponseCache()
+
+_log_lock = threading.Lock()
+
+
+def _record(prompt, scope):
+    """
+    Append the prompt to AI_PROMPT_LOG (JSON lines) for replay benchmarks.
+    Off unless the setting is a file path; prompts include note text.
+    """
+    path = getattr(settings, 'AI_PROMPT_LOG', '')
+    if not path:
+        return
+    line = json.dumps({'at': time.time(), 'scope': str(scope) if scope else None, 'prompt': prompt})
+    with _log_lock, open(path, 'a', encoding='utf-8') as handle:
+        handle.write(line + '\n')
@@ -0,0 +1,363 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager, suppress
+
+from django.conf import settings
+
+from .llm import LLMClient, LLMError
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: a free slot always goes to the lowest lane number waiting
+INTERACTIVE = 0
+BACKGROUND = 1
+LANES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'user', 'wake', 'enqueued_at', 'granted')
+
+    def __init__(self, priority, seq, user, wake):
+        self.priority = priority
+        self.seq = seq
+        self.user = user
+        self.wake = wake
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class _StreamFlight:
+    """
+        One upstream stream shared by every identical request. Pieces are kept so
+        late subscribers replay from the start. Lives on one event loop.
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task = None
+
+
+class LLMScheduler:
+    """
+        Admission control for outbound LLM calls, shared by threads and asyncio tasks.
+        - Single-flight: identical prompts already in flight wait for that call
+          instead of making their own. Streams are shared the same way.
+        - At most AI_LLM_MAX_CONCURRENT calls run at once, and at most
+          AI_LLM_MAX_CONCURRENT_PER_USER for any one user.
+        - Waiting calls are granted slots by lane, interactive first, then in
+          arrival order. A call that waits longer than AI_LLM_QUEUE_TIMEOUT
+          fails with LLMError.
+        - Clients with `supports_batching` get up to AI_LLM_BATCH_SIZE prompts
+          per request, in a single slot.
+        - stats() reports queue depth, wait times, calls saved by coalescing and
+          waits abandoned on timeout or cancellation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._active_by_user = Counter()
+        self._flights = {}
+        self._waits = {lane: [0, 0.0, 0.0] for lane in LANES}  # count, total, max seconds
+        self._coalesced = 0
+        self._batches = 0
+        self._abandoned = 0
+
+    @property
+    def max_concurrency(self) -> int:
+        return getattr(settings, 'AI_LLM_MAX_CONCURRENT', 8)
+
+    @property
+    def max_per_user(self) -> int:
+        return getattr(settings, 'AI_LLM_MAX_CONCURRENT_PER_USER', 4)
+
+    @property
+    def queue_timeout(self) -> float:
+        return getattr(settings, 'AI_LLM_QUEUE_TIMEOUT', 60)
+
+    @property
+    def batch_size(self) -> int:
+        return getattr(settings, 'AI_LLM_BATCH_SIZE', 16)
+
+    def client(self, client, user=None, priority=INTERACTIVE):
+        """
+        Wrap a client so every call made through it is scheduled.
+        """
+        return ScheduledClient(self, client, user, priority)
+
+    # Slots
+
+    def _dispatch(self):
+        # Caller holds the lock. Returns the wake-up callbacks to run after releasing it.
+        woken = []
+        for waiter in sorted(self._queue, key=lambda waiter: (waiter.priority, waiter.seq)):
+            if self._active >= self.max_concurrency:
+                break
+            if waiter.user is not None and self._active_by_user[waiter.user] >= self.max_per_user:
+                continue
+            self._queue.remove(waiter)
+            self._grant(waiter)
+            woken.append(waiter.wake)
+        return woken
+
+    def _grant(self, waiter):
+        waiter.granted = True
+        self._active += 1
+        if waiter.user is not None:
+            self._active_by_user[waiter.user] += 1
+        waited = time.monotonic() - waiter.enqueued_at
+        stats = self._waits[waiter.priority]
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] = max(stats[2], waited)
+
+    def _enqueue(self, user, priority, wake):
+        with self._lock:
+            waiter = _Waiter(priority, next(self._seq), user, wake)
+            self._queue.append(waiter)
+            woken = self._dispatch()
+        for callback in woken:
+            callback()
+        return waiter
+
+    def _release(self, user):
+        with self._lock:
+            self._active -= 1
+            if user is not None:
+                self._active_by_user[user] -= 1
+                if not self._active_by_user[user]:
+                    del self._active_by_user[user]
+            woken = self._dispatch()
+        for callback in woken:
+            callback()
+
+    def _abandon(self, waiter) -> bool:
+        """
+        Take a waiter that gave up out of the queue. Returns True if it had been
+        granted a slot in the meantime, which the caller then owns.
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queue.remove(waiter)
+            self._abandoned += 1
+            return False
+
+    @contextmanager
+    def slot(self, user=None, priority=INTERACTIVE):
+        event = threading.Event()
+        waiter = self._enqueue(user, priority, event.set)
+        if not event.wait(self.queue_timeout) and not self._abandon(waiter):
+            raise LLMError(f"No LLM capacity after waiting {self.queue_timeout}s")
+        try:
+            yield
+        finally:
+            self._release(user)
+
+    @asynccontextmanager
+    async def aslot(self, user=None, priority=INTERACTIVE):
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(user, priority, wake)
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await granted
+        except TimeoutError:
+            if not self._abandon(waiter):
+                raise LLMError(f"No LLM capacity after waiting {self.queue_timeout}s")
+        except asyncio.CancelledError:
+            if self._abandon(waiter):
+                self._release(user)
+            raise
+        try:
+            yield
+        finally:
+            self._release(user)
+
+    # Calls
+
+    def _join(self, key):
+        # Returns (flight, True) for a new flight the caller must run, or an existing one
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Future()
+            return flight, True
+
+    def _land(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def generate(self, client, prompt, user=None, priority=INTERACTIVE) -> str:
+        key = (client.model, prompt)
+        flight, leader = self._join(key)
+        if not leader:
+            return flight.result()
+        try:
+            with self.slot(user, priority):
+                response = client.generate(prompt)
+            flight.set_result(response)
+            return response
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            self._land(key, flight)
+
+    def generate_many(self, client, prompts, user=None, priority=INTERACTIVE):
+        """
+        Generate one response per prompt. Without provider batching this is one
+        scheduled call per prompt, in order.
+        """
+        if not client.supports_batching or len(prompts) == 1:
+            return [self.generate(client, prompt, user, priority) for prompt in prompts]
+
+        flights, leading = {}, []
+        for prompt in dict.fromkeys(prompts):
+            flights[prompt], leader = self._join((client.model, prompt))
+            if leader:
+                leading.append(prompt)
+        try:
+            for start in range(0, len(leading), self.batch_size):
+                batch = leading[start:start + self.batch_size]
+                with self.slot(user, priority):
+                    responses = client.generate_many(batch)
+                with self._lock:
+                    self._batches += 1
+                for prompt, response in zip(batch, responses):
+                    flights[prompt].set_result(response)
+        except BaseException as e:
+            for prompt in leading:
+                if not flights[prompt].done():
+                    flights[prompt].set_exception(e)
+            raise
+        finally:
+            for prompt in leading:
+                self._land((client.model, prompt), flights[prompt])
+        return [flights[prompt].result() for prompt in prompts]
+
+    async def astream(self, client, prompt, user=None, priority=INTERACTIVE):
+        """
+        Stream a response, sharing one upstream stream between identical
+        prompts. The upstream is closed once its last subscriber leaves.
+        """
+        key = ('stream', id(asyncio.get_running_loop()), client.model, prompt)
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _StreamFlight()
+                flight.task = asyncio.create_task(self._pump(key, flight, client, prompt, user, priority))
+            else:
+                self._coalesced += 1
+            flight.subscribers += 1
+
+        index = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: index < len(flight.pieces) or flight.done)
+                    pieces = flight.pieces[index:]
+                    finished = flight.done
+                index += len(pieces)
+                for piece in pieces:
+                    yield piece
+                if finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.task.done():
+                self._land(key, flight)
+                flight.task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await flight.task  # The upstream is closed before this returns
+
+    async def _pump(self, key, flight, client, prompt, user, priority):
+        try:
+            async with self.aslot(user, priority):
+                upstream = client.astream(prompt)
+                try:
+                    async for piece in upstream:
+                        async with flight.changed:
+                            flight.pieces.append(piece)
+                            flight.changed.notify_all()
+                finally:
+                    await upstream.aclose()
+        except Exception as e:
+            flight.error = e
+        finally:
+            self._land(key, flight)
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = Counter(waiter.priority for waiter in self._queue)
+            return {
+                'active': self._active,
+                'queued': {name: queued[lane] for lane, name in LANES.items()},
+                'wait': {
+                    name: {
+                        'count': self._waits[lane][0],
+                        'avg_ms': self._waits[lane][1] / self._waits[lane][0] * 1000 if self._waits[lane][0] else 0.0,
+                        'max_ms': self._waits[lane][2] * 1000,
+                    }
+                    for lane, name in LANES.items()
+                },
+                'coalesced': self._coalesced,
+                'batches': self._batches,
+                'abandoned': self._abandoned,
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._waits = {lane: [0, 0.0, 0.0] for lane in LANES}
+            self._coalesced = self._batches = self._abandoned = 0
+
+
+class ScheduledClient(LLMClient):
+    """
+        An LLMClient whose calls go through an LLMScheduler on behalf of one
+        user, in one lane.
+    """
+
+    def __init__(self, scheduler, client, user=None, priority=INTERACTIVE):
+        self.scheduler = scheduler
+        self.wrapped = client
+        self.user = user
+        self.priority = priority
+        self.model = client.model
+        self.supports_batching = client.supports_batching
+
+    def generate(self, prompt: str) -> str:
+        return self.scheduler.generate(self.wrapped, prompt, self.user, self.priority)
+
+    def generate_many(self, prompts):
+        return self.scheduler.generate_many(self.wrapped, prompts, self.user, self.priority)
+
+    def astream(self, prompt: str):
+        return self.scheduler.astream(self.wrapped, prompt, self.user, self.priority)
+
+
+# Shared scheduler for every outbound LLM call in this process
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,222 @@
+import logging
+import re
+import sqlite3
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Kinds of indexed documents. The kind is folded into the FTS rowid so that
+# updates and deletes are rowid lookups rather than table scans.
+NOTE = 'note'
+QUESTION = 'question'
+KINDS = (NOTE, QUESTION)
+
+
+@dataclass
+class SearchDocument:
+    kind: str
+    object_id: int
+    user_id: str
+    title: str
+    body: str
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    object_id: int
+    title: str
+    snippet: str
+    score: float
+
+
+def note_document(note):
+    return SearchDocument(NOTE, note.pk, note.user_id.hex, note.title, note.content)
+
+
+def question_document(question, user_id):
+    return SearchDocument(QUESTION, question.pk, user_id.hex, '', question.content)
+
+
+_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def parse_query(text, any_term=False):
+    """
+    Turn user input into a safe FTS5 query.
+
+    "quoted text" becomes a phrase query and every other word a prefix query;
+    all terms must match, or any of them with any_term. Returns None if nothing
+    searchable is left.
+    """
+    terms = []
+    for phrase, word in _TOKEN_RE.findall(text or ''):
+        if phrase:
+            words = _WORD_RE.findall(phrase)
+            if words:
+                terms.append('"' + ' '.join(words) + '"')
+        else:
+            for part in _WORD_RE.findall(word):
+                terms.append(f'"{part}"*')
+    return (' OR ' if any_term else ' AND ').join(terms) or None
+
+
+@lru_cache(maxsize=None)
+def sqlite_has_fts5() -> bool:
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE probe USING fts5(body)")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+class SearchBackend:
+    """
+        Interface for content search backends. Set CONTENT_SEARCH_BACKEND to
+        the dotted path of a subclass to plug in another engine. `is_available`,
+        `setup` and `teardown` take the connection to work on, for migrations
+        run against a database other than the default one.
+    """
+
+    def is_available(self, db_connection=None) -> bool:
+        return True
+
+    def setup(self, db_connection=None) -> None:
+        """Create whatever storage the backend needs."""
+
+    def teardown(self, db_connection=None) -> None:
+        """Drop the backend's storage."""
+
+    def index(self, documents) -> None:
+        raise NotImplementedError
+
+    def remove(self, kind, object_ids) -> None:
+        raise NotImplementedError
+
+    def clear(self, kind=None) -> None:
+        raise NotImplementedError
+
+    def purge_owner(self, user_id) -> None:
+        raise NotImplementedError
+
+    def search(self, user_id, query, kind=None, limit=20, any_term=False):
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """
+        Inverted index in an SQLite FTS5 virtual table next to the app tables.
+        - The owner's id is an indexed column and part of every MATCH, so
+          scoping to one user is an index intersection, not a filter.
+        - Results are ranked with bm25, weighting titles above bodies.
+    """
+    table = 'content_management_search'
+
+    def is_available(self, db_connection=None) -> bool:
+        return (db_connection or connection).vendor == 'sqlite' and sqlite_has_fts5()
+
+    def _rowid(self, kind, object_id) -> int:
+        return object_id * len(KINDS) + KINDS.index(kind)
+
+    def setup(self, db_connection=None) -> None:
+        with (db_connection or connection).cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "owner, kind UNINDEXED, object_id UNINDEXED, title, body, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+
+    def teardown(self, db_connection=None) -> None:
+        with (db_connection or connection).cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index(self, documents) -> None:
+        rows = [
+            (self._rowid(doc.kind, doc.object_id), doc.user_id, doc.kind, doc.object_id, doc.title, doc.body)
+            for doc in documents
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, owner, kind, object_id, title, body) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, kind, object_ids) -> None:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = %s",
+                [(self._rowid(kind, object_id),) for object_id in object_ids],
+            )
+
+    def clear(self, kind=None) -> None:
+        with connection.cursor() as cursor:
+            if kind is None:
+                cursor.execute(f"DELETE FROM {self.table}")
+            else:
+                cursor.execute(f"DELETE FROM {self.table} WHERE kind = %s", [kind])
+
+    def purge_owner(self, user_id) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE {self.table} MATCH %s", [f'owner : "{user_id.hex}"'])
+
+    def search(self, user_id, query, kind=None, limit=20, any_term=False):
+        expression = parse_query(query, any_term)
+        if expression is None:
+            return []
+        match = f'owner : "{user_id.hex}" AND ({expression})'
+        sql = (
+            f"SELECT kind, object_id, title, "
+            f"snippet({self.table}, 4, '[', ']', '...', 12), bm25({self.table}, 0, 0, 0, 5.0, 1.0) AS score "
+            f"FROM {self.table} WHERE {self.table} MATCH %s"
+        )
+        params = [match]
+        if kind is not None:
+            sql += " AND kind = %s"
+            params.append(kind)
+        sql += " ORDER BY score LIMIT %s"
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                SearchHit(kind, object_id, title, snippet, -score)
+                for kind, object_id, title, snippet, score in cursor.fetchall()
+            ]
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend() -> SearchBackend:
+    return _load_backend(getattr(settings, 'CONTENT_SEARCH_BACKEND', 'content_management.search.SQLiteFTS5Backend'))
+
+
+def refresh_document(kind, object_id) -> None:
+    """
+    Re-read one object from the database and update (or drop) its index entry.
+    """
+    from .models import Note, Question
+
+    backend = get_search_backend()
+    if kind == NOTE:
+        note = Note.objects.filter(pk=object_id).first()
+        documents = [note_document(note)] if note else []
+    else:
+        question = Question.objects.select_related('quiz').filter(pk=object_id).first()
+        documents = [question_document(question, question.quiz.user_id)] if question else []
+
+    if documents:
+        backend.index(documents)
+    else:
+        backend.remove(kind, [object_id])
@@ -0,0 +1,77 @@
+from django.conf import settings
+from rest_framework import serializers
+from .models import Note, Quiz, QuizAttempt, Question
+
+
+# Note serializer
+class NoteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Note
+        fields = ['id', 'title', 'content', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+# Quiz serializer
+class QuizSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Quiz
+        fields = ['id', 'title', 'description', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+    def validate_title(self, value):
+        # The owner isn't a serializer field, so DRF can't derive this from unique_user_quiz_title
+        request = self.context.get('request')
+        if request is None:
+            return value
+        quizzes = Quiz.objects.filter(user=request.user, title=value)
+        if self.instance is not None:
+            quizzes = quizzes.exclude(pk=self.instance.pk)
+        if quizzes.exists():
+            raise serializers.ValidationError("You already have a quiz with this title.")
+        return value
+
+
+# Quiz submission serializer
+class QuizSubmissionSerializer(serializers.Serializer):
+    answers = serializers.DictField(child=serializers.CharField(allow_blank=True, max_length=255))
+
+    def validate_answers(self, answers):
+        # JSON object keys are strings; question ids are integers
+        try:
+            return {int(question_id): answer for question_id, answer in answers.items()}
+        except ValueError:
+            raise serializers.ValidationError("Answers must be keyed by question id.")
+
+
+# Graded attempt serializer
+class QuizAttemptSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuizAttempt
+        fields = ['id', 'quiz', 'quiz_version', 'score', 'total', 'submitted_at']
+        read_only_fields = fields
+
+
+# Answer event serializers
+class AnswerEventSerializer(serializers.Serializer):
+    question = serializers.IntegerField()
+    answer = serializers.CharField(allow_blank=True, max_length=255)
+    idempotency_key = serializers.RegexField(r'^[A-Za-z0-9._:-]{1,64}$')
+
+
+class AnswerEventBatchSerializer(serializers.Serializer):
+    events = serializers.ListField(child=AnswerEventSerializer(), min_length=1)
+
+    def validate_events(self, events):
+        limit = getattr(settings, 'ANSWER_EVENTS_MAX_PER_REQUEST', 100)
+        if len(events) > limit:
+            raise serializers.ValidationError(f"At most {limit} events per request.")
+        return events
+
+
+# Search result serializer
+class SearchHitSerializer(serializers.Serializer):
+    kind = serializers.CharField()
+    object_id = serializers.IntegerField()
+    title = serializers.CharField()
+    snippet = serializers.CharField()
+    score = serializers.FloatField()
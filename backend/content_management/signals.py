@@ -0,0 +1,205 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Note, Question, Quiz
+from .search import NOTE, QUESTION, get_search_backend, note_document, question_document
+from .snapshots import quiz_snapshots
+from .vectors import refresh_note_vectors, vector_index
+import logging
+
+# For handling error reporting
+logger = logging.getLogger(__name__)
+
+
+def _index_async():
+    return getattr(settings, 'CONTENT_SEARCH_ASYNC', False)
+
+
+def _schedule_refresh(kind, object_id):
+    """
+    Hand the index update to Celery once the surrounding transaction commits.
+    """
+    from .tasks import update_search_index
+    transaction.on_commit(lambda: update_search_index.delay(kind, object_id))
+
+
+# Keep the search index in step with notes
+@receiver(post_save, sender=Note)
+def index_note(sender, instance, **kwargs):
+    """
+    This function is triggered after a Note is saved.
+    It updates the note's search index entry, inline or through Celery.
+    
+    Args:
+        sender: The model class that sent the signal (Note).
+        instance: The Note instance that was saved.
+    """
+    backend = get_search_backend()
+    if not backend.is_available():
+        return
+    if _index_async():
+        _schedule_refresh(NOTE, instance.pk)
+    else:
+        backend.index([note_document(instance)])
+
+
+# Keep the search index in step with questions
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, **kwargs):
+    """
+    This function is triggered after a Question is saved.
+    It updates the question's search index entry, inline or through Celery.
+    
+    Args:
+        sender: The model class that sent the signal (Question).
+        instance: The Question instance that was saved.
+    """
+    backend = get_search_backend()
+    if not backend.is_available():
+        return
+    if _index_async():
+        _schedule_refresh(QUESTION, instance.pk)
+    else:
+        backend.index([question_document(instance, instance.quiz.user_id)])
+
+
+# Drop deleted notes and questions from the search index
+@receiver(post_delete, sender=Note)
+@receiver(post_delete, sender=Question)
+def unindex_content(sender, instance, **kwargs):
+    """
+    This function is triggered after a Note or Question is deleted.
+    It removes the matching search index entry.
+    
+    Args:
+        sender: The model class that sent the signal (Note or Question).
+        instance: The instance that was deleted.
+    """
+    backend = get_search_backend()
+    if not backend.is_available():
+        return
+    kind = NOTE if sender is Note else QUESTION
+    if _index_async():
+        _schedule_refresh(kind, instance.pk)
+    else:
+        backend.remove(kind, [instance.pk])
+
+
+# Invalidate quiz snapshots when a quiz or its questions change
+@receiver(post_save, sender=Quiz)
+def bump_quiz_version(sender, instance, created, **kwargs):
+    """
+    This function is triggered after a Quiz is saved.
+    It bumps the quiz version so cached snapshots are rebuilt on the next read.
+    
+    Args:
+        sender: The model class that sent the signal (Quiz).
+        instance: The Quiz instance that was saved.
+        created: Boolean indicating if this is a new instance.
+    """
+    if not created:
+        quiz_snapshots.bump_version(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def bump_question_quiz_version(sender, instance, **kwargs):
+    """
+    This function is triggered after a Question is saved or deleted.
+    It bumps the version of the quiz the question belongs to.
+    
+    Args:
+        sender: The model class that sent the signal (Question).
+        instance: The Question instance that was saved or deleted.
+    """
+    quiz_snapshots.bump_version(instance.quiz_id)
+
+
+@receiver(post_delete, sender=Quiz)
+def forget_quiz_snapshots(sender, instance, **kwargs):
+    """
+    This function is triggered after a Quiz is deleted.
+    It drops the quiz's cached snapshots.
+    
+    Args:
+        sender: The model class that sent the signal (Quiz).
+        instance: The Quiz instance that was deleted.
+    """
+    transaction.on_commit(lambda: quiz_snapshots.forget(instance.pk))
+
+
+# Regenerate a note's quiz when it changes, if enabled
+@receiver(post_save, sender=Note)
+def schedule_quiz_generation(sender, instance, **kwargs):
+    """
+    This function is triggered after a Note is saved.
+    It queues quiz generation once the transaction commits. Unchanged notes
+    are detected by content hash in the task and cost no LLM calls.
+    
+    Args:
+        sender: The model class that sent the signal (Note).
+        instance: The Note instance that was saved.
+    """
+    if not getattr(settings, 'AI_QUIZ_AUTOGENERATE', False):
+        return
+    from .tasks import generate_quiz_from_note
+    transaction.on_commit(lambda: generate_quiz_from_note.delay(instance.pk))
+
+
+def _schedule_vector_refresh(user_id, note_id):
+    """
+    Update the note's vectors once the surrounding transaction commits.
+    """
+    def refresh():
+        if getattr(settings, 'AI_VECTOR_INDEX_ASYNC', False):
+            from .tasks import update_note_vectors
+            update_note_vectors.delay(user_id.hex, note_id)
+        else:
+            refresh_note_vectors(user_id, note_id)
+    transaction.on_commit(refresh)
+
+
+# Keep the vector index in step with notes
+@receiver(post_save, sender=Note)
+def index_note_vectors(sender, instance, **kwargs):
+    """
+    This function is triggered after a Note is saved.
+    It re-embeds the note's chunks after commit, inline or through Celery.
+    
+    Args:
+        sender: The model class that sent the signal (Note).
+        instance: The Note instance that was saved.
+    """
+    _schedule_vector_refresh(instance.user_id, instance.pk)
+
+
+@receiver(post_delete, sender=Note)
+def unindex_note_vectors(sender, instance, origin=None, **kwargs):
+    """
+    This function is triggered after a Note is deleted.
+    It drops the note's vectors, unless its owner is being deleted too.
+    
+    Args:
+        sender: The model class that sent the signal (Note).
+        instance: The Note instance that was deleted.
+        origin: The instance or queryset the deletion started from.
+    """
+    if isinstance(origin, get_user_model()):
+        return
+    _schedule_vector_refresh(instance.user_id, instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def purge_user_vectors(sender, instance, **kwargs):
+    """
+    This function is triggered after a User is deleted.
+    It removes the user's whole vector shard.
+    
+    Args:
+        sender: The model class that sent the signal (User).
+        instance: The User instance that was deleted.
+    """
+    user_id = instance.pk  # Cleared on the instance once the delete finishes
+    transaction.on_commit(lambda: vector_index.purge_user(user_id))
@@ -0,0 +1,151 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from youcademy.metrics import record_cache
+
+from .models import Quiz
+
+# Snapshot variants: with correct answers (quiz owner) and without (everyone else)
+FULL = 'full'
+PUBLIC = 'public'
+
+
+class QuizSnapshot:
+    """
+        Pre-rendered quiz JSON, as stored in the cache.
+    """
+    __slots__ = ('quiz_id', 'owner_id', 'version', 'content')
+
+    def __init__(self, quiz_id, owner_id, version, content):
+        self.quiz_id = quiz_id
+        self.owner_id = owner_id
+        self.version = version
+        self.content = content
+
+    def __getstate__(self):
+        return (self.quiz_id, self.owner_id, self.version, self.content)
+
+    def __setstate__(self, state):
+        self.quiz_id, self.owner_id, self.version, self.content = state
+
+    @property
+    def etag(self) -> str:
+        return f'"quiz-{self.quiz_id}-v{self.version}"'
+
+
+class QuizSnapshotStore:
+    """
+        Serves quizzes with their questions from pre-rendered snapshots.
+        - A read is one cache round trip fetching the snapshot and the quiz's current version together.
+        - On a miss (or a stale version) both variants are rebuilt from a single LEFT JOIN query.
+        - Any Quiz or Question change bumps Quiz.version and publishes it to the cache after commit.
+    """
+    cache_prefix = 'quiz'
+
+    @property
+    def ttl(self) -> int:
+        return getattr(settings, 'QUIZ_SNAPSHOT_TTL', 3600)
+
+    def version_key(self, quiz_id) -> str:
+        return f'{self.cache_prefix}:{quiz_id}:version'
+
+    def _snapshot_key(self, quiz_id, variant) -> str:
+        return f'{self.cache_prefix}:{quiz_id}:snapshot:{variant}'
+
+    def get(self, quiz_id, variant=PUBLIC):
+        """
+        Return the snapshot for a quiz, or None if the quiz does not exist.
+
+        Args:
+            quiz_id: Primary key of the quiz
+            variant: FULL to include correct answers, PUBLIC otherwise
+
+        Returns:
+            QuizSnapshot instance or None
+        """
+        version_key = self.version_key(quiz_id)
+        snapshot_key = self._snapshot_key(quiz_id, variant)
+        cached = cache.get_many([version_key, snapshot_key])
+        snapshot = cached.get(snapshot_key)
+        hit = snapshot is not None and snapshot.version == cached.get(version_key)
+        record_cache('quiz_snapshot', hit)
+        if hit:
+            return snapshot
+
+        snapshots = self.build(quiz_id)
+        if snapshots is None:
+            return None
+        return snapshots[variant]
+
+    def build(self, quiz_id):
+        """
+        Render both variants of a quiz from one query and cache them.
+        """
+        rows = list(
+            Quiz.objects.filter(pk=quiz_id)
+            .values(
+                'id', 'user_id', 'title', 'description', 'version',
+                'questions__id', 'questions__content', 'questions__answer_choices', 'questions__correct_answer',
+            )
+            .order_by('questions__id')
+        )
+        if not rows:
+            return None
+
+        quiz = rows[0]
+        questions = [row for row in rows if row['questions__id'] is not None]
+        snapshots = {}
+        for variant in (FULL, PUBLIC):
+            payload = {
+                'id': quiz['id'],
+                'title': quiz['title'],
+                'description': quiz['description'],
+                'version': quiz['version'],
+                'questions': [
+                    {
+                        'id': row['questions__id'],
+                        'content': row['questions__content'],
+                        'answer_choices': row['questions__answer_choices'],
+                        **({'correct_answer': row['questions__correct_answer']} if variant == FULL else {}),
+                    }
+                    for row in questions
+                ],
+            }
+            content = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'))
+            snapshots[variant] = QuizSnapshot(quiz['id'], quiz['user_id'], quiz['version'], content)
+
+        # add(): never overwrite a newer version published by a concurrent writer
+        cache.add(self.version_key(quiz_id), quiz['version'], self.ttl)
+        cache.set_many(
+            {self._snapshot_key(quiz_id, variant): snapshot for variant, snapshot in snapshots.items()},
+            self.ttl,
+        )
+        return snapshots
+
+    def bump_version(self, quiz_id) -> None:
+        """
+        Mark a quiz as changed. Call after writes that skip model signals
+        (bulk_create, queryset.update).
+        """
+        Quiz.objects.filter(pk=quiz_id).update(version=F('version') + 1)
+        transaction.on_commit(lambda: self.publish_version(quiz_id))
+
+    def publish_version(self, quiz_id) -> None:
+        version = Quiz.objects.filter(pk=quiz_id).values_list('version', flat=True).first()
+        if version is None:
+            self.forget(quiz_id)
+            return
+        cache.set(self.version_key(quiz_id), version, self.ttl)
+        # A plain Quiz.save() can write back a stale version, so never trust old snapshots after a bump
+        cache.delete_many([self._snapshot_key(quiz_id, variant) for variant in (FULL, PUBLIC)])
+
+    def forget(self, quiz_id) -> None:
+        cache.delete_many([self.version_key(quiz_id)] + [self._snapshot_key(quiz_id, variant) for variant in (FULL, PUBLIC)])
+
+
+# Shared snapshot store used by the quiz views
+quiz_snapshots = QuizSnapshotStore()
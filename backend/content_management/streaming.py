@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+
+from accounts.authentication import CachedJWTAuthentication
+from .llm import ANSWER_PROMPT, LLMError, get_llm_client
+from .models import Note
+from .response_cache import response_cache
+from .scheduler import INTERACTIVE, llm_scheduler
+from .search import NOTE, get_search_backend
+from .vectors import vector_index
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event, data) -> bytes:
+    """
+    Encode one server-sent event.
+    """
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+class StreamLimiter:
+    """
+        Caps the number of open streams per process. A slot is handed out as a
+        release callable that only counts once, so every way a stream can end
+        may call it.
+    """
+
+    def __init__(self):
+        self.active = 0
+        # Releases can come from the garbage collector, on any thread
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return getattr(settings, 'AI_STREAM_MAX_CONCURRENT', 500)
+
+    def acquire(self):
+        """
+        Take a slot.
+
+        Returns:
+            A callable that gives the slot back, or None if all slots are taken
+        """
+        with self._lock:
+            if self.active >= self.limit:
+                return None
+            self.active += 1
+        released = False
+
+        def release():
+            nonlocal released
+            with self._lock:
+                if not released:
+                    released = True
+                    self.active -= 1
+        return release
+
+
+stream_limiter = StreamLimiter()
+
+_executor = None
+
+
+def _sync_executor():
+    # Bounded pool for the blocking parts of a stream (auth, retrieval). Using it
+    # instead of thread-sensitive sync_to_async keeps the thread count flat no
+    # matter how many streams are open.
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'AI_STREAM_SYNC_WORKERS', 8), thread_name_prefix='stream-sync'
+        )
+    return _executor
+
+
+def run_sync(func, *args):
+    return sync_to_async(func, thread_sensitive=False, executor=_sync_executor())(*args)
+
+
+def retrieve_notes(user_id, question, limit=4) -> str:
+    """
+    Collect the note passages most relevant to a question as prompt context:
+    nearest chunks from the vector index, or full-text hits if the user has
+    no vectors yet.
+    """
+    budget = getattr(settings, 'AI_ANSWER_CONTEXT_CHARS', 6000)
+    try:
+        hits = vector_index.search(user_id, question, k=limit)
+        if hits:
+            notes = Note.objects.in_bulk({hit.note_id for hit in hits})
+            sections = []
+            for hit in hits:
+                note = notes.get(hit.note_id)
+                chunks = vector_index.note_chunks(note) if note else []
+                if hit.chunk < len(chunks):
+                    sections.append(chunks[hit.chunk])
+            return '\n\n'.join(sections)[:budget]
+
+        backend = get_search_backend()
+        if not backend.is_available():
+            return ''
+        hits = backend.search(user_id, question, kind=NOTE, limit=limit, any_term=True)
+        notes = Note.objects.in_bulk([hit.object_id for hit in hits])
+        sections = [f'{notes[hit.object_id].title}\n\n{notes[hit.object_id].content}' for hit in hits if hit.object_id in notes]
+        return '\n\n'.join(sections)[:budget]
+    finally:
+        close_old_connections()
+
+
+def authenticate(request):
+    """
+    Resolve the JWT user for a plain Django request.
+
+    Returns:
+        User instance, or None if the request carries no valid token
+    """
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except APIException:
+        return None
+    finally:
+        close_old_connections()
+    return result[0] if result else None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class NoteAnswerStreamView(View):
+    """
+        Answers a question about the authenticated user's notes as server-sent events.
+        - Runs natively on the event loop under ASGI: an open stream holds no thread.
+        - Backpressure: the next token is only pulled from the model after the previous
+          event has been handed to the server, so a slow client slows the model read.
+        - Client disconnects cancel the stream and close the upstream model call.
+        - Events: `token` ({"text"}), then `done` ({"tokens"}) or `error` ({"message"}).
+    """
+    http_method_names = ['post']
+
+    async def post(self, request, *args, **kwargs):
+        user = await run_sync(authenticate, request)
+        if user is None:
+            return JsonResponse({'status': 'error', 'message': 'Authentication credentials were not provided or are invalid.'}, status=401)
+
+        try:
+            question = json.loads(request.body or b'{}').get('question', '')
+        except (ValueError, AttributeError):
+            question = ''
+        # Collapse whitespace so the question can't forge prompt sections
+        question = ' '.join(str(question).split())[:1000]
+        if not question:
+            return JsonResponse({'status': 'error', 'message': 'The question field is required.'}, status=400)
+
+        release = stream_limiter.acquire()
+        if release is None:
+            response = JsonResponse({'status': 'error', 'message': 'Too many open streams, try again shortly.'}, status=503)
+            response['Retry-After'] = '1'
+            return response
+
+        try:
+            notes = await run_sync(retrieve_notes, user.pk, question)
+        except BaseException:
+            release()
+            raise
+        prompt = ANSWER_PROMPT.format(question=question, notes=notes)
+        stream = self.stream(prompt, user.pk, release)
+        # A stream that never starts never reaches its `finally`: the client left before the
+        # body, or a middleware replaced the response. Closing the response, or failing that
+        # collecting the generator, gives the slot back.
+        weakref.finalize(stream, release)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response._resource_closers.append(release)
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+
+    async def stream(self, prompt, user_id, release):
+        idle_timeout = getattr(settings, 'AI_STREAM_IDLE_TIMEOUT', 30)
+        # Answers draw on the user's private notes, so cached answers are per user
+        client = llm_scheduler.client(get_llm_client(), user=user_id, priority=INTERACTIVE)
+        upstream = response_cache.astream(client, prompt, scope=user_id)
+        started = time.perf_counter()
+        tokens = 0
+        try:
+            while True:
+                try:
+                    async with asyncio.timeout(idle_timeout):
+                        text = await anext(upstream)
+                except StopAsyncIteration:
+                    break
+                tokens += 1
+                yield sse_event('token', {'text': text})
+            yield sse_event('done', {'tokens': tokens})
+        except TimeoutError:
+            logger.warning("Answer stream for user %s stalled after %s tokens", user_id, tokens)
+            yield sse_event('error', {'message': 'The model stopped responding.'})
+        except LLMError as e:
+            logger.error("Answer stream for user %s failed: %s", user_id, e)
+            yield sse_event('error', {'message': 'The answer could not be generated.'})
+        except asyncio.CancelledError:
+            logger.info("Answer stream for user %s cancelled by the client after %s tokens", user_id, tokens)
+            raise
+        finally:
+            release()
+            await upstream.aclose()
+            logger.debug("Answer stream for user %s: %s tokens in %.2fs", user_id, tokens, time.perf_counter() - started)
@@ -0,0 +1,56 @@
+from uuid import UUID
+
+from celery import shared_task
+from .llm import LLMError
+from .models import Note, Quiz
+from .search import refresh_document
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def update_search_index(kind, object_id):
+    """
+    Bring the search index entry for one Note or Question up to date.
+    """
+    refresh_document(kind, object_id)
+
+
+@shared_task(ignore_result=True)
+def update_note_vectors(user_id, note_id):
+    """
+    Bring the vector index entries for one Note up to date.
+    """
+    from .vectors import refresh_note_vectors
+
+    refresh_note_vectors(UUID(user_id), note_id)
+
+
+@shared_task(ignore_result=True)
+def grade_submissions(quiz_id, submissions):
+    """
+    Grade a chunk of [user_id, answers] submissions for one quiz in a single batch.
+    """
+    from .grading import Submission, grading_engine
+
+    try:
+        grading_engine.grade_batch(quiz_id, [Submission(user_id, answers) for user_id, answers in submissions])
+    except Quiz.DoesNotExist:
+        logger.warning("Dropped %s submissions for deleted quiz %s", len(submissions), quiz_id)
+
+
+@shared_task(autoretry_for=(LLMError,), retry_backoff=True, max_retries=3)
+def generate_quiz_from_note(note_id):
+    """
+    Create or refresh the quiz generated from a Note.
+
+    Returns:
+        The generation report (counts and per-stage timings in ms), or None if the note is gone
+    """
+    from .generation import quiz_generator
+
+    note = Note.objects.filter(pk=note_id).first()
+    if note is None:
+        return None
+    return quiz_generator.generate(note).as_dict()
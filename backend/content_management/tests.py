@@ -1,3 +1,1107 @@
-from django.test import TestCase
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest.mock import Mock, patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.tokens import generate_tokens
+from youcademy import fastjson
+from youcademy.db_router import PrimaryReplicaRouter, ReplicaPool, replica_pool, replica_reads
+from youcademy.asgi import application as asgi_application
+from youcademy.query_budget import QueryBudgetExceeded, QueryBudgetTestMixin, fingerprint
+from youcademy.profiling import DumpStore, ProfilingMiddleware
+from youcademy import swagger_api, urls as youcademy_urls
+from youcademy.openapi import schema_cache, source_files, urlconf_hash
+
+from .answer_events import answer_events, make_event, replay, store_events
+from .generation import chunk_text, parse_questions, quiz_generator
+from .grading import Submission, grading_engine
+from .llm import ANSWER_PROMPT, LLMError, StubLLMClient
+from .management.commands.bench_api import compare
+from .management.commands.bench_streams import open_stream
+from .models import AnswerEvent, Note, Question, QuestionResult, Quiz, QuizAttempt
+from .response_cache import response_cache
+from .scheduler import BACKGROUND, INTERACTIVE, LLMScheduler
+from .search import get_search_backend
+from .streaming import NoteAnswerStreamView, stream_limiter
+from .tasks import grade_submissions
+from .views import NoteListCreateAPIView
+from .vectors import vector_index
+
+User = get_user_model()
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        other = User.objects.create_user(email='alan@example.com', password='Secret#123')
+        Note.objects.bulk_create([Note(user=self.user, title=f'Note {i}', content='...') for i in range(25)])
+        Note.objects.create(user=other, title='Not yours', content='...')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_walks_all_pages_newest_first_without_count(self):
+        url = reverse('note-list') + '?page_size=10'
+        titles = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            titles += [note['title'] for note in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(titles, [f'Note {i}' for i in reversed(range(25))])
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(reverse('note-list') + '?page_size=10').data
+        second = self.client.get(first['next']).data
+        self.assertIsNone(first['previous'])
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    def test_tampered_cursor_is_rejected(self):
+        first = self.client.get(reverse('note-list') + '?page_size=10').data
+        cursor = first['next'].split('cursor=')[1].split('&')[0]
+        response = self.client.get(reverse('note-list'), {'cursor': cursor[:-2] + 'xx'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_duplicate_quiz_title_is_a_validation_error(self):
+        body = {'title': 'Cells', 'description': '...'}
+        self.assertEqual(self.client.post(reverse('quiz-list'), body, format='json').status_code, 201)
+        response = self.client.post(reverse('quiz-list'), body, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.data['errors'])
+        # Other users may use the same title
+        other = APIClient()
+        other.force_authenticate(User.objects.get(email='alan@example.com'))
+        self.assertEqual(other.post(reverse('quiz-list'), body, format='json').status_code, 201)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ContentSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.backend = get_search_backend()
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.other = User.objects.create_user(email='alan@example.com', password='Secret#123')
+        self.note = Note.objects.create(
+            user=self.user, title='Cell biology', content='Photosynthesis happens in the chloroplast.'
+        )
+        Note.objects.create(user=self.other, title='Not yours', content='Photosynthesis is everywhere.')
+        quiz = Quiz.objects.create(user=self.user, title='Plants', description='...')
+        Question.objects.create(
+            quiz=quiz, content='Where does photosynthesis happen?', answer_choices=['Leaves', 'Roots'],
+            correct_answer='Leaves',
+        )
+
+    def search(self, query, **kwargs):
+        return [(hit.kind, hit.object_id) for hit in self.backend.search(self.user.pk, query, **kwargs)]
+
+    def test_prefix_query_is_scoped_to_owner(self):
+        hits = self.search('photosynth')
+        self.assertEqual(len(hits), 2)
+        self.assertIn(('note', self.note.pk), hits)
+
+    def test_phrase_query(self):
+        self.assertEqual(self.search('"in the chloroplast"'), [('note', self.note.pk)])
+        self.assertEqual(self.search('"chloroplast the"'), [])
+
+    def test_updates_and_deletes_are_incremental(self):
+        self.note.content = 'Mitochondria are the powerhouse.'
+        self.note.save()
+        self.assertEqual(self.search('chloroplast'), [])
+        self.assertEqual(self.search('mitochondria'), [('note', self.note.pk)])
+        self.note.delete()
+        self.assertEqual(self.search('mitochondria'), [])
+
+    def test_search_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('content-search'), {'q': 'photosynthesis', 'type': 'question'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([hit['kind'] for hit in response.data['results']], ['question'])
+
+    def test_search_endpoint_without_a_search_backend(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with patch.object(self.backend, 'is_available', return_value=False):
+            response = client.get(reverse('content-search'), {'q': 'photosynthesis'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['status'], 'error')
+
+    def test_migration_builds_the_index_on_the_migrated_database(self):
+        migration = import_module('content_management.migrations.0003_content_search_index')
+        schema_editor = Mock(connection=Mock(vendor='sqlite'))
+        with patch.object(self.backend, 'setup') as setup, patch.object(self.backend, 'teardown') as teardown:
+            migration.create_search_index(None, schema_editor)
+            migration.drop_search_index(None, schema_editor)
+        setup.assert_called_once_with(schema_editor.connection)
+        teardown.assert_called_once_with(schema_editor.connection)
+
+    def test_reindex_command_rebuilds_index(self):
+        self.backend.clear()
+        self.assertEqual(self.search('photosynthesis'), [])
+        call_command('reindex_content', stdout=StringIO())
+        self.assertEqual(len(self.search('photosynthesis')), 2)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QuizSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.other = User.objects.create_user(email='alan@example.com', password='Secret#123')
+        self.quiz = Quiz.objects.create(user=self.user, title='Plants', description='...')
+        Question.objects.bulk_create([
+            Question(quiz=self.quiz, content=f'Question {i}', answer_choices=['A', 'B'], correct_answer='A')
+            for i in range(100)
+        ])
+        self.url = reverse('quiz-detail', args=[self.quiz.pk])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_warm_read_skips_the_database(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()['questions']), 100)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['questions'][0]['correct_answer'], 'A')
+
+    def test_question_change_bumps_version(self):
+        first = self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            question = self.quiz.questions.first()
+            question.content = 'Edited'
+            question.save()
+        second = self.client.get(self.url)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertEqual(second.json()['questions'][0]['content'], 'Edited')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=second['ETag']).status_code, 304)
+
+    def test_answers_are_hidden_from_other_users(self):
+        client = APIClient()
+        client.force_authenticate(self.other)
+        questions = client.get(self.url).json()['questions']
+        self.assertNotIn('correct_answer', questions[0])
+        self.assertEqual(client.get(reverse('quiz-detail', args=[0])).status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QuizGradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.student = User.objects.create_user(email='alan@example.com', password='Secret#123')
+        self.quiz = Quiz.objects.create(user=self.owner, title='Cells', description='...')
+        self.questions = Question.objects.bulk_create([
+            Question(quiz=self.quiz, content=f'Question {i}', answer_choices=['A', 'B'], correct_answer=answer)
+            for i, answer in enumerate(['A', 'B', 'A'])
+        ])
+
+    def test_batch_is_graded_and_stored_in_bulk(self):
+        first, second, third = (question.pk for question in self.questions)
+        submissions = [
+            Submission(self.student.pk, {first: 'a ', second: 'B', third: 'A'}),
+            Submission(self.student.pk, {first: 'B'}),
+        ]
+        grading_engine.answer_key(self.quiz.pk)
+        # Cached answer key: one insert for the attempts and one for the results, inside a savepoint
+        with self.assertNumQueries(4):
+            attempts = grading_engine.grade_batch(self.quiz.pk, submissions)
+        self.assertEqual([attempt.score for attempt in attempts], [3, 0])
+        self.assertEqual(QuestionResult.objects.filter(attempt=attempts[1]).count(), 3)
+        self.assertFalse(QuestionResult.objects.get(attempt=attempts[1], question_id=first).is_correct)
+
+    def test_answer_key_follows_question_edits(self):
+        question = self.questions[0]
+        self.assertEqual(grading_engine.grade(self.quiz.pk, self.student.pk, {question.pk: 'A'}).score, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            question.correct_answer = 'B'
+            question.save()
+        self.assertEqual(grading_engine.grade(self.quiz.pk, self.student.pk, {question.pk: 'A'}).score, 0)
+
+    def test_celery_batch_mode(self):
+        submissions = [Submission(self.student.pk, {self.questions[0].pk: 'A'}) for _ in range(5)]
+        with override_settings(QUIZ_GRADING_BATCH_SIZE=2), self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(grading_engine.enqueue(self.quiz.pk, submissions), 3)
+        self.assertEqual(len(callbacks), 3)
+        # Payloads arrive JSON-encoded, with string user ids and question ids
+        grade_submissions(self.quiz.pk, [[str(self.student.pk), {str(self.questions[0].pk): 'A'}]] * 5)
+        self.assertEqual(list(QuizAttempt.objects.values_list('score', flat=True)), [1] * 5)
+
+    def test_submit_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        url = reverse('quiz-attempt-create', args=[self.quiz.pk])
+        response = client.post(url, {'answers': {str(self.questions[1].pk): 'B'}}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['score'], response.data['total']), (1, 3))
+        missing = client.post(reverse('quiz-attempt-create', args=[0]), {'answers': {}}, format='json')
+        self.assertEqual(missing.status_code, 404)
+        malformed = client.post(url, {'answers': {'abc': 'A'}}, format='json')
+        self.assertEqual(malformed.status_code, 400)
+
+
+class CountingLLMClient(StubLLMClient):
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        return super().generate(prompt)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, AI_QUIZ_CHUNK_SIZE=120, AI_QUIZ_QUESTIONS_PER_CHUNK=1)
+class QuizGenerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.note = Note.objects.create(user=self.user, title='Cells', content=(
+            'Mitochondria produce energy for the cell.\n\n'
+            'The nucleus stores genetic information.\n\n'
+            'Ribosomes assemble proteins from amino acids.'
+        ))
+        self.client_stub = CountingLLMClient()
+        patcher = patch('content_management.generation.get_llm_client', return_value=self.client_stub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chunking_respects_paragraphs_and_size(self):
+        chunks = chunk_text('a' * 50 + '\n\n' + 'b' * 50 + '\n\n' + 'c' * 300, 120)
+        self.assertEqual(chunks[0], 'a' * 50 + '\n\n' + 'b' * 50)
+        self.assertTrue(all(len(chunk) <= 120 for chunk in chunks))
+        self.assertEqual(''.join(chunks[1:]), 'c' * 300)
+
+    def test_generates_quiz_and_skips_unchanged_note(self):
+        report = quiz_generator.generate(self.note)
+        self.assertEqual((report.chunks, report.llm_calls, report.questions), (2, 2, 2))
+        self.assertEqual(set(report.timings), {'chunk', 'generate', 'write'})
+        quiz = Quiz.objects.get(source_note=self.note)
+        question = quiz.questions.first()
+        self.assertIn(question.correct_answer, question.answer_choices)
+
+        with self.assertNumQueries(1):
+            again = quiz_generator.generate(self.note)
+        self.assertTrue(again.unchanged)
+        self.assertEqual(len(self.client_stub.prompts), 2)
+
+    def test_only_changed_chunks_call_the_model(self):
+        quiz_generator.generate(self.note)
+        self.note.content = self.note.content.replace('Ribosomes', 'Ribosomes quickly')
+        self.note.save()
+        report = quiz_generator.generate(self.note)
+        self.assertEqual((report.cache_hits, report.llm_calls), (1, 1))
+        self.assertEqual(Quiz.objects.get(source_note=self.note).questions.count(), 2)
+
+    def test_regenerating_keeps_what_students_answered(self):
+        quiz_generator.generate(self.note)
+        quiz = Quiz.objects.get(source_note=self.note)
+        first, second = quiz.questions.order_by('pk')
+        attempt = QuizAttempt.objects.create(quiz=quiz, user=self.user, quiz_version=quiz.version, score=1, total=1)
+        QuestionResult.objects.create(attempt=attempt, question=second, answer='', is_correct=True)
+
+        self.note.content = self.note.content.replace('Ribosomes', 'Ribosomes quickly')
+        self.note.save()
+        quiz_generator.generate(self.note)
+        questions = list(quiz.questions.order_by('pk'))
+        self.assertEqual([question.pk for question in questions[:2]], [first.pk, second.pk])
+        self.assertEqual(questions[1].content, second.content)
+        self.assertEqual(questions[1].correct_answer, second.correct_answer)
+        self.assertIn('quickly', questions[2].content)
+
+        # The unanswered question is rewritten in place, the answered one stays
+        self.note.content = 'Chloroplasts capture light.'
+        self.note.save()
+        quiz_generator.generate(self.note)
+        questions = list(quiz.questions.order_by('pk'))
+        self.assertEqual([question.pk for question in questions], [first.pk, second.pk])
+        self.assertIn('capture light', questions[0].content)
+        self.assertEqual(questions[1].content, second.content)
+        self.assertTrue(QuestionResult.objects.filter(attempt=attempt, question=second).exists())
+
+    def test_generated_quizzes_get_a_title_no_other_quiz_has(self):
+        Quiz.objects.create(user=self.user, title='Cells', description='')
+        Quiz.objects.create(user=self.user, title=f'Cells (note {self.note.pk})', description='')
+        report = quiz_generator.generate(self.note)
+        self.assertEqual(Quiz.objects.get(pk=report.quiz_id).title, f'Cells (note {self.note.pk}, 2)')
+
+    def test_malformed_responses_are_dropped(self):
+        self.assertEqual(parse_questions('not json'), [])
+        self.assertEqual(parse_questions('```json\n[{"question": "Q?", "choices": ["A", "B"], "answer": "C"}]\n```'), [])
+        self.assertEqual(len(parse_questions('[{"question": "Q?", "choices": ["A", "B"], "answer": "B"}]')), 1)
+
+    @override_settings(AI_QUIZ_ASYNC=False)
+    def test_generate_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('note-quiz-generate', args=[self.note.pk])
+        self.assertEqual(client.post(url).status_code, 201)
+        self.assertEqual(client.post(url).status_code, 200)
+        other = User.objects.create_user(email='alan@example.com', password='Secret#123')
+        client.force_authenticate(other)
+        self.assertEqual(client.post(url).status_code, 404)
+
+
+class ClosingStreamClient(StubLLMClient):
+    def __init__(self):
+        self.closed = False
+
+    async def astream(self, prompt):
+        try:
+            for index in range(1000):
+                await asyncio.sleep(0.001)
+                yield f'{index} '
+        finally:
+            self.closed = True
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, ALLOWED_HOSTS=['testserver'])
+class AnswerStreamTests(TransactionTestCase):
+    # Auth and retrieval run on other threads, so the data must be committed
+    def setUp(self):
+        cache.clear()
+        response_cache.clear()
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        index_settings = override_settings(AI_VECTOR_INDEX_DIR=index_dir.name)
+        index_settings.enable()
+        self.addCleanup(index_settings.disable)
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        Note.objects.create(user=self.user, title='Cells', content='Mitochondria produce energy for the cell.')
+        self.access = generate_tokens(self.user)['access']
+        self.body = json.dumps({'question': 'What do mitochondria produce?'}).encode()
+
+    async def test_streams_tokens_as_events(self):
+        status, chunks, _ = await open_stream(asgi_application, reverse('content-ask'), self.access, self.body)
+        self.assertEqual(status, 200)
+        events = b''.join(chunks).decode().strip().split('\n\n')
+        self.assertTrue(events[0].startswith('event: token'))
+        self.assertEqual(events[-1].split('\n')[0], 'event: done')
+        text = ''.join(json.loads(event.split('data: ')[1])['text'] for event in events[:-1])
+        self.assertIn('Mitochondria produce energy', text)
+
+    async def test_rejects_missing_token_and_full_process(self):
+        status, _, _ = await open_stream(asgi_application, reverse('content-ask'), 'invalid', self.body)
+        self.assertEqual(status, 401)
+        with override_settings(AI_STREAM_MAX_CONCURRENT=0):
+            status, _, _ = await open_stream(asgi_application, reverse('content-ask'), self.access, self.body)
+        self.assertEqual(status, 503)
+
+    async def test_client_disconnect_cancels_upstream(self):
+        client = ClosingStreamClient()
+        with patch('content_management.streaming.get_llm_client', return_value=client):
+            status, chunks, _ = await open_stream(
+                asgi_application, reverse('content-ask'), self.access, self.body, disconnect_after=3
+            )
+        self.assertEqual(status, 200)
+        self.assertLess(len(chunks), 1000)
+        self.assertTrue(client.closed)
+        self.assertEqual(stream_limiter.active, 0)
+
+    async def test_streams_that_never_start_give_their_slot_back(self):
+        view = NoteAnswerStreamView.as_view()
+
+        def request():
+            return RequestFactory().post(reverse('content-ask'), self.body, content_type='application/json',
+                                         HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        # Closed by the server without being iterated
+        response = await view(request())
+        self.assertEqual(stream_limiter.active, 1)
+        response.close()
+        self.assertEqual(stream_limiter.active, 0)
+        # Dropped, e.g. replaced by a middleware
+        response = await view(request())
+        self.assertEqual(stream_limiter.active, 1)
+        del response
+        gc.collect()
+        self.assertEqual(stream_limiter.active, 0)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class VectorIndexTests(TestCase):
+    def setUp(self):
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        index_settings = override_settings(AI_VECTOR_INDEX_DIR=index_dir.name, AI_VECTOR_CHUNK_SIZE=200)
+        index_settings.enable()
+        self.addCleanup(index_settings.disable)
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cells = Note.objects.create(user=self.user, title='Cells', content=(
+                'Mitochondria produce energy for the cell. ' * 6 + 'Ribosomes build proteins from amino acids.'
+            ))
+            self.plants = Note.objects.create(user=self.user, title='Plants', content='Photosynthesis turns light into sugar.')
+
+    def test_search_ranks_relevant_chunk(self):
+        hits = vector_index.search(self.user.pk, 'how do ribosomes build proteins', k=2)
+        self.assertEqual(hits[0].note_id, self.cells.pk)
+        chunks = vector_index.note_chunks(self.cells)
+        self.assertGreater(len(chunks), 1)
+        self.assertIn('Ribosomes', chunks[hits[0].chunk])
+        # Shards are per user
+        other = User.objects.create_user(email='grace@example.com', password='Secret#123')
+        self.assertEqual(vector_index.search(other.pk, 'ribosomes'), [])
+
+    def test_update_replaces_and_delete_compacts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plants.content = 'Chloroplasts capture sunlight inside leaves.'
+            self.plants.save()
+        hits = vector_index.search_many(self.user.pk, ['chloroplasts in leaves', 'photosynthesis sugar'], k=10)
+        self.assertEqual(hits[0][0].note_id, self.plants.pk)
+        self.assertEqual([hit.note_id for hit in hits[1]].count(self.plants.pk), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cells.delete()
+        snapshot = vector_index.snapshot(self.user.pk)
+        # Most rows belonged to the deleted note, so the shard was compacted
+        self.assertEqual(snapshot.rows.tolist(), [[self.plants.pk, 0]])
+        # Superseded vector and row files are gone: lock, state, rows, vectors
+        self.assertEqual(len(os.listdir(vector_index.shard_path(self.user.pk))), 4)
+
+        shard = vector_index.shard_path(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertFalse(os.path.exists(shard))
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.clear()
+        self.llm = CountingLLMClient()
+        self.notes = 'Mitochondria produce energy for the cell.'
+
+    def ask(self, question, notes=None, scope='ada'):
+        prompt = ANSWER_PROMPT.format(question=question, notes=notes or self.notes)
+        return response_cache.generate(self.llm, prompt, scope=scope)
+
+    def test_exact_hits_are_normalized_and_scoped(self):
+        answer = self.ask('What do mitochondria produce?')
+        self.assertEqual(self.ask('  what do Mitochondria produce '), answer)
+        self.assertEqual(len(self.llm.prompts), 1)
+        # Different notes, or another user's private notes, never share an answer
+        self.ask('What do mitochondria produce?', notes='Ribosomes build proteins.')
+        self.ask('What do mitochondria produce?', scope='grace')
+        self.assertEqual(len(self.llm.prompts), 3)
+        stats = response_cache.stats()
+        self.assertEqual((stats['exact'], stats['miss']), (1, 3))
+        self.assertEqual(stats['hit_rate'], 0.25)
+
+    def test_similar_questions_hit_above_threshold(self):
+        self.ask('What do mitochondria produce for the cell?')
+        self.ask('So what do mitochondria produce for the cell?')
+        self.assertEqual(len(self.llm.prompts), 2)
+        with override_settings(AI_RESPONSE_CACHE_SIMILARITY=0.8):
+            cache.clear()
+            response_cache.clear()
+            self.ask('What do mitochondria produce for the cell?')
+            self.ask('So what do mitochondria produce for the cell?')
+            self.ask('How are ribosomes built?')
+        self.assertEqual(len(self.llm.prompts), 4)
+        self.assertEqual(response_cache.stats()['similar'], 1)
+
+    def test_lru_and_ttl_eviction(self):
+        with override_settings(AI_RESPONSE_CACHE_MAX_ENTRIES=2):
+            for question in ('one?', 'two?', 'three?'):
+                self.ask(question)
+            self.assertEqual(response_cache.stats()['entries'], 2)
+        cache.clear()  # Leave only the in-process entries
+        self.ask('three?')
+        self.ask('one?')
+        self.assertEqual(len(self.llm.prompts), 4)
+
+        with override_settings(AI_RESPONSE_CACHE_TTL=0):
+            self.ask('four?')
+            self.ask('four?')
+        self.assertEqual(len(self.llm.prompts), 6)
+
+
+class GatedLLMClient(StubLLMClient):
+    # Calls block until the gate opens, so tests can pile requests up
+    def __init__(self, supports_batching=False):
+        self.supports_batching = supports_batching
+        self.gate = threading.Event()
+        self.calls = []
+
+    def generate(self, prompt):
+        self.calls.append(prompt)
+        self.gate.wait(5)
+        return f'answer to {prompt}'
+
+    def generate_many(self, prompts):
+        self.calls.append(list(prompts))
+        return [f'answer to {prompt}' for prompt in prompts]
+
+    async def astream(self, prompt):
+        self.calls.append(prompt)
+        for word in ('streamed', 'answer'):
+            await asyncio.sleep(0.01)
+            yield word
+
+
+class LLMSchedulerTests(TestCase):
+    def setUp(self):
+        self.scheduler = LLMScheduler()
+        self.llm = GatedLLMClient()
+
+    def run_threads(self, *targets):
+        threads = [threading.Thread(target=target) for target in targets]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)  # Keep arrival order deterministic
+        return threads
+
+    def test_identical_calls_share_one_flight(self):
+        results = []
+        threads = self.run_threads(*[lambda: results.append(self.scheduler.generate(self.llm, 'same')) for _ in range(5)])
+        self.llm.gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.llm.calls, ['same'])
+        self.assertEqual(results, ['answer to same'] * 5)
+        self.assertEqual(self.scheduler.stats()['coalesced'], 4)
+
+    @override_settings(AI_LLM_MAX_CONCURRENT=1)
+    def test_interactive_lane_goes_first(self):
+        order = []
+
+        def call(prompt, priority):
+            return lambda: order.append(self.scheduler.generate(self.llm, prompt, priority=priority))
+
+        threads = self.run_threads(
+            call('first', BACKGROUND), call('background', BACKGROUND), call('interactive', INTERACTIVE),
+        )
+        stats = self.scheduler.stats()
+        self.assertEqual((stats['active'], stats['queued']), (1, {'interactive': 1, 'background': 1}))
+        self.llm.gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ['answer to first', 'answer to interactive', 'answer to background'])
+        self.assertEqual(self.scheduler.stats()['wait']['background']['count'], 2)
+
+    @override_settings(AI_LLM_MAX_CONCURRENT_PER_USER=1, AI_LLM_QUEUE_TIMEOUT=0.2)
+    def test_per_user_cap_and_queue_timeout(self):
+        threads = self.run_threads(lambda: self.scheduler.generate(self.llm, 'one', user='ada'))
+        # Another user still gets a slot; the same user waits, then gives up
+        with self.scheduler.slot(user='grace'):
+            pass
+        with self.assertRaises(LLMError):
+            self.scheduler.generate(self.llm, 'two', user='ada')
+        self.llm.gate.set()
+        threads[0].join()
+        stats = self.scheduler.stats()
+        self.assertEqual((stats['active'], stats['abandoned']), (0, 1))
+
+    @override_settings(AI_LLM_BATCH_SIZE=2)
+    def test_batches_when_the_provider_supports_it(self):
+        self.llm = GatedLLMClient(supports_batching=True)
+        responses = self.scheduler.generate_many(self.llm, ['a', 'b', 'a', 'c'])
+        self.assertEqual(responses, ['answer to a', 'answer to b', 'answer to a', 'answer to c'])
+        self.assertEqual(self.llm.calls, [['a', 'b'], ['c']])
+
+    def test_identical_streams_share_one_upstream(self):
+        async def collect():
+            return ''.join([piece async for piece in self.scheduler.astream(self.llm, 'same')])
+
+        async def run():
+            return await asyncio.gather(collect(), collect())
+
+        self.assertEqual(asyncio.run(run()), ['streamedanswer', 'streamedanswer'])
+        self.assertEqual(self.llm.calls, ['same'])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # TestCase wraps each test in a transaction, which keeps every read on the primary
+    def setUp(self):
+        cache.clear()
+        replica_pool.reset()
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        index_settings = override_settings(AI_VECTOR_INDEX_DIR=index_dir.name)
+        index_settings.enable()
+        self.addCleanup(index_settings.disable)
+        self.router = PrimaryReplicaRouter()
+
+    @patch.object(ReplicaPool, '_ping', return_value=True)
+    def test_reads_use_replicas_only_when_opted_in_and_clean(self, ping):
+        self.assertEqual(self.router.db_for_read(Note), 'default')
+        with replica_reads():
+            self.assertEqual({self.router.db_for_read(Note) for _ in range(4)}, {'replica1', 'replica2'})
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(Note), 'default')
+            self.router.db_for_write(Note)
+            self.assertEqual(self.router.db_for_read(Note), 'default')
+        # Health checks are cached between intervals
+        self.assertEqual(ping.call_count, 2)
+
+    def test_unhealthy_replicas_are_skipped(self):
+        with patch.object(ReplicaPool, '_ping', side_effect=lambda alias: alias == 'replica2'), replica_reads():
+            self.assertEqual({self.router.db_for_read(Note) for _ in range(4)}, {'replica2'})
+        replica_pool.reset()
+        with patch.object(ReplicaPool, '_ping', return_value=False), replica_reads():
+            self.assertEqual(self.router.db_for_read(Note), 'default')
+
+    def test_list_views_read_from_replicas_until_the_user_writes(self):
+        user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        client = APIClient()
+        client.force_authenticate(user)
+        # The test database has no replica connections: record the choice, serve from the primary
+        with patch.object(ReplicaPool, 'choose', return_value=None) as choose:
+            self.assertEqual(client.get(reverse('note-list')).status_code, 200)
+            self.assertEqual(choose.call_count, 1)
+            client.post(reverse('note-list'), {'title': 'Cells', 'content': '...'}, format='json')
+            # Pinned to the primary after the write
+            self.assertEqual(len(client.get(reverse('note-list')).data['results']), 1)
+            self.assertEqual(choose.call_count, 1)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        Note.objects.bulk_create([Note(user=self.user, title=f'Note {i}', content='...') for i in range(3)])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fingerprints_ignore_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM note WHERE id IN (1, 2, 3) AND title = 'it''s'  LIMIT 21"),
+            fingerprint('SELECT * FROM note WHERE id IN (%s) AND title = %s LIMIT 1'),
+        )
+        self.assertEqual(fingerprint('SAVEPOINT "s1_x2"'), fingerprint('SAVEPOINT "s7_x9"'))
+
+    def test_metrics_are_logged_and_sent_as_headers(self):
+        with override_settings(QUERY_METRICS_HEADERS=True), self.assertLogs('youcademy.query_budget') as logs:
+            response = self.client.get(reverse('note-list'))
+        self.assertEqual(response['X-DB-Queries'], '1')
+        self.assertEqual(response['X-DB-Duplicates'], '0')
+        record = logs.records[0]
+        self.assertEqual((record.view, record.status, record.db_queries, record.db_budget), ('NoteListCreateAPIView', 200, 1, 2))
+        with override_settings(QUERY_METRICS_HEADERS=False), self.assertLogs('youcademy.query_budget'):
+            self.assertNotIn('X-DB-Queries', self.client.get(reverse('note-list')))
+
+    def test_exceeding_a_budget_fails_under_the_test_runner(self):
+        with patch.object(NoteListCreateAPIView, 'query_budget', {'GET': 0}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'over its budget of 0'):
+                self.client.get(reverse('note-list'))
+            with override_settings(QUERY_BUDGET_STRICT=False), self.assertLogs('youcademy.query_budget', 'WARNING'):
+                self.assertEqual(self.client.get(reverse('note-list')).status_code, 200)
+
+    def test_helper_reports_repeated_queries(self):
+        with self.assertQueryBudget(1):
+            list(Note.objects.filter(user=self.user))
+        with self.assertRaisesMessage(AssertionError, 'Repeated queries'):
+            with self.assertQueryBudget(4):
+                for note in Note.objects.all():
+                    note.user.email
+
+
+class APIBenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_runs_every_scenario_without_errors(self):
+        output = os.path.join(self.directory, 'results.json')
+        call_command('bench_api', requests=3, output=output, no_baseline=True, stdout=StringIO())
+        with open(output) as results:
+            results = json.load(results)
+        self.assertEqual(len(results), 10)
+        self.assertEqual({name: result['errors'] for name, result in results.items() if result['errors']}, {})
+        self.assertEqual(results['note list']['queries'], 1)
+        self.assertFalse(User.objects.filter(email__endswith='@bench-api.youcademy.invalid').exists())
+
+    def test_regressions_fail_the_run(self):
+        current = {'p95_ms': 10.0, 'throughput': 100.0, 'queries': 2, 'errors': 0}
+        self.assertEqual(compare({'login': current}, {'login': current}, 0.5), [])
+        baseline = {'login': dict(current, p95_ms=5.0, throughput=250.0, queries=1)}
+        self.assertEqual(len(compare({'login': current}, baseline, 0.5)), 3)
+
+        path = os.path.join(self.directory, 'baseline.json')
+        with open(path, 'w') as handle:
+            json.dump({'quiz detail': dict(current, queries=-1)}, handle)
+        with self.assertRaisesMessage(CommandError, '1 regressions'):
+            call_command('bench_api', requests=2, scenarios='quiz detail', baseline=path, stdout=StringIO(), stderr=StringIO())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        profile_settings = override_settings(PROFILING_DIR=directory.name, PROFILING_MAX_DUMPS=2, PROFILING_INTERVAL=0.0002)
+        profile_settings.enable()
+        self.addCleanup(profile_settings.disable)
+        self.store = DumpStore()
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.staff = User.objects.create_user(email='grace@example.com', password='Secret#123', is_staff=True)
+        Note.objects.bulk_create([Note(user=self.staff, title=f'Note {i}', content='...') for i in range(3)])
+        self.client = APIClient()
+        # Long enough for a few samples; the sampler only runs when the request thread yields the GIL
+        list_notes = NoteListCreateAPIView.list
+
+        def slow_list(view, request, *args, **kwargs):
+            time.sleep(0.005)
+            return list_notes(view, request, *args, **kwargs)
+        patcher = patch.object(NoteListCreateAPIView, 'list', slow_list)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_notes(self, user, mode):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {generate_tokens(user)['access']}")
+        return self.client.get(reverse('note-list'), HTTP_X_PROFILE=mode)
+
+    def test_header_profiles_staff_requests_only(self):
+        with self.assertLogs('youcademy.profiling', 'WARNING'):
+            response = self.get_notes(self.user, 'cprofile')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.store.ids(), [])
+
+        response = self.get_notes(self.staff, 'cprofile')
+        self.assertEqual(self.store.ids(), [response['X-Profile-Id']])
+        meta = self.store.load(response['X-Profile-Id'])
+        self.assertEqual((meta['mode'], meta['path'], meta['status']), ('cprofile', reverse('note-list'), 200))
+        self.assertEqual(meta['db_queries'], len(meta['queries']))
+        self.assertTrue(any('content_management_note' in query['sql'] for query in meta['queries']))
+
+        summary = StringIO()
+        call_command('profiles', 'show', response['X-Profile-Id'][:12], stdout=summary)
+        self.assertIn('Ordered by: cumulative time', summary.getvalue())
+        stacks = StringIO()
+        call_command('profiles', 'collapse', stdout=stacks)
+        self.assertIn('rest_framework.generics:ListCreateAPIView.get', stacks.getvalue())
+        self.assertRegex(stacks.getvalue().splitlines()[0], r'^\S.* \d+$')
+
+    def test_sampled_requests_keep_a_bounded_ring(self):
+        with override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MODE='sample'):
+            ids = [self.get_notes(self.user, None)['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(self.store.ids(), ids[1:])
+        meta = self.store.load(ids[-1])
+        self.assertEqual(meta['mode'], 'sample')
+        self.assertTrue(any(stack.endswith('slow_list') for stack in meta['stacks']))
+        self.assertFalse(any('_profile' in stack for stack in meta['stacks']))
+
+        listing = StringIO()
+        call_command('profiles', stdout=listing)
+        self.assertIn('2 dumps in', listing.getvalue())
+        with self.assertRaisesMessage(CommandError, '0 dumps match'):
+            call_command('profiles', 'show', 'nope', stdout=StringIO())
+
+    def test_disabled_middleware_is_removed(self):
+        with override_settings(PROFILING_ENABLED=False), self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+
+def ping(request):
+    return HttpResponse('pong')
+
+
+# A URLconf with one more route, for OpenAPISchemaTests
+urlpatterns = youcademy_urls.urlpatterns + [path('ping/', ping)]
+
+
+class OpenAPISchemaTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        schema_settings = override_settings(OPENAPI_SCHEMA_DIR=self.directory)
+        schema_settings.enable()
+        self.addCleanup(schema_settings.disable)
+        schema_cache.clear()
+        self.addCleanup(schema_cache.clear)
+
+    def test_generates_once_and_revalidates_with_the_etag(self):
+        with patch('youcademy.swagger_api.generate_schema', wraps=swagger_api.generate_schema) as generate:
+            first = self.client.get(reverse('schema-json', args=['json']))
+            second = self.client.get(reverse('schema-json', args=['json']))
+            yaml = self.client.get(reverse('schema-json', args=['yaml']))
+            self.assertEqual(generate.call_count, 2)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('/content/notes/', json.loads(first.content)['paths'])
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertTrue(yaml['Content-Type'].startswith('application/yaml'))
+
+        not_modified = self.client.get(reverse('schema-json', args=['json']), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get(reverse('schema-json', args=['xml'])).status_code, 404)
+
+    def test_a_new_urlconf_regenerates_the_schema(self):
+        call_command('openapi_schema', stdout=StringIO())
+        old_version = schema_cache.version()
+        with patch('youcademy.swagger_api.generate_schema') as generate:
+            self.assertEqual(self.client.get(reverse('schema-json', args=['json'])).status_code, 200)
+            generate.assert_not_called()
+
+        with override_settings(ROOT_URLCONF=__name__):
+            self.assertNotEqual(schema_cache.version(), old_version)
+            with self.assertRaisesMessage(CommandError, 'No schema for URLconf'):
+                call_command('openapi_schema', check=True, stdout=StringIO())
+            response = self.client.get(reverse('schema-json', args=['json']))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(os.listdir(self.directory), [f'schema-{schema_cache.version()}.json'])
+
+    def test_docs_read_the_cached_schema(self):
+        for name in ('schema-swagger-ui', 'schema-redoc'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, reverse('schema-json', args=['json']))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_source_changes_behind_the_routes_change_the_version(self):
+        sources = source_files(NoteListCreateAPIView)
+        for module in ('views', 'serializers', 'models', 'pagination'):
+            self.assertIn(os.path.join(settings.BASE_DIR, 'content_management', f'{module}.py'), sources)
+        serializers_file = os.path.join(self.directory, 'serializers.py')
+        with patch('youcademy.openapi.source_files', return_value={serializers_file}):
+            with open(serializers_file, 'w') as source:
+                source.write('fields = ["id", "title"]\n')
+            before = urlconf_hash()
+            with open(serializers_file, 'w') as source:
+                source.write('fields = ["id", "title", "content"]\n')
+            self.assertNotEqual(urlconf_hash(), before)
+
+    def test_drf_yasg_is_not_imported_to_serve_the_api(self):
+        code = (
+            "import sys, django; django.setup(); import youcademy.urls; "
+            "print(sorted(name for name in sys.modules if name.startswith('drf_yasg.')))"
+        )
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=settings.BASE_DIR)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class FastJSONTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def backends(self):
+        for name in ['stdlib'] + (['orjson'] if fastjson.orjson is not None else []):
+            with self.subTest(backend=name), override_settings(JSON_BACKEND=name):
+                yield name
+
+    def test_renders_what_drf_renders(self):
+        data = {
+            'user_id': uuid.uuid4(),
+            'created_at': datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=dt_timezone.utc),
+            'local': datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone(timedelta(hours=3))),
+            'score': Decimal('0.75'),
+            'message': gettext_lazy('Invalid cursor.'),
+            'elapsed': timedelta(seconds=90),
+            1: 'integer keys',
+            'text': 'résumé \u2028 and \u2029 😀',
+            'answer_choices': ['A', 'B', None, True, 1.5],
+            'huge': 2 ** 70,
+        }
+        expected = JSONRenderer().render(data)
+        for name in self.backends():
+            self.assertEqual(fastjson.get_backend().name, name)
+            self.assertEqual(fastjson.FastJSONRenderer().render(data), expected)
+            self.assertEqual(fastjson.FastJSONRenderer().render(None), b'')
+        indented = fastjson.FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(indented, b'{\n  "a": 1\n}')
+
+    def test_parser_rejects_invalid_json_and_nan(self):
+        for name in self.backends():
+            parser = fastjson.FastJSONParser()
+            self.assertEqual(parser.parse(BytesIO('{"title": "Zoë"}'.encode())), {'title': 'Zoë'})
+            for body in (b'{"title": ', b'{"score": NaN}'):
+                with self.assertRaisesMessage(ParseError, 'JSON parse error'):
+                    parser.parse(BytesIO(body))
+            response = self.client.post(reverse('note-list'), b'{"title": NaN}', content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_streams_the_whole_list(self):
+        Note.objects.bulk_create([Note(user=self.user, title=f'Note {i}', content='...') for i in range(25)])
+        with patch('youcademy.fastjson.StreamingListMixin.stream_chunk_size', 10):
+            response = self.client.get(reverse('note-list'), {'stream': '1'})
+            chunks = list(response.streaming_content)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(chunks), 4)
+        notes = json.loads(b''.join(chunks))
+        self.assertEqual([note['title'] for note in notes], [f'Note {i}' for i in reversed(range(25))])
+        self.assertEqual(b''.join(fastjson.iter_json_array([])), b'[]')
+
+        paginated = self.client.get(reverse('note-list'))
+        self.assertEqual(len(paginated.data['results']), 10)
+
+
+class AnswerEventsMixin:
+    def setUp(self):
+        cache.clear()
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.spool = spool.name
+        spool_settings = override_settings(ANSWER_EVENTS_SPOOL_DIR=self.spool, ANSWER_EVENTS_BATCH_SIZE=5,
+                                           ANSWER_EVENTS_FLUSHER=False)
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+        self.addCleanup(answer_events.stop)
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.quiz = Quiz.objects.create(user=self.user, title='Cells', description='...')
+        self.questions = Question.objects.bulk_create([
+            Question(quiz=self.quiz, content=f'Question {i}', answer_choices=['A', 'B'], correct_answer='A')
+            for i in range(3)
+        ])
+
+    def event(self, key, answer='A'):
+        return make_event(self.quiz.pk, self.questions[0].pk, self.user.pk, answer, key, timezone.now())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AnswerEventTests(AnswerEventsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('quiz-answer-events', args=[self.quiz.pk])
+
+    def post(self, *keys, question=None, url=None):
+        events = [{'question': question or self.questions[0].pk, 'answer': 'B', 'idempotency_key': key} for key in keys]
+        return self.client.post(url or self.url, {'events': events}, format='json')
+
+    def test_queues_answers_and_stores_them_in_batches(self):
+        response = self.post('k1', 'k2', 'k3')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {'accepted': 3})
+        self.assertEqual(AnswerEvent.objects.count(), 0)
+        self.assertEqual(len(os.listdir(self.spool)), 1)
+
+        # A resent event fills the batch but is stored once
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.post('k3', 'k4', 'k5').status_code, 202)
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)  # Six rows, in bulk inserts of five
+        self.assertEqual(sorted(AnswerEvent.objects.values_list('idempotency_key', flat=True)), ['k1', 'k2', 'k3', 'k4', 'k5'])
+        self.assertEqual(os.listdir(self.spool), [])
+        self.assertEqual(answer_events.pending, 0)
+
+    def test_rejects_unknown_questions_and_quizzes_and_answers_503_when_full(self):
+        other = Quiz.objects.create(user=self.user, title='Other', description='...')
+        stray = Question.objects.create(quiz=other, content='?', answer_choices=['A'], correct_answer='A')
+        self.assertEqual(self.post('k1', question=stray.pk).status_code, 400)
+        self.assertEqual(self.post('k1', url=reverse('quiz-answer-events', args=[999])).status_code, 404)
+        self.assertEqual(self.client.post(self.url, {'events': []}, format='json').status_code, 400)
+
+        with override_settings(ANSWER_EVENTS_MAX_PENDING=2):
+            response = self.post('k1', 'k2', 'k3')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(answer_events.pending, 0)
+
+    def test_replays_the_spool_of_a_crashed_worker(self):
+        events = [self.event(f'k{i}') for i in range(4)]
+        code = (
+            "import os, sys, json, django; django.setup(); "
+            "from content_management.answer_events import answer_events; "
+            "answer_events.add(json.loads(sys.argv[1])); "
+            "os._exit(1)"
+        )
+        env = dict(os.environ, ANSWER_EVENTS_SPOOL_DIR=self.spool, ANSWER_EVENTS_FLUSHER='false')
+        result = subprocess.run([sys.executable, '-c', code, json.dumps(events)], capture_output=True, text=True,
+                                cwd=settings.BASE_DIR, env=env)
+        self.assertEqual(result.returncode, 1, result.stderr)
+        [segment] = os.listdir(self.spool)
+        with open(os.path.join(self.spool, segment), 'ab') as spool:
+            spool.write(b'[1, 2, "cut short by the cra')
+
+        # Two of the events were also stored before the crash
+        answer_events.add(events[:2])
+        answer_events.flush()
+        output = StringIO()
+        call_command('replay_answer_events', stdout=output)
+        self.assertIn('Replayed 4 answer events', output.getvalue())
+        self.assertEqual(AnswerEvent.objects.count(), 4)
+        self.assertEqual(os.listdir(self.spool), [])
+        self.assertEqual(replay(), 0)
+
+    def test_keeps_unstored_events_spooled_until_a_replay_stores_them(self):
+        with override_settings(ANSWER_EVENTS_BATCH_SIZE=100):
+            answer_events.add([self.event('k1'), self.event('k2')])
+            # Held by a live buffer
+            self.assertEqual(replay(), 0)
+            with patch('content_management.answer_events.store_events', side_effect=OSError('database down')):
+                with self.assertRaises(OSError):
+                    answer_events.flush()
+            self.assertEqual(AnswerEvent.objects.count(), 0)
+            self.assertEqual(replay(), 2)
+        self.assertEqual(AnswerEvent.objects.count(), 2)
+
+
+class AnswerEventThroughputTests(AnswerEventsMixin, TransactionTestCase):
+    # The flusher thread writes through its own connection, so the data must be committed
+
+    @override_settings(ANSWER_EVENTS_FLUSHER=True, ANSWER_EVENTS_BATCH_SIZE=500, ANSWER_EVENTS_FLUSH_INTERVAL=0.05)
+    def test_flusher_stores_concurrent_answers_in_few_bulk_inserts(self):
+        threads, per_thread = 8, 1000
+        now = timezone.now()
+        parts = [
+            [make_event(self.quiz.pk, self.questions[i % 3].pk, self.user.pk, 'A', f't{thread}-{i}', now)
+             for i in range(per_thread)]
+            for thread in range(threads)
+        ]
+        with patch('content_management.answer_events.store_events', wraps=store_events) as store:
+            workers = [threading.Thread(target=lambda part: [answer_events.add([event]) for event in part], args=(part,))
+                       for part in parts]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            added = time.perf_counter() - started
+            answer_events.stop()
+
+        self.assertEqual(AnswerEvent.objects.count(), threads * per_thread)
+        self.assertEqual(os.listdir(self.spool), [])
+        # Batches fill faster than the flusher drains them, so few flushes take many events each
+        self.assertLess(store.call_count, threads * per_thread / 100)
+        # The request side never waits on the database: thousands of events per second per process
+        self.assertGreater(threads * per_thread / added, 5000)
+
+    def test_drops_answers_to_deleted_questions(self):
+        answer_events.add([self.event('k1'), make_event(self.quiz.pk, self.questions[1].pk, self.user.pk, 'A', 'k2',
+                                                        timezone.now())])
+        self.questions[0].delete()
+        self.assertEqual(answer_events.flush(), 1)
+        self.assertEqual(list(AnswerEvent.objects.values_list('idempotency_key', flat=True)), ['k2'])
@@ -0,0 +1,23 @@
+from django.urls import path
+from .streaming import NoteAnswerStreamView
+from .views import (
+    ContentSearchAPIView, NoteListCreateAPIView, NoteQuizGenerateAPIView, QuizAnswerEventsAPIView, QuizAttemptCreateAPIView, QuizDetailAPIView, QuizListCreateAPIView,
+)
+
+urlpatterns = [
+    # Notes
+    path('notes/', NoteListCreateAPIView.as_view(), name='note-list'),
+    path('notes/<int:pk>/quiz/', NoteQuizGenerateAPIView.as_view(), name='note-quiz-generate'),
+    
+    # Quizzes
+    path('quizzes/', QuizListCreateAPIView.as_view(), name='quiz-list'),
+    path('quizzes/<int:pk>/', QuizDetailAPIView.as_view(), name='quiz-detail'),
+    path('quizzes/<int:pk>/attempts/', QuizAttemptCreateAPIView.as_view(), name='quiz-attempt-create'),
+    path('quizzes/<int:pk>/answers/', QuizAnswerEventsAPIView.as_view(), name='quiz-answer-events'),
+    
+    # Search
+    path('search/', ContentSearchAPIView.as_view(), name='content-search'),
+    
+    # AI answers, streamed as server-sent events
+    path('ask/', NoteAnswerStreamView.as_view(), name='content-ask'),
+]
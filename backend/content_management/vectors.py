@@ -0,0 +1,323 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .generation import chunk_text
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class Embedder:
+    """
+        Interface for text embedders. Set AI_EMBEDDER to the dotted path of a
+        subclass to plug in another model. Vectors must be L2-normalized float32.
+    """
+    dim = 0
+    # Stored with each shard; shards built by another embedder are ignored until rebuilt
+    name = ''
+
+    def embed(self, texts) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingEmbedder(Embedder):
+    """
+        Offline embedder: unigrams and bigrams hashed into a fixed number of
+        signed buckets, with sublinear term frequency. No vocabulary to fit or
+        store, and stable across processes (crc32, not hash()).
+    """
+
+    def __init__(self):
+        self.dim = getattr(settings, 'AI_EMBEDDING_DIM', 256)
+        self.name = f'hashing-{self.dim}'
+
+    def embed(self, texts) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _WORD_RE.findall(text.lower())
+            features = tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+@lru_cache(maxsize=None)
+def _load_embedder(path):
+    return import_string(path)()
+
+
+def get_embedder() -> Embedder:
+    return _load_embedder(getattr(settings, 'AI_EMBEDDER', 'content_management.vectors.HashingEmbedder'))
+
+
+@dataclass
+class VectorHit:
+    note_id: int
+    chunk: int
+    score: float
+
+
+class ShardSnapshot:
+    """
+        A read-only view of one user's shard: row ids in memory, vectors memory-mapped.
+    """
+    __slots__ = ('stamp', 'rows', 'vectors', 'live')
+
+    def __init__(self, stamp, rows, vectors):
+        self.stamp = stamp
+        self.rows = rows
+        self.vectors = vectors
+        self.live = rows[:, 0] >= 0 if len(rows) else np.zeros(0, dtype=bool)
+
+
+class VectorIndex:
+    """
+        Per-user vector shards of note chunks on local disk.
+        - A shard is a directory holding `state.json` (the commit point), a raw
+          float32 matrix that is memory-mapped for search, and an int64 array of
+          (note id, chunk number) per row.
+        - Updates append rows and tombstone a note's old rows, then atomically
+          replace state.json; readers never see a half-written shard. Shards are
+          compacted once a quarter of their rows are dead.
+        - Search is a blocked matrix-vector product with a running top-k, so the
+          working set stays small however large the shard grows.
+    """
+    block_rows = 65536
+
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    @property
+    def root(self) -> str:
+        return str(getattr(settings, 'AI_VECTOR_INDEX_DIR', os.path.join(settings.BASE_DIR, 'vector_index')))
+
+    @property
+    def chunk_size(self) -> int:
+        return getattr(settings, 'AI_VECTOR_CHUNK_SIZE', 800)
+
+    def shard_path(self, user_id) -> str:
+        return os.path.join(self.root, user_id.hex)
+
+    def note_chunks(self, note):
+        return chunk_text(f'{note.title}\n\n{note.content}', self.chunk_size)
+
+    # Writing
+
+    @contextmanager
+    def _write_lock(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'lock'), 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read_state(self, path, embedder):
+        try:
+            with open(os.path.join(path, 'state.json'), encoding='utf-8') as handle:
+                state = json.load(handle)
+        except FileNotFoundError:
+            return None
+        if state.get('embedder') != embedder.name:
+            return None
+        return state
+
+    def _load_rows(self, path, state):
+        if state is None or not state['count']:
+            return np.zeros((0, 2), dtype=np.int64)
+        return np.load(os.path.join(path, state['rows']))
+
+    def _commit(self, path, state, rows, generation):
+        rows_name = f'rows-{generation}.npy'
+        np.save(os.path.join(path, rows_name), rows)
+        old_rows = state.get('rows')
+        state = dict(state, rows=rows_name, count=len(rows), generation=generation)
+        temporary = os.path.join(path, 'state.json.tmp')
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump(state, handle)
+        os.replace(temporary, os.path.join(path, 'state.json'))
+        if old_rows and old_rows != rows_name:
+            _unlink(os.path.join(path, old_rows))
+        return state
+
+    def update_notes(self, user_id, notes, removed_ids=()):
+        """
+        Replace the vectors of the given notes and drop those of removed_ids.
+        All notes must belong to user_id.
+        """
+        embedder = get_embedder()
+        chunks = [(note.pk, number, text) for note in notes for number, text in enumerate(self.note_chunks(note))]
+        vectors = embedder.embed([text for _, _, text in chunks]) if chunks else np.zeros((0, embedder.dim), np.float32)
+        new_rows = np.array([(note_id, number) for note_id, number, _ in chunks], dtype=np.int64).reshape(-1, 2)
+        stale_ids = [note.pk for note in notes] + list(removed_ids)
+
+        path = self.shard_path(user_id)
+        with self._write_lock(path):
+            state = self._read_state(path, embedder)
+            if state is None:
+                state = {'embedder': embedder.name, 'dim': embedder.dim, 'count': 0, 'generation': 0,
+                         'vectors': 'vectors-0.f32', 'rows': None}
+            rows = self._load_rows(path, state)
+            if len(rows) and stale_ids:
+                rows[np.isin(rows[:, 0], stale_ids), 0] = -1
+
+            generation = state['generation'] + 1
+            vectors_path = os.path.join(path, state['vectors'])
+            row_bytes = embedder.dim * 4
+            with open(vectors_path, 'r+b' if os.path.exists(vectors_path) else 'w+b') as handle:
+                # Rows past `count` belong to an interrupted write; overwrite them
+                handle.seek(len(rows) * row_bytes)
+                handle.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                handle.truncate()
+            rows = np.concatenate([rows, new_rows])
+            state = self._commit(path, state, rows, generation)
+
+            dead = int((rows[:, 0] < 0).sum())
+            if dead and dead * 4 >= len(rows):
+                self._compact(path, state, rows, row_bytes)
+
+    def _compact(self, path, state, rows, row_bytes):
+        live = rows[:, 0] >= 0
+        generation = state['generation'] + 1
+        vectors_name = f'vectors-{generation}.f32'
+        old = np.memmap(os.path.join(path, state['vectors']), dtype=np.float32, mode='r', shape=(len(rows), row_bytes // 4))
+        with open(os.path.join(path, vectors_name), 'wb') as handle:
+            for start in range(0, len(rows), self.block_rows):
+                block = old[start:start + self.block_rows][live[start:start + self.block_rows]]
+                handle.write(np.ascontiguousarray(block).tobytes())
+        del old
+        old_vectors = state['vectors']
+        self._commit(path, dict(state, vectors=vectors_name), rows[live], generation)
+        # Readers holding the old memory map keep the file's data until they reload
+        _unlink(os.path.join(path, old_vectors))
+
+    def remove_notes(self, user_id, note_ids):
+        self.update_notes(user_id, [], removed_ids=note_ids)
+
+    def purge_user(self, user_id):
+        shutil.rmtree(self.shard_path(user_id), ignore_errors=True)
+        with self._lock:
+            self._snapshots.pop(user_id.hex, None)
+
+    # Reading
+
+    def snapshot(self, user_id):
+        """
+        Return the current read view of a user's shard, or None if there is none.
+        """
+        path = self.shard_path(user_id)
+        try:
+            stat = os.stat(os.path.join(path, 'state.json'))
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._snapshots.get(user_id.hex)
+        if cached is not None and cached.stamp == stamp:
+            return cached
+
+        embedder = get_embedder()
+        state = self._read_state(path, embedder)
+        if state is None:
+            return None
+        rows = self._load_rows(path, state)
+        vectors = None
+        if len(rows):
+            vectors = np.memmap(os.path.join(path, state['vectors']), dtype=np.float32, mode='r',
+                                shape=(len(rows), state['dim']))
+        snapshot = ShardSnapshot(stamp, rows, vectors)
+        with self._lock:
+            self._snapshots[user_id.hex] = snapshot
+        return snapshot
+
+    def search_many(self, user_id, queries, k=5):
+        """
+        Top-k chunks by cosine similarity for each query, best first.
+
+        Args:
+            user_id: Owner of the shard to search
+            queries: List of query strings
+            k: Hits per query
+
+        Returns:
+            One list of VectorHit per query
+        """
+        snapshot = self.snapshot(user_id)
+        if snapshot is None or not snapshot.live.any() or not queries:
+            return [[] for _ in queries]
+        query_vectors = get_embedder().embed(queries)
+        k = min(k, int(snapshot.live.sum()))
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(snapshot.rows), self.block_rows):
+            block = snapshot.vectors[start:start + self.block_rows]
+            scores = query_vectors @ block.T
+            scores[:, ~snapshot.live[start:start + self.block_rows]] = -np.inf
+            scores = np.concatenate([best_scores, scores], axis=1)
+            positions = np.concatenate(
+                [best_rows, np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))], axis=1
+            )
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                positions = np.take_along_axis(positions, keep, axis=1)
+            best_scores, best_rows = scores, positions
+
+        results = []
+        for scores, positions in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([
+                VectorHit(int(snapshot.rows[position, 0]), int(snapshot.rows[position, 1]), float(score))
+                for score, position in zip(scores[order], positions[order]) if np.isfinite(score)
+            ])
+        return results
+
+    def search(self, user_id, query, k=5):
+        return self.search_many(user_id, [query], k)[0]
+
+
+# Shared vector index used by signals, tasks and retrieval
+vector_index = VectorIndex()
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def refresh_note_vectors(user_id, note_id) -> None:
+    """
+    Re-read one note from the database and update (or drop) its vectors.
+    """
+    from .models import Note
+
+    note = Note.objects.filter(pk=note_id).first()
+    if note is None:
+        vector_index.remove_notes(user_id, [note_id])
+    else:
+        vector_index.update_notes(note.user_id, [note])
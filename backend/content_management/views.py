@@ -1,3 +1,273 @@
-from django.shortcuts import render
+from typing import Any
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from youcademy.db_router import ReplicaReadMixin
+from youcademy.fastjson import StreamingListMixin
+from .answer_events import BufferFull, answer_events, make_event
+from .models import Note, Quiz
+from .generation import quiz_generator
+from .grading import grading_engine
+from .llm import LLMError
+from .pagination import KeysetCursorPagination
+from .scheduler import INTERACTIVE
+from .search import KINDS, get_search_backend
+from .snapshots import FULL, PUBLIC, quiz_snapshots
+from .serializers import (
+    AnswerEventBatchSerializer, NoteSerializer, QuizAttemptSerializer, QuizSerializer, QuizSubmissionSerializer, SearchHitSerializer,
+)
+import logging
 
-# Create your views here.
+logger = logging.getLogger(__name__)
+
+
+class NoteListCreateAPIView(StreamingListMixin, ReplicaReadMixin, generics.ListCreateAPIView):
+    """
+        Lists the authenticated user's notes (newest first, cursor-paginated,
+        or all at once with `?stream=1`) and creates new notes for them. Lists
+        may be served from a replica.
+    """
+    serializer_class = NoteSerializer
+    pagination_class = KeysetCursorPagination
+    query_budget = {'GET': 2, 'POST': 5}  # Budgets count the user lookup on a cold token cache
+
+    def get_queryset(self):
+        return Note.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class QuizListCreateAPIView(StreamingListMixin, ReplicaReadMixin, generics.ListCreateAPIView):
+    """
+        Lists the authenticated user's quizzes (newest first, cursor-paginated,
+        or all at once with `?stream=1`) and creates new quizzes for them. Lists
+        may be served from a replica.
+    """
+    serializer_class = QuizSerializer
+    pagination_class = KeysetCursorPagination
+    query_budget = {'GET': 2, 'POST': 4}  # The title check, and the insert in a savepoint
+
+    def get_queryset(self):
+        return Quiz.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
+        except IntegrityError:
+            # Another request took the title between validation and the insert
+            raise ValidationError({'title': ["You already have a quiz with this title."]})
+
+
+class NoteQuizGenerateAPIView(APIView):
+    """
+        Generates (or refreshes) a quiz from one of the authenticated user's notes.
+        Runs on Celery unless AI_QUIZ_ASYNC is off.
+    """
+    query_budget = 11
+
+    def post(self, request: Request, pk: int, *args: Any, **kwargs: Any) -> Response:
+        """
+        Handle POST request for quiz generation.
+        
+        Args:
+            request: HTTP request object
+            pk: Primary key of the note
+            
+        Returns:
+            Response object with the generation report, or 202 if queued
+        """
+        note = Note.objects.filter(pk=pk, user=request.user).first()
+        if note is None:
+            return Response(
+                {'status': 'error', 'message': 'Note not found.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        if getattr(settings, 'AI_QUIZ_ASYNC', True):
+            from .tasks import generate_quiz_from_note
+            transaction.on_commit(lambda: generate_quiz_from_note.delay(note.pk))
+            return Response({'status': 'queued', 'note_id': note.pk}, status=status.HTTP_202_ACCEPTED)
+        
+        try:
+            report = quiz_generator.generate(note, priority=INTERACTIVE)
+        except LLMError as e:
+            logger.error("Quiz generation failed for note %s: %s", note.pk, e)
+            return Response(
+                {'status': 'error', 'message': 'Quiz generation is unavailable, try again later.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        return Response(report.as_dict(), status=status.HTTP_200_OK if report.unchanged else status.HTTP_201_CREATED)
+
+
+class QuizDetailAPIView(APIView):
+    """
+        Returns a quiz with all of its questions from a pre-rendered snapshot.
+        - The quiz owner gets the correct answers; everyone else gets the public variant.
+        - Warm reads skip the database and the serializers entirely.
+    """
+    query_budget = 2
+
+    def get(self, request: Request, pk: int, *args: Any, **kwargs: Any) -> HttpResponse:
+        """
+        Handle GET request for one quiz.
+        
+        Args:
+            request: HTTP request object
+            pk: Primary key of the quiz
+            
+        Returns:
+            JSON response with the quiz and its questions, tagged with the quiz version
+        """
+        snapshot = quiz_snapshots.get(pk, PUBLIC)
+        if snapshot is None:
+            return Response(
+                {'status': 'error', 'message': 'Quiz not found.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if snapshot.owner_id == request.user.pk:
+            snapshot = quiz_snapshots.get(pk, FULL)
+
+        if request.headers.get('If-None-Match') == snapshot.etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(snapshot.content, content_type='application/json')
+        response['ETag'] = snapshot.etag
+        return response
+
+
+class QuizAttemptCreateAPIView(APIView):
+    """
+        Grades the authenticated user's answers to a quiz and records the attempt.
+    """
+    query_budget = 5
+
+    def post(self, request: Request, pk: int, *args: Any, **kwargs: Any) -> Response:
+        """
+        Handle POST request for a quiz submission.
+        
+        Args:
+            request: HTTP request object with answers keyed by question id
+            pk: Primary key of the quiz
+            
+        Returns:
+            Response object with the graded attempt
+        """
+        serializer = QuizSubmissionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            attempt = grading_engine.grade(pk, request.user.pk, serializer.validated_data['answers'])
+        except Quiz.DoesNotExist:
+            return Response(
+                {'status': 'error', 'message': 'Quiz not found.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(QuizAttemptSerializer(attempt).data, status=status.HTTP_201_CREATED)
+
+
+class QuizAnswerEventsAPIView(APIView):
+    """
+        Records the authenticated user's answers while they take a quiz, one
+        event per answer given. Events are queued for a batched write and
+        acknowledged with 202 before they reach the database.
+        - Each event carries a client-chosen `idempotency_key`; resending an
+          event after a timeout or a 503 never stores it twice.
+    """
+    query_budget = 5  # The user and answer key on cold caches, plus a batch stored inline with ANSWER_EVENTS_FLUSHER off
+
+    def post(self, request: Request, pk: int, *args: Any, **kwargs: Any) -> Response:
+        """
+        Handle POST request for a list of answer events.
+
+        Args:
+            request: HTTP request object with `events`, each a question id, answer and idempotency key
+            pk: Primary key of the quiz
+
+        Returns:
+            Response object with the number of events accepted
+        """
+        serializer = AnswerEventBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            question_ids = set(grading_engine.answer_key(pk).question_ids)
+        except Quiz.DoesNotExist:
+            return Response(
+                {'status': 'error', 'message': 'Quiz not found.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        events = serializer.validated_data['events']
+        unknown = sorted({event['question'] for event in events} - question_ids)
+        if unknown:
+            return Response(
+                {'status': 'error', 'message': f'Questions {unknown} are not in this quiz.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        now = timezone.now()
+        try:
+            accepted = answer_events.add([
+                make_event(pk, event['question'], request.user.pk, event['answer'], event['idempotency_key'], now)
+                for event in events
+            ])
+        except BufferFull:
+            logger.warning("Answer event queue full; turned away %s events for quiz %s", len(events), pk)
+            return Response(
+                {'status': 'error', 'message': 'Too many answers waiting to be stored, retry shortly.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '1'}
+            )
+        return Response({'accepted': accepted}, status=status.HTTP_202_ACCEPTED)
+
+
+class ContentSearchAPIView(APIView):
+    """
+        Full-text search over the authenticated user's notes and questions.
+        - `q`: words are prefix-matched, "quoted text" is matched as a phrase.
+        - `type`: optional, `note` or `question`.
+        - `limit`: optional, at most 50 ranked results.
+    """
+    max_limit = 50
+    query_budget = 2
+    
+    def get(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """
+        Handle GET request for content search.
+        
+        Args:
+            request: HTTP request object with the search parameters
+            
+        Returns:
+            Response object with ranked search results
+        """
+        query = request.query_params.get('q', '').strip()
+        kind = request.query_params.get('type') or None
+        if not query:
+            return Response(
+                {'status': 'error', 'message': 'The q parameter is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if kind is not None and kind not in KINDS:
+            return Response(
+                {'status': 'error', 'message': f"type must be one of: {', '.join(KINDS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.max_limit)
+        except ValueError:
+            limit = 20
+        
+        backend = get_search_backend()
+        if not backend.is_available():
+            return Response(
+                {'status': 'error', 'message': 'Search is not available on this server.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        hits = backend.search(request.user.pk, query, kind=kind, limit=limit)
+        return Response({'query': query, 'results': SearchHitSerializer(hits, many=True).data})
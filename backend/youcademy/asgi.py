@@ -9,8 +9,29 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'youcademy.settings')
 
-application = get_asgi_application()
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+        Django's handler wraps every request in its own ThreadSensitiveContext,
+        which keeps a dedicated thread alive until the response finishes. For
+        long-lived streams that is one idle thread per client. Requests under
+        ASGI_STREAMING_PATHS skip the per-request context: their short
+        thread-sensitive calls (signal receivers) share Django's sync thread and
+        the views run blocking work on their own bounded executor.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(tuple(settings.ASGI_STREAMING_PATHS)):
+            await self.handle(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
+
+
+get_asgi_application()  # Sets up Django
+application = StreamingASGIHandler()
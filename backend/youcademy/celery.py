@@ -1,6 +1,8 @@
 import os
 from celery import Celery
 
+from youcademy.metrics import registry  # noqa: F401  Connects the task and database metrics
+
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'youcademy.settings')
 
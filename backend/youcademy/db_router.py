@@ -0,0 +1,208 @@
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _RoutingState:
+    __slots__ = ('replica_reads', 'wrote')
+
+    def __init__(self):
+        self.replica_reads = False
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+class ReplicaPool:
+    """
+        Picks a healthy replica alias, round robin.
+        - A replica is pinged (`SELECT 1`) at most every
+          DATABASE_REPLICA_HEALTH_INTERVAL seconds when it is about to be used;
+          one that fails is skipped until the next check.
+        - With no healthy replica, reads fall back to the primary.
+    """
+
+    def __init__(self):
+        self._counter = itertools.count()
+        self._checked = {}  # alias -> (healthy, checked at)
+        self._lock = threading.Lock()
+
+    @property
+    def aliases(self):
+        return getattr(settings, 'DATABASE_REPLICAS', [])
+
+    @property
+    def health_interval(self) -> int:
+        return getattr(settings, 'DATABASE_REPLICA_HEALTH_INTERVAL', 10)
+
+    def _ping(self, alias) -> bool:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception as e:
+            logger.warning("Database replica %s failed its health check: %s", alias, e)
+            return False
+
+    def is_healthy(self, alias) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+        if checked is not None and now - checked[1] < self.health_interval:
+            return checked[0]
+        healthy = self._ping(alias)
+        with self._lock:
+            if checked is not None and checked[0] != healthy:
+                logger.info("Database replica %s is %s", alias, 'back up' if healthy else 'down')
+            self._checked[alias] = (healthy, now)
+        return healthy
+
+    def choose(self):
+        aliases = self.aliases
+        if not aliases:
+            return None
+        start = next(self._counter)
+        for offset in range(len(aliases)):
+            alias = aliases[(start + offset) % len(aliases)]
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._checked.clear()
+
+
+replica_pool = ReplicaPool()
+
+
+class PrimaryReplicaRouter:
+    """
+        Writes go to the primary. Reads go to the primary too, unless the current
+        request opted in to replica reads (see ReplicaReadMixin) and hasn't
+        written yet. Inside a transaction everything stays on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_reads or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica_pool.choose() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _pin_key(user_id) -> str:
+    return f'db:pinned:{user_id}'
+
+
+def is_pinned(user) -> bool:
+    """
+    True if the user wrote recently enough that replicas may not have the write yet.
+    """
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+class ReplicaRoutingMiddleware:
+    """
+        Tracks writes per request for the router. After a request that wrote,
+        the user is pinned to the primary for DATABASE_REPLICA_PIN_SECONDS so
+        their next reads see their own writes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = _RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        self._pin(request, state)
+        return response
+
+    async def __acall__(self, request):
+        # Sync views run in a copy of this context, so they share the state object
+        state = _RoutingState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            await sync_to_async(self._pin)(request, state)
+        return response
+
+    def _pin(self, request, state):
+        user = getattr(request, 'user', None)
+        if state.wrote and getattr(settings, 'DATABASE_REPLICAS', []) and user and user.is_authenticated:
+            cache.set(_pin_key(user.pk), True, getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5))
+
+
+@contextmanager
+def replica_reads():
+    """
+    Let reads in this block go to a replica, until something is written.
+    """
+    state = _state.get()
+    if state is None:
+        state = _RoutingState()
+        token = _state.set(state)
+    else:
+        token = None
+    previous = state.replica_reads
+    state.replica_reads = True
+    try:
+        yield
+    finally:
+        state.replica_reads = previous
+        if token is not None:
+            _state.reset(token)
+
+
+class ReplicaReadMixin:
+    """
+        For DRF views whose reads may be slightly stale, like list endpoints.
+        Safe-method requests read from a replica unless the user is pinned to
+        the primary after a recent write.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = _state.get()
+        if state is not None and request.method in SAFE_METHODS and not is_pinned(request.user):
+            state.replica_reads = True
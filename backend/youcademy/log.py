@@ -0,0 +1,290 @@
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# LogRecord attributes that aren't user-supplied `extra` fields
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+class RequestIDMiddleware:
+    """
+        Gives every request an ID, taken from the incoming X-Request-ID header
+        when it looks sane or generated otherwise. Log records made while
+        handling the request carry it, and the response echoes it back.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _request_id(self, request) -> str:
+        incoming = request.headers.get(getattr(settings, 'REQUEST_ID_HEADER', 'X-Request-ID'), '')
+        return incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.request_id = self._request_id(request)
+        token = request_id.set(request.request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response[getattr(settings, 'REQUEST_ID_HEADER', 'X-Request-ID')] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        request.request_id = self._request_id(request)
+        token = request_id.set(request.request_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response[getattr(settings, 'REQUEST_ID_HEADER', 'X-Request-ID')] = request.request_id
+        return response
+
+
+class RequestIDFilter(logging.Filter):
+    """
+        Stamps records with the current request ID (None outside a request).
+    """
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+        Keeps a `rate` share of INFO and lower records; warnings and errors always pass.
+        - Sampling is per request: a request's records are all kept or all dropped,
+          so the ones that remain tell a whole story.
+        - Records logged with `extra={'sample': False}` always pass.
+    """
+
+    def __init__(self, rate=1.0, name=''):
+        super().__init__(name)
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno > logging.INFO or not getattr(record, 'sample', True):
+            return True
+        ident = getattr(record, 'request_id', None) or request_id.get()
+        if ident is None:
+            return random.random() < self.rate
+        return zlib.crc32(ident.encode()) / 2 ** 32 < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """
+        One JSON object per line: time, level, logger, message and request ID,
+        plus any `extra` fields and the traceback.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key != 'sample':
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RotatingFileHandler(TimedRotatingFileHandler):
+    """
+        Rotates on a schedule (`when`, as for TimedRotatingFileHandler) or once
+        the file has grown past `max_bytes`, whichever comes first.
+    """
+
+    def __init__(self, filename, max_bytes=0, **kwargs):
+        kwargs.setdefault('delay', True)
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if not self.max_bytes:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        return self.stream.tell() >= self.max_bytes
+
+    def rotation_filename(self, default_name):
+        # Size rotations can happen twice within one time suffix
+        name, suffix = default_name, 1
+        while os.path.exists(name):
+            name = f'{default_name}.{suffix}'
+            suffix += 1
+        return name
+
+
+# Arguments of these types can't change before the writer formats the message
+_IMMUTABLE = frozenset({str, int, float, bool, type(None), uuid.UUID, bytes})
+
+_queueing_handlers = weakref.WeakSet()
+
+
+def _before_fork():
+    # Hold the writers' handler locks so no write is half done in the child's copy
+    for handler in list(_queueing_handlers):
+        for target in handler.targets:
+            target.acquire()
+
+
+def _after_fork_in_parent():
+    for handler in list(_queueing_handlers):
+        for target in handler.targets:
+            target.release()
+
+
+# In the child, logging itself replaces every handler lock after a fork
+os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent)
+
+
+class _Listener(QueueListener):
+    interval = 0.05  # seconds records gather before the writer takes them as one batch
+    slice = 0.0005  # seconds of writing after which the writer lets request threads have the GIL
+
+    def _monitor(self):
+        while True:
+            batch = [self.queue.get()]
+            time.sleep(self.interval)
+            try:
+                while True:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            held = time.perf_counter()
+            for record in batch:
+                if record is self._sentinel:
+                    return
+                self.handle(record)
+                if time.perf_counter() - held > self.slice:
+                    time.sleep(0)
+                    held = time.perf_counter()
+
+
+class QueueingHandler(QueueHandler):
+    """
+        Hands records to a bounded queue; a writer thread passes them on to the
+        named `handlers`, so file I/O and JSON encoding stay off the request thread.
+        - Filters (request ID, sampling) run before a record is queued.
+        - The traceback text is captured when the record is queued, and the
+          message rendered then only if an argument could change before it is
+          written; everything else, JSON included, is formatted on the writer thread.
+        - The writer takes records in batches every 50 ms and gives the GIL back
+          every half millisecond of writing, so request threads don't wait behind it.
+        - When `queue_size` records are waiting the record is dropped and
+          counted, never waited for.
+        - The writer starts on first use, again in each forked worker, and is
+          drained at exit.
+    """
+
+    def __init__(self, handlers=(), queue_size=10000):
+        super().__init__(queue.SimpleQueue())
+        self.queue_size = queue_size
+        self.targets = []
+        for name in handlers:
+            if name not in logging._handlers:
+                # dictConfig retries handlers whose error says this, once the others exist
+                raise ValueError(f"Handler {name}: target not configured yet")
+            self.targets.append(logging._handlers[name])
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        _queueing_handlers.add(self)
+        atexit.register(self.flush_and_stop)
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked: the parent's queue and writer thread aren't ours
+                self.queue = queue.SimpleQueue()
+            self._listener = _Listener(self.queue, *self.targets, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # A shallow copy, without running LogRecord.__init__ again
+        copy = logging.LogRecord.__new__(logging.LogRecord)
+        copy.__dict__.update(record.__dict__)
+        record = copy
+        if record.args and not (
+            type(record.msg) is str and type(record.args) is tuple and all(type(arg) in _IMMUTABLE for arg in record.args)
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        # SimpleQueue puts take no lock; the bound is kept loosely by checking the size first
+        if self.queue.qsize() >= self.queue_size:
+            self.dropped += 1
+            return
+        if self.dropped:
+            self.queue.put_nowait(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"Dropped {self.dropped} log records, the log queue was full",
+            }))
+            self.dropped = 0
+        self.queue.put_nowait(record)
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def flush_and_stop(self):
+        """
+        Write out everything queued and stop the writer thread.
+        """
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = self._pid = None
+
+    def close(self):
+        self.flush_and_stop()
+        super().close()
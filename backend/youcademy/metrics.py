@@ -0,0 +1,444 @@
+import atexit
+import contextvars
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery import signals as celery_signals
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+
+class _Owner:
+    """
+        Held by a thread's local storage next to its shard; collected when the thread ends.
+    """
+    __slots__ = ('__weakref__',)
+
+
+class Metric:
+    """
+        One named metric with fixed label names. Each thread records into its own
+        shard, a dict from label values to value, so recording takes no lock;
+        reading merges the shards. When a thread ends its shard is folded into
+        `_retired`, so threads that come and go (one per request under ASGI)
+        don't leave a shard each behind.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.reset()
+
+    def reset(self):
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            owner = self._local.owner = _Owner()
+            with self._lock:
+                self._shards[id(values)] = values
+            weakref.finalize(owner, self._retire, values, self._shards, self._retired, self._lock)
+            return values
+
+    def _retire(self, values, shards, retired, lock):
+        # Bound to the containers of the reset() the shard was made under, so a later reset drops it
+        with lock:
+            if shards.pop(id(values), None) is not None:
+                self._add(retired, values)
+
+    def _add(self, merged, shard):
+        # Copying a dict is atomic under the GIL, iterating one isn't
+        for labels, value in shard.copy().items():
+            merged[labels] = self.merge(merged[labels], value) if labels in merged else self.copy(value)
+
+    @property
+    def values(self) -> dict:
+        """
+        This process's values, merged over threads.
+        """
+        merged = {}
+        with self._lock:
+            self._add(merged, self._retired)
+            shards = list(self._shards.values())
+        for shard in shards:
+            self._add(merged, shard)
+        return merged
+
+    def snapshot(self) -> dict:
+        return {'kind': self.kind, 'values': [[list(labels), value] for labels, value in self.values.items()]}
+
+    @staticmethod
+    def copy(value):
+        return value
+
+    @staticmethod
+    def merge(total, value):
+        return total + value
+
+    def samples(self, values):
+        for labels, value in values.items():
+            yield self.name, dict(zip(self.labelnames, labels)), value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+
+class Histogram(Metric):
+    """
+        Per label set, a list of bucket counts (one per upper bound, then +Inf),
+        the sum and the count, as Prometheus expects them.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._shard()
+        state = values.get(labels)
+        if state is None:
+            state = values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def get(self, *labels):
+        """
+        (sum, count) for a label set.
+        """
+        state = self.values.get(labels)
+        return (state[-2], state[-1]) if state else (0.0, 0)
+
+    @staticmethod
+    def copy(value):
+        return list(value)
+
+    @staticmethod
+    def merge(total, value):
+        return [a + b for a, b in zip(total, value)]
+
+    def samples(self, values):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        for labels, state in values.items():
+            labels = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                yield f'{self.name}_bucket', dict(labels, le=bound), cumulative
+            yield f'{self.name}_sum', labels, state[-2]
+            yield f'{self.name}_count', labels, state[-1]
+
+
+class Registry:
+    """
+        The metrics of this process, and their export for Prometheus.
+        - Without METRICS_DIR the endpoint shows this process only, as with
+          runserver or a single worker.
+        - With METRICS_DIR every process (web and Celery workers) writes its values
+          to `<dir>/<pid>.json` every METRICS_FLUSH_INTERVAL seconds and at exit;
+          the endpoint sums all files, so any worker can answer a scrape. Files of
+          exited workers stay, keeping counters monotonic; clear the directory when
+          deploying, as for prometheus_client's multiprocess mode.
+        - Recording never touches the disk or takes a lock.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._flusher = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def _after_fork_in_child(self):
+        # The parent's values are the parent's to report
+        self.reset()
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', '') if settings.configured else ''
+
+    def start_flusher(self):
+        if self._flusher is not None or not self.directory:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, name='metrics-flusher', daemon=True)
+                self._flusher.start()
+
+    def _flush_periodically(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Couldn't write metrics to %s", self.directory)
+
+    def flush(self):
+        """
+        Write this process's values to METRICS_DIR, if one is set.
+        """
+        directory = self.directory
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as output:
+            json.dump({name: metric.snapshot() for name, metric in self.metrics.items()}, output)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self) -> dict:
+        """
+        {metric name: {label values: value}}, summed over every process that
+        has written to METRICS_DIR, with this process's values current.
+        """
+        collected = {name: metric.values for name, metric in self.metrics.items()}
+        directory = self.directory
+        if not directory or not os.path.isdir(directory):
+            return collected
+        own = f'{os.getpid()}.json'
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(directory, filename), encoding='utf-8') as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue  # Replaced or removed while we read it
+            for name, exported in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None or metric.kind != exported['kind']:
+                    continue
+                values = collected[name]
+                for labels, value in exported['values']:
+                    labels = tuple(labels)
+                    values[labels] = metric.merge(values[labels], value) if labels in values else value
+        return collected
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for sample, labels, value in metric.samples(values):
+                if labels:
+                    rendered = ','.join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+                    sample = f'{sample}{{{rendered}}}'
+                lines.append(f'{sample} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry._after_fork_in_child)
+atexit.register(registry.flush)
+
+HTTP_REQUESTS = registry.counter(
+    'http_requests_total', "HTTP requests by route and status.", ('method', 'route', 'status'))
+HTTP_LATENCY = registry.histogram(
+    'http_request_duration_seconds', "Time to build the response.", ('method', 'route'))
+HTTP_DB_TIME = registry.histogram(
+    'http_request_db_seconds', "Database time per request.", ('route',), QUERY_BUCKETS + (2.5, 5.0))
+HTTP_DB_QUERIES = registry.histogram(
+    'http_request_db_queries', "Database queries per request.", ('route',), COUNT_BUCKETS)
+DB_QUERIES = registry.histogram(
+    'db_query_duration_seconds', "Duration of single database queries.", ('alias',), QUERY_BUCKETS)
+CACHE_LOOKUPS = registry.counter(
+    'cache_lookups_total', "Lookups in the application caches.", ('cache', 'result'))
+CELERY_RUNTIME = registry.histogram(
+    'celery_task_runtime_seconds', "Celery task run time by final state.", ('task', 'state'), TASK_BUCKETS)
+CELERY_QUEUE_WAIT = registry.histogram(
+    'celery_task_queue_wait_seconds', "Time from publishing a Celery task to a worker starting it.",
+    ('task',), TASK_BUCKETS)
+
+
+def record_cache(cache_name, hits, misses=0):
+    """
+    Count lookups in a named application cache: `record_cache('quiz_snapshot', hit)`
+    for one lookup, or hit and miss counts for a batch.
+    """
+    if hits is True or hits is False:
+        hits, misses = int(hits), int(not hits)
+    if hits:
+        CACHE_LOOKUPS.inc(cache_name, 'hit', amount=hits)
+    if misses:
+        CACHE_LOOKUPS.inc(cache_name, 'miss', amount=misses)
+
+
+# Database time of the request being handled: [queries, seconds]
+_request_db = contextvars.ContextVar('request_db', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        DB_QUERIES.observe(elapsed, context['connection'].alias)
+        totals = _request_db.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    # First in line, so the execute_wrapper() context managers pushing and
+    # popping at the end of the list never pop this one
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _time_query)
+
+
+connection_created.connect(_instrument_connection)
+
+
+class MetricsMiddleware:
+    """
+        Records every request's latency, status and database time under the
+        route pattern it resolved to (`<unmatched>` for 404s outside the URLconf).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        registry.start_flusher()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        totals = [0, 0.0]
+        token = _request_db.set(totals)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_db.reset(token)
+        self._record(request, response, time.perf_counter() - started, totals)
+        return response
+
+    async def __acall__(self, request):
+        # Context variables follow the request into sync_to_async threads
+        totals = [0, 0.0]
+        token = _request_db.set(totals)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_db.reset(token)
+        self._record(request, response, time.perf_counter() - started, totals)
+        return response
+
+    def _record(self, request, response, elapsed, totals):
+        match = request.resolver_match
+        route = match.route if match is not None else '<unmatched>'
+        HTTP_REQUESTS.inc(request.method, route, response.status_code)
+        HTTP_LATENCY.observe(elapsed, request.method, route)
+        HTTP_DB_QUERIES.observe(totals[0], route)
+        HTTP_DB_TIME.observe(totals[1], route)
+
+
+def metrics_view(request):
+    """
+    The metrics in Prometheus text format. With METRICS_TOKEN set, scrapers send
+    it as a bearer token; otherwise only METRICS_ALLOWED_IPS may scrape, and
+    outside DEBUG nobody may until one of the two is configured.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        allowed = hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+
+
+_task_started = {}
+
+
+@celery_signals.before_task_publish.connect
+def _stamp_publish_time(sender=None, headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+@celery_signals.task_prerun.connect
+def _task_prerun(sender=None, task_id=None, task=None, **kwargs):
+    registry.start_flusher()
+    _task_started[task_id] = time.perf_counter()
+    request = task.request
+    published_at = getattr(request, 'published_at', None) or (request.headers or {}).get('published_at')
+    if published_at:
+        CELERY_QUEUE_WAIT.observe(max(time.time() - published_at, 0.0), task.name)
+
+
+@celery_signals.task_postrun.connect
+def _task_postrun(sender=None, task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_RUNTIME.observe(time.perf_counter() - started, task.name, state or 'UNKNOWN')
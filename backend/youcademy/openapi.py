@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import os
+import sys
+import threading
+from importlib import metadata
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.template.loader import render_to_string
+from django.urls import URLResolver, get_resolver
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'json': 'application/json; charset=utf-8',
+    'yaml': 'application/yaml; charset=utf-8',
+}
+
+
+def source_files(view) -> set:
+    """
+    The project source files a view's schema is derived from: the view's module
+    and the modules of the classes it imports (serializers, models, pagination).
+    """
+    module = sys.modules.get(getattr(view, '__module__', None))
+    modules = {module} if module is not None else set()
+    for value in vars(module).values() if module is not None else ():
+        if isinstance(value, type) and value.__module__ in sys.modules:
+            modules.add(sys.modules[value.__module__])
+    root = str(settings.BASE_DIR)
+    files = {getattr(module, '__file__', None) or '' for module in modules}
+    return {file for file in files if file.startswith(root)}
+
+
+def urlconf_hash(resolver=None) -> str:
+    """
+    A digest of the URLconf (every route, its name and the view behind it), of
+    the source of the views, serializers and models behind those routes, and
+    of the schema settings and packages. A cached schema is used only while it
+    matches, so a deploy that changes any of them regenerates it.
+    """
+    digest = hashlib.sha256()
+    sources = set()
+
+    def walk(patterns, prefix):
+        for entry in patterns:
+            if isinstance(entry, URLResolver):
+                walk(entry.url_patterns, prefix + str(entry.pattern))
+                continue
+            view = entry.callback
+            view = getattr(view, 'cls', None) or getattr(view, 'view_class', None) or view
+            name = f"{getattr(view, '__module__', '')}.{getattr(view, '__qualname__', type(view).__qualname__)}"
+            digest.update(f'{prefix}{entry.pattern}|{entry.name}|{name}\n'.encode())
+            sources.update(source_files(view))
+
+    walk((resolver or get_resolver()).url_patterns, '')
+    for path in sorted(sources):
+        with open(path, 'rb') as source:
+            digest.update(hashlib.sha256(source.read()).digest())
+    for package in ('djangorestframework', 'drf-yasg'):
+        try:
+            digest.update(f'{package}=={metadata.version(package)}'.encode())
+        except metadata.PackageNotFoundError:
+            pass
+    digest.update(repr(getattr(settings, 'SWAGGER_SETTINGS', {})).encode())
+    return digest.hexdigest()[:16]
+
+
+class SchemaCache:
+    """
+        The encoded OpenAPI schema, generated once per URLconf version.
+        - Looked up in memory, then in OPENAPI_SCHEMA_DIR, and only generated
+          when neither holds the current URLconf hash (which also covers the
+          source of the views, serializers and models behind the routes). `manage.py openapi_schema`
+          fills the directory at build time; otherwise the first request does.
+        - drf_yasg is imported only to generate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resolver = None
+        self._version = None
+        self._schemas = {}
+
+    @property
+    def directory(self):
+        return getattr(settings, 'OPENAPI_SCHEMA_DIR', os.path.join(settings.BASE_DIR, 'openapi'))
+
+    def version(self) -> str:
+        # get_resolver() is cached per URLconf, so this hashes once per process
+        resolver = get_resolver()
+        if resolver is not self._resolver:
+            self._version, self._resolver = urlconf_hash(resolver), resolver
+        return self._version
+
+    def path(self, version, format) -> str:
+        return os.path.join(self.directory, f'schema-{version}.{format}')
+
+    def get(self, format):
+        """
+        (body, ETag) of the schema in `format`.
+        """
+        version = self.version()
+        cached = self._schemas.get((version, format))
+        if cached is not None:
+            return cached
+        with self._lock:
+            if (version, format) not in self._schemas:
+                body = self.read(version, format)
+                if body is None:
+                    logger.info("Generating the %s OpenAPI schema for URLconf %s", format, version)
+                    body = self.build([format])[format]
+                self._schemas = {key: value for key, value in self._schemas.items() if key[0] == version}
+                self._schemas[(version, format)] = (body, f'"{version}-{hashlib.sha256(body).hexdigest()[:16]}"')
+            return self._schemas[(version, format)]
+
+    def build(self, formats=tuple(FORMATS)) -> dict:
+        """
+        Generate the schema, write it to OPENAPI_SCHEMA_DIR in each format and
+        drop the files of other URLconf versions. Returns {format: body}.
+        """
+        from youcademy.swagger_api import encode_schema, generate_schema
+
+        version = self.version()
+        schema = generate_schema()
+        bodies = {format: encode_schema(schema, format) for format in formats}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for format, body in bodies.items():
+                # Written under a temporary name, as other workers may be reading
+                partial = f'{self.path(version, format)}.{os.getpid()}.tmp'
+                with open(partial, 'wb') as output:
+                    output.write(body)
+                os.replace(partial, self.path(version, format))
+            for filename in os.listdir(self.directory):
+                stale = filename.startswith('schema-') and not filename.startswith(f'schema-{version}.')
+                if stale and not filename.endswith('.tmp'):
+                    os.remove(os.path.join(self.directory, filename))
+        except OSError:
+            # A read-only deploy still serves the schema, from memory
+            logger.exception("Couldn't write the OpenAPI schema to %s", self.directory)
+        return bodies
+
+    def read(self, version, format):
+        try:
+            with open(self.path(version, format), 'rb') as schema:
+                return schema.read()
+        except FileNotFoundError:
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._schemas = {}
+            self._resolver = self._version = None
+
+
+schema_cache = SchemaCache()
+
+
+def schema_view(request, format):
+    """
+    The cached schema as JSON or YAML. Clients revalidate with the ETag and get
+    a 304 while the URLconf is unchanged.
+    """
+    if format not in FORMATS:
+        raise Http404(f"No {format} schema; use one of {', '.join(FORMATS)}")
+    body, etag = schema_cache.get(format)
+    response = get_conditional_response(request, etag=etag) or HttpResponse(body, content_type=FORMATS[format])
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def docs_view(request, ui):
+    """
+    Swagger UI or ReDoc, reading the cached schema from SPEC_URL instead of
+    generating one per page view as drf_yasg's views do.
+    """
+    from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+
+    from youcademy.swagger_api import API_VERSION, api_info
+
+    renderer = {'swagger': SwaggerUIRenderer, 'redoc': ReDocRenderer}[ui]()
+    context = {'request': request}
+    renderer.set_context(context)
+    context.update(title=api_info.title, version=API_VERSION)
+    return HttpResponse(render_to_string(renderer.template, context, request))
@@ -0,0 +1,229 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from youcademy.query_budget import record_queries
+
+logger = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'sample')
+
+
+def frame_label(module, name) -> str:
+    return f'{module}:{name}'
+
+
+class StackSampler:
+    """
+        Samples one thread's Python stack every `interval` seconds from a helper
+        thread and counts the collapsed stacks, outermost frame first. Frames at
+        and below `root` (a code object) are left out.
+        - The helper needs the GIL to take a sample, so while the sampled thread
+          runs pure Python samples land at most every sys.getswitchinterval().
+    """
+
+    def __init__(self, thread_id, interval=0.001, root=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and frame.f_code is not self.root:
+                code = frame.f_code
+                labels.append(frame_label(frame.f_globals.get('__name__'), getattr(code, 'co_qualname', code.co_name)))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+
+class DumpStore:
+    """
+        A directory of profile dumps kept as a ring: writing past `max_dumps`
+        deletes the oldest. Each dump is `<id>.json` (request, SQL, stack samples)
+        plus `<id>.prof` (pstats) for cProfile runs. IDs sort by time.
+    """
+
+    def __init__(self, directory=None, max_dumps=None):
+        self.directory = directory or getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+        self.max_dumps = max_dumps or getattr(settings, 'PROFILING_MAX_DUMPS', 200)
+
+    def ids(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def path(self, dump_id, extension='json') -> str:
+        return os.path.join(self.directory, f'{dump_id}.{extension}')
+
+    def load(self, dump_id) -> dict:
+        with open(self.path(dump_id), encoding='utf-8') as dump:
+            return json.load(dump)
+
+    def save(self, meta, profile=None) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        dump_id = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+        if profile is not None:
+            profile.dump_stats(self.path(dump_id, 'prof'))
+        # Written under a temporary name so readers never see half a dump
+        partial = self.path(dump_id, 'json.tmp')
+        with open(partial, 'w', encoding='utf-8') as dump:
+            json.dump(dict(meta, id=dump_id), dump)
+        os.replace(partial, self.path(dump_id))
+        self.prune()
+        return dump_id
+
+    def prune(self):
+        ids = self.ids()
+        for dump_id in ids[:max(len(ids) - self.max_dumps, 0)]:
+            for extension in ('json', 'prof'):
+                try:
+                    os.remove(self.path(dump_id, extension))
+                except FileNotFoundError:
+                    pass  # Another worker pruned it first
+
+
+class ProfilingMiddleware:
+    """
+        Profiles single requests on demand, storing each as a dump in a DumpStore.
+        - Staff users switch it on per request with an `X-Profile: cprofile` or
+          `X-Profile: sample` header; PROFILING_SAMPLE_RATE picks a share of all
+          requests (profiled in PROFILING_MODE).
+        - `sample` reads the stack every PROFILING_INTERVAL seconds, cheap enough
+          for production traffic. `cprofile` also traces every call, for exact
+          call counts and timings; the samples still give the flamegraph, since
+          cProfile keeps only caller/callee pairs.
+        - SQL timings come along in both modes. The response carries the dump ID
+          in X-Profile-Id; `manage.py profiles` lists and renders dumps.
+        - Unprofiled requests cost a header lookup (well under a microsecond).
+          PROFILING_ENABLED off removes the middleware entirely. The header name and
+          sample rate are read at startup.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Read once: settings lookups would be most of the cost of an unprofiled request
+        self.header = 'HTTP_' + getattr(settings, 'PROFILING_HEADER', 'X-Profile').upper().replace('-', '_')
+        self.rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode, asked = self._requested(request)
+        if asked and not self._is_staff(request):
+            mode = self._ignore(request)
+        if mode is None:
+            return self.get_response(request)
+        return self._profile(request, self.get_response, mode)
+
+    async def __acall__(self, request):
+        mode, asked = self._requested(request)
+        if asked and not await sync_to_async(self._is_staff)(request):
+            mode = self._ignore(request)
+        if mode is None or request.path.startswith(tuple(getattr(settings, 'ASGI_STREAMING_PATHS', ()))):
+            return await self.get_response(request)
+        # Profile on the thread the sync views will run on
+        return await sync_to_async(self._profile)(request, async_to_sync(self.get_response), mode)
+
+    def _requested(self, request):
+        """
+        The mode asked for, and whether it was asked for by header (and still
+        needs a staff check) rather than picked by sampling.
+        """
+        # META rather than request.headers, which builds a dict of every header on first use
+        requested = request.META.get(self.header)
+        if requested is not None:
+            return (requested if requested in MODES else 'cprofile'), True
+        if self.rate and random.random() < self.rate:
+            return getattr(settings, 'PROFILING_MODE', 'sample'), False
+        return None, False
+
+    def _ignore(self, request):
+        logger.warning("Ignored the profiling header from a non-staff client on %s %s", request.method, request.path)
+        return None
+
+    def _is_staff(self, request) -> bool:
+        # Authentication normally happens inside the DRF view; run it early for this one header
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        api_request = Request(request)
+        for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                result = authentication_class().authenticate(api_request)
+            except APIException:
+                return False
+            if result is not None:
+                return bool(getattr(result[0], 'is_staff', False))
+        return False
+
+    def _profile(self, request, get_response, mode):
+        profile = None
+        started = time.perf_counter()
+        sampler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_INTERVAL', 0.001),
+                               root=self._profile.__code__)
+        with record_queries(keep=getattr(settings, 'PROFILING_MAX_QUERIES', 500)) as recorder, sampler:
+            if mode == 'sample':
+                response = get_response(request)
+            else:
+                profile = cProfile.Profile()
+                profile.enable()
+                try:
+                    response = get_response(request)
+                finally:
+                    profile.disable()
+        elapsed = time.perf_counter() - started
+
+        meta = {
+            'mode': mode,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'request_id': getattr(request, 'request_id', None),
+            'started': time.time() - elapsed,
+            'duration_ms': round(elapsed * 1000, 2),
+            'db_queries': recorder.count,
+            'db_ms': round(recorder.seconds * 1000, 2),
+            'queries': [{'sql': sql, 'ms': round(seconds * 1000, 3)} for sql, seconds in recorder.queries],
+            'interval': sampler.interval,
+            'stacks': dict(sampler.stacks),
+        }
+        try:
+            response['X-Profile-Id'] = DumpStore().save(meta, profile)
+        except OSError:
+            logger.exception("Couldn't store the profile of %s %s", request.method, request.path)
+        return response
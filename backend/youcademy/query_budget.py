@@ -0,0 +1,192 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SAVEPOINT_RE = re.compile(r'SAVEPOINT "[^"]+"')
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b|%s')
+_LIST_RE = re.compile(r'\((?:\s*\?\s*,)*\s*\?\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql) -> str:
+    """
+    The shape of a query: literals and placeholders replaced by ?, IN lists
+    collapsed, so the same query with different values has the same fingerprint.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _SAVEPOINT_RE.sub('SAVEPOINT ?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a view runs more queries than its declared budget, in strict mode."""
+
+
+class QueryRecorder:
+    """
+        Database execute wrapper that counts queries, times them and groups
+        them by fingerprint. With `keep`, the first `keep` queries are also
+        kept as (sql, seconds) in `queries`.
+    """
+
+    def __init__(self, keep=0):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+        self.keep = keep
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.seconds += elapsed
+            self.count += 1
+            if len(self.queries) < self.keep:
+                self.queries.append((sql, elapsed))
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self) -> dict:
+        """
+        Fingerprints run more than once, most repeated first. Usually an N+1.
+        """
+        return {sql: count for sql, count in self.fingerprints.most_common() if count > 1}
+
+    def as_dict(self) -> dict:
+        return {
+            'db_queries': self.count,
+            'db_ms': round(self.seconds * 1000, 2),
+            'db_duplicates': sum(count - 1 for count in self.duplicates.values()),
+        }
+
+
+@contextmanager
+def record_queries(keep=0):
+    """
+    Record the queries this thread runs on any database inside the block.
+    """
+    recorder = QueryRecorder(keep)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def view_budget(view_class, method):
+    """
+    A view's declared budget for a method: `query_budget = 3` or
+    `query_budget = {'GET': 1, 'POST': 3}`. None when undeclared.
+    """
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+        Measures the queries behind each API request under QUERY_METRICS_PATHS.
+        - Query count, DB time and duplicate fingerprints are logged as fields
+          of one `youcademy.query_budget` record per request, and returned as
+          X-DB-* headers when QUERY_METRICS_HEADERS is on (the default in DEBUG).
+        - Views declare `query_budget`. Going over it logs a warning, or raises
+          QueryBudgetExceeded when QUERY_BUDGET_STRICT is on, as under the test runner.
+        - Streams under ASGI_STREAMING_PATHS pass through unmeasured, without a
+          hop to a sync thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._measured(request):
+            return self.get_response(request)
+        return self._measure(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not self._measured(request) or request.path.startswith(tuple(getattr(settings, 'ASGI_STREAMING_PATHS', ()))):
+            return await self.get_response(request)
+        # Measure on the thread the sync views and their queries will run on
+        return await sync_to_async(self._measure)(request, async_to_sync(self.get_response))
+
+    def _measured(self, request) -> bool:
+        return request.path.startswith(tuple(getattr(settings, 'QUERY_METRICS_PATHS', ())))
+
+    def _measure(self, request, get_response):
+        with record_queries() as recorder:
+            response = get_response(request)
+
+        view, budget = getattr(request, '_query_budget_view', (None, None))
+        fields = dict(recorder.as_dict(), method=request.method, path=request.path,
+                      view=view, status=response.status_code, db_budget=budget)
+        if recorder.duplicates:
+            fields['db_duplicate_queries'] = list(recorder.duplicates.items())[:5]
+        logger.info("%s %s ran %s queries in %s ms", request.method, request.path, recorder.count, fields['db_ms'], extra=fields)
+
+        if getattr(settings, 'QUERY_METRICS_HEADERS', settings.DEBUG):
+            response['X-DB-Queries'] = str(recorder.count)
+            response['X-DB-Time-ms'] = str(fields['db_ms'])
+            response['X-DB-Duplicates'] = str(fields['db_duplicates'])
+
+        if budget is not None and recorder.count > budget:
+            message = (
+                f"{view} {request.method} ran {recorder.count} queries, over its budget of {budget}. "
+                f"Repeated: {recorder.duplicates or 'none'}"
+            )
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra=fields)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        if view_class is not None:
+            request._query_budget_view = (view_class.__name__, view_budget(view_class, request.method))
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """
+        Test runner that makes declared query budgets fail tests.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_STRICT = True
+
+
+class QueryBudgetTestMixin:
+    """
+        For TestCase classes: assertQueryBudget checks a block against a
+        budget and reports the repeated queries when it fails.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget, duplicates=0):
+        with record_queries() as recorder:
+            yield recorder
+        self.assertLessEqual(
+            recorder.count, budget, f"{recorder.count} queries, budget {budget}. Repeated: {recorder.duplicates}"
+        )
+        repeated = sum(count - 1 for count in recorder.duplicates.values())
+        self.assertLessEqual(repeated, duplicates, f"Repeated queries: {recorder.duplicates}")
@@ -62,12 +62,16 @@ INSTALLED_APPS = [
     # Third party apps
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'drf_yasg',
     
 ]
 
 MIDDLEWARE = [
+    'youcademy.log.RequestIDMiddleware',
+    'youcademy.metrics.MetricsMiddleware',
+    'youcademy.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -76,6 +80,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'youcademy.db_router.ReplicaRoutingMiddleware',
+    'youcademy.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'youcademy.urls'
@@ -108,6 +114,53 @@ DATABASES = {
     }
 }
 
+# Read replicas, as database URLs. List endpoints that opt in read from them; everything
+# else uses `default`. Locally: DATABASE_REPLICA_URLS=sqlite:///replica1.sqlite3 and
+# `python manage.py sync_replicas` to copy the primary into the replica files.
+DATABASE_REPLICA_URLS = env.list('DATABASE_REPLICA_URLS', default=[])
+for index, url in enumerate(DATABASE_REPLICA_URLS, 1):
+    DATABASES[f'replica{index}'] = dict(env.db_url_config(url), TEST={'MIRROR': 'default'})
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['youcademy.db_router.PrimaryReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = env.int('DATABASE_REPLICA_PIN_SECONDS', default=5)  # primary-only reads after a write
+DATABASE_REPLICA_HEALTH_INTERVAL = env.int('DATABASE_REPLICA_HEALTH_INTERVAL', default=10)  # seconds between pings
+
+# Per-request query counts, DB time and repeated queries (see youcademy/query_budget.py)
+QUERY_METRICS_PATHS = ['/auth/users/', '/content/']
+QUERY_METRICS_HEADERS = env.bool('QUERY_METRICS_HEADERS', default=DEBUG)  # X-DB-* response headers
+QUERY_BUDGET_STRICT = env.bool('QUERY_BUDGET_STRICT', default=False)  # raise when a view exceeds its query_budget
+TEST_RUNNER = 'youcademy.query_budget.QueryBudgetTestRunner'
+
+# Prometheus metrics at /metrics (see youcademy/metrics.py). Under several worker processes, point
+# METRICS_DIR at a directory shared by the web and Celery workers of a host, and clear it on deploy.
+METRICS_DIR = env('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = env.int('METRICS_FLUSH_INTERVAL', default=5)  # seconds between writes to METRICS_DIR
+METRICS_TOKEN = env('METRICS_TOKEN', default='')  # bearer token for scrapers...
+# ...or these addresses without one. Loopback only by default under DEBUG: behind a reverse proxy on
+# the same host every request comes from loopback, so elsewhere set a token.
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1', '::1'] if DEBUG else [])
+
+# On-demand request profiling (see youcademy/profiling.py and `manage.py profiles`)
+PROFILING_ENABLED = env.bool('PROFILING_ENABLED', default=True)  # off removes the middleware
+PROFILING_HEADER = 'X-Profile'  # staff only: "cprofile" or "sample"
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)  # share of all requests to profile...
+PROFILING_MODE = env('PROFILING_MODE', default='sample')  # ...and how
+PROFILING_INTERVAL = env.float('PROFILING_INTERVAL', default=0.001)  # seconds between stack samples
+PROFILING_MAX_QUERIES = 500  # SQL statements kept per dump
+PROFILING_DIR = env('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_DUMPS = env.int('PROFILING_MAX_DUMPS', default=200)  # the oldest dumps are deleted past this
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+# Throttle counters, revocations and snapshots are only consistent across workers
+# with a shared backend: set CACHE_URL (e.g. redis://127.0.0.1:6379/1) in production.
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+THROTTLE_CACHE = env('THROTTLE_CACHE', default='default')  # alias in CACHES for rate-limit counters
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -170,7 +223,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -179,25 +232,34 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'accounts.throttling.AnonThrottle',
+        'accounts.throttling.UserThrottle',
+        'accounts.throttling.ScopedThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        'user_read': '120/min',
+        'login': '10/min',  # per IP
+        'login_email': '5/15m',  # failed logins per account and IP
+        'login_account': '30/15m',  # failed logins per account
+        'register': '5/hour',  # per IP
     },
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer' if DEBUG else 'rest_framework.renderers.JSONRenderer',
+        'youcademy.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer' if DEBUG else 'youcademy.fastjson.FastJSONRenderer',
     ),
     'DEFAULT_PARSER_CLASSES': (
-        'rest_framework.parsers.JSONParser',
+        'youcademy.fastjson.FastJSONParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ),
     'EXCEPTION_HANDLER': 'accounts.utils.custom_exception_handler',
 }
 
+# API JSON encoding: 'orjson', 'stdlib', or 'auto' for orjson when installed (see youcademy/fastjson.py)
+JSON_BACKEND = env('JSON_BACKEND', default='auto')
+
 # CORS configuration
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -209,8 +271,84 @@ SIMPLE_JWT = {
     "ALGORITHM": env("JWT_ALGORITHM"),
     "SIGNING_KEY": SECRET_KEY,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_REFRESH_SERIALIZER": "accounts.serializers.CustomTokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER": "accounts.serializers.CustomTokenVerifySerializer",
 }
 
+# Cached user resolution for JWT authentication
+USER_CACHE_TTL = env.int('USER_CACHE_TTL', default=300)
+
+# Content search
+CONTENT_SEARCH_BACKEND = env('CONTENT_SEARCH_BACKEND', default='content_management.search.SQLiteFTS5Backend')
+CONTENT_SEARCH_ASYNC = env.bool('CONTENT_SEARCH_ASYNC', default=False)
+
+# Pre-rendered quiz snapshots (seconds)
+QUIZ_SNAPSHOT_TTL = env.int('QUIZ_SNAPSHOT_TTL', default=3600)
+
+# Quiz grading: submissions per bulk insert and per Celery task
+QUIZ_GRADING_BATCH_SIZE = env.int('QUIZ_GRADING_BATCH_SIZE', default=500)
+
+# Quiz answer events: write-behind buffer, stored in batches (see content_management/answer_events.py)
+ANSWER_EVENTS_BATCH_SIZE = env.int('ANSWER_EVENTS_BATCH_SIZE', default=1000)
+ANSWER_EVENTS_FLUSH_INTERVAL = env.float('ANSWER_EVENTS_FLUSH_INTERVAL', default=1.0)  # seconds
+ANSWER_EVENTS_MAX_PENDING = env.int('ANSWER_EVENTS_MAX_PENDING', default=50000)  # per process, then 503s
+ANSWER_EVENTS_MAX_PER_REQUEST = env.int('ANSWER_EVENTS_MAX_PER_REQUEST', default=100)
+ANSWER_EVENTS_FLUSHER = env.bool('ANSWER_EVENTS_FLUSHER', default=True)  # off: full batches are stored inline
+ANSWER_EVENTS_SPOOL_DIR = env('ANSWER_EVENTS_SPOOL_DIR', default=os.path.join(BASE_DIR, 'spool', 'answer_events'))
+ANSWER_EVENTS_FSYNC = env.bool('ANSWER_EVENTS_FSYNC', default=False)  # on: spooled events also survive power loss
+ANSWER_EVENTS_REPLAY_INTERVAL = env.int('ANSWER_EVENTS_REPLAY_INTERVAL', default=60)  # seconds between orphan scans
+
+# AI: language model client (content_management.llm.GeminiClient in production)
+AI_LLM_CLIENT = env('AI_LLM_CLIENT', default='content_management.llm.StubLLMClient')
+AI_LLM_MODEL = env('AI_LLM_MODEL', default='gemini-2.5-flash')
+GEMINI_API_KEY = env('GEMINI_API_KEY', default='')
+
+# AI: quiz generation from notes
+AI_QUIZ_CHUNK_SIZE = env.int('AI_QUIZ_CHUNK_SIZE', default=2000)  # characters
+AI_QUIZ_QUESTIONS_PER_CHUNK = env.int('AI_QUIZ_QUESTIONS_PER_CHUNK', default=3)
+AI_QUIZ_CONCURRENCY = env.int('AI_QUIZ_CONCURRENCY', default=4)  # LLM calls in flight per note
+AI_QUIZ_CACHE_TTL = env.int('AI_QUIZ_CACHE_TTL', default=7 * 24 * 3600)
+AI_QUIZ_ASYNC = env.bool('AI_QUIZ_ASYNC', default=True)
+AI_QUIZ_AUTOGENERATE = env.bool('AI_QUIZ_AUTOGENERATE', default=False)
+
+# AI: vector index over note chunks for retrieval
+AI_EMBEDDER = env('AI_EMBEDDER', default='content_management.vectors.HashingEmbedder')
+AI_EMBEDDING_DIM = env.int('AI_EMBEDDING_DIM', default=256)
+AI_VECTOR_INDEX_DIR = env('AI_VECTOR_INDEX_DIR', default=str(BASE_DIR / 'vector_index'))
+AI_VECTOR_CHUNK_SIZE = env.int('AI_VECTOR_CHUNK_SIZE', default=800)  # characters
+AI_VECTOR_INDEX_ASYNC = env.bool('AI_VECTOR_INDEX_ASYNC', default=False)
+
+# AI: scheduling of outbound LLM calls (per process)
+AI_LLM_MAX_CONCURRENT = env.int('AI_LLM_MAX_CONCURRENT', default=8)
+AI_LLM_MAX_CONCURRENT_PER_USER = env.int('AI_LLM_MAX_CONCURRENT_PER_USER', default=4)
+AI_LLM_QUEUE_TIMEOUT = env.int('AI_LLM_QUEUE_TIMEOUT', default=60)  # seconds waiting for a slot
+AI_LLM_BATCH_SIZE = env.int('AI_LLM_BATCH_SIZE', default=16)  # prompts per request, if the provider batches
+
+# AI: response cache in front of the language model
+AI_RESPONSE_CACHE_ENABLED = env.bool('AI_RESPONSE_CACHE_ENABLED', default=True)
+AI_RESPONSE_CACHE_TTL = env.int('AI_RESPONSE_CACHE_TTL', default=24 * 3600)
+AI_RESPONSE_CACHE_MAX_ENTRIES = env.int('AI_RESPONSE_CACHE_MAX_ENTRIES', default=10000)  # per process
+AI_RESPONSE_CACHE_MAX_BYTES = env.int('AI_RESPONSE_CACHE_MAX_BYTES', default=64 * 2 ** 20)  # per process
+AI_RESPONSE_CACHE_SIMILARITY = env.float('AI_RESPONSE_CACHE_SIMILARITY', default=0.0)  # 0 disables, e.g. 0.9
+AI_PROMPT_LOG = env('AI_PROMPT_LOG', default='')  # JSON lines file for bench_response_cache
+
+# AI: streamed answers (serve with an ASGI server, e.g. `uvicorn youcademy.asgi:application`)
+ASGI_STREAMING_PATHS = ['/content/ask/']  # served without a thread per open request, see youcademy/asgi.py
+AI_STREAM_MAX_CONCURRENT = env.int('AI_STREAM_MAX_CONCURRENT', default=500)  # open streams per process
+AI_STREAM_SYNC_WORKERS = env.int('AI_STREAM_SYNC_WORKERS', default=8)  # threads for auth and retrieval
+AI_STREAM_IDLE_TIMEOUT = env.int('AI_STREAM_IDLE_TIMEOUT', default=30)  # seconds between tokens
+AI_ANSWER_CONTEXT_CHARS = env.int('AI_ANSWER_CONTEXT_CHARS', default=6000)
+AI_STUB_STREAM_DELAY = env.float('AI_STUB_STREAM_DELAY', default=0.0)  # seconds per token
+
+# Refresh-token revocation filter
+TOKEN_REVOCATION_REBUILD_INTERVAL = env.int('TOKEN_REVOCATION_REBUILD_INTERVAL', default=300)
+TOKEN_REVOCATION_CAPACITY = env.int('TOKEN_REVOCATION_CAPACITY', default=100000)
+TOKEN_REVOCATION_ERROR_RATE = env.float('TOKEN_REVOCATION_ERROR_RATE', default=0.001)
+
+# Login engine
+LOGIN_PASSWORD_WORKERS = env.int('LOGIN_PASSWORD_WORKERS', default=4)
+LOGIN_FAILURE_CACHE_TTL = env.int('LOGIN_FAILURE_CACHE_TTL', default=30)
+
 # Authentication Backend
 AUTHENTICATION_BACKENDS = (
     'social_core.backends.google.GoogleOAuth2',
@@ -228,6 +366,15 @@ EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='noreply@youcademy.com')
 
 # Logging Configuration
+# Records are queued and written as JSON lines by a background thread (see youcademy/log.py)
+LOG_DIR = env('LOG_DIR', default=str(BASE_DIR / 'logs'))
+LOG_QUEUE_SIZE = env.int('LOG_QUEUE_SIZE', default=10000)  # records waiting to be written; more are dropped
+LOG_INFO_SAMPLE_RATE = env.float('LOG_INFO_SAMPLE_RATE', default=1.0)  # share of requests whose INFO records are kept
+LOG_MAX_BYTES = env.int('LOG_MAX_BYTES', default=50 * 2 ** 20)  # rotate past this size...
+LOG_ROTATE_WHEN = env('LOG_ROTATE_WHEN', default='midnight')  # ...or on this schedule
+LOG_BACKUP_COUNT = env.int('LOG_BACKUP_COUNT', default=14)
+REQUEST_ID_HEADER = 'X-Request-ID'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -240,11 +387,21 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'youcademy.log.JSONFormatter',
+        },
     },
     'filters': {
         'require_debug_true': {
             '()': 'django.utils.log.RequireDebugTrue',
         },
+        'request_id': {
+            '()': 'youcademy.log.RequestIDFilter',
+        },
+        'sample_info': {
+            '()': 'youcademy.log.SamplingFilter',
+            'rate': LOG_INFO_SAMPLE_RATE,
+        },
     },
     'handlers': {
         'console': {
@@ -255,9 +412,19 @@ LOGGING = {
         },
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs/django.log',
-            'formatter': 'verbose',
+            'class': 'youcademy.log.RotatingFileHandler',
+            'filename': os.path.join(LOG_DIR, 'django.log'),
+            'max_bytes': LOG_MAX_BYTES,
+            'when': LOG_ROTATE_WHEN,
+            'backupCount': LOG_BACKUP_COUNT,
+            'formatter': 'json',
+        },
+        'queue': {
+            '()': 'youcademy.log.QueueingHandler',
+            'handlers': ['file'],
+            'queue_size': LOG_QUEUE_SIZE,
+            'level': 'INFO',
+            'filters': ['request_id', 'sample_info'],
         },
         'mail_admins': {
             'level': 'ERROR',
@@ -266,19 +433,32 @@ LOGGING = {
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['console', 'queue'],
             'propagate': True,
             'level': 'INFO',
         },
         'django.request': {
-            'handlers': ['mail_admins', 'file'],
+            'handlers': ['mail_admins', 'queue'],
             'level': 'ERROR',
             'propagate': False,
         },
         'accounts': {
-            'handlers': ['console', 'file'],
+            'handlers': ['console', 'queue'],
             'level': 'INFO',
         },
+        'content_management': {
+            'handlers': ['console', 'queue'],
+            'level': 'INFO',
+        },
+        'youcademy': {
+            'handlers': ['console', 'queue'],
+            'level': 'INFO',
+        },
+        'youcademy.query_budget': {
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -316,5 +496,14 @@ SWAGGER_SETTINGS = {
             'name': 'Authorization',
             'in': 'header'
         }
-    }
-}
\ No newline at end of file
+    },
+    'SPEC_URL': ('schema-json', {'format': 'json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': 'json'}),
+}
+# Generated schemas, one per URLconf version (see youcademy/openapi.py). The version hashes the
+# routes and the source of their views, serializers and models, so changing any of them makes
+# a stale file unusable. Fill it at build time with `python manage.py openapi_schema`;
+# otherwise the first request to /swagger.json/ does.
+OPENAPI_SCHEMA_DIR = env('OPENAPI_SCHEMA_DIR', default=str(BASE_DIR / 'openapi'))
\ No newline at end of file
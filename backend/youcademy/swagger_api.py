@@ -1,19 +1,32 @@
-from django.urls import re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
 
-...
+# Version of the API, reported in the schema's info and on the docs page
+API_VERSION = '1.0.0'
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="YouCademy API Documentation",
-      default_version='1.0.0',
-      description="Test description",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snippets.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
\ No newline at end of file
+api_info = openapi.Info(
+   title="YouCademy API Documentation",
+   default_version=API_VERSION,
+   description="Test description",
+   terms_of_service="https://www.google.com/policies/terms/",
+   contact=openapi.Contact(email="contact@snippets.local"),
+   license=openapi.License(name="BSD License"),
+)
+
+CODECS = {
+    'json': OpenAPICodecJson,
+    'yaml': OpenAPICodecYaml,
+}
+
+
+def generate_schema():
+    """
+    The public schema of every API view, without a request: the host and
+    scheme are left for clients to take from the URL they fetched it from.
+    """
+    return OpenAPISchemaGenerator(api_info).get_schema(request=None, public=True)
+
+
+def encode_schema(schema, format) -> bytes:
+    return CODECS[format](validators=[]).encode(schema)
@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from celery.backends.base import DisabledBackend
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.tokens import generate_tokens
+from content_management.tasks import update_search_index
+from .log import JSONFormatter, QueueingHandler, RequestIDFilter, RotatingFileHandler, SamplingFilter, request_id
+from .metrics import (
+    CACHE_LOOKUPS, CELERY_QUEUE_WAIT, CELERY_RUNTIME, CONTENT_TYPE, DB_QUERIES, HTTP_DB_QUERIES, HTTP_REQUESTS, Counter,
+    Histogram, Registry,
+)
+
+User = get_user_model()
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class ListHandler(logging.Handler):
+    """
+    Collects formatted records; `gate` blocks the writer until it is set.
+    """
+    def __init__(self, name):
+        super().__init__()
+        self.set_name(name)
+        self.setFormatter(JSONFormatter())
+        self.lines = []
+        self.writers = set()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def emit(self, record):
+        self.gate.wait(5)
+        self.writers.add(threading.current_thread())
+        self.lines.append(json.loads(self.format(record)))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LoggingPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.target = ListHandler('test-log-target')
+        self.handler = QueueingHandler(['test-log-target'], queue_size=2)
+        self.handler.addFilter(RequestIDFilter())
+        self.addCleanup(self.handler.close)
+        self.logger = logging.getLogger('youcademy.tests.pipeline')
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def test_records_are_written_as_json_by_the_writer_thread(self):
+        token = request_id.set('req-1')
+        self.addCleanup(request_id.reset, token)
+        self.logger.warning("Registration failed validation on: %s", 'email', extra={'invalid_fields': ['email']})
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            self.logger.exception("Failed")
+        self.handler.flush_and_stop()
+        first, second = self.target.lines
+        self.assertEqual((first['message'], first['request_id'], first['invalid_fields']),
+                         ('Registration failed validation on: email', 'req-1', ['email']))
+        self.assertEqual(first['thread'], threading.current_thread().name)
+        self.assertNotIn(threading.current_thread(), self.target.writers)
+        self.assertIn('ValueError: boom', second['exception'])
+
+    def test_full_queue_drops_and_reports(self):
+        self.target.gate.clear()
+        self.logger.warning('taken by the writer')
+        time.sleep(0.05)
+        for index in range(4):
+            self.logger.warning('queued %s', index)
+        self.assertEqual(self.handler.dropped, 2)
+        self.target.gate.set()
+        time.sleep(0.05)
+        self.logger.warning('after')
+        self.handler.flush_and_stop()
+        self.assertEqual([line['message'] for line in self.target.lines], [
+            'taken by the writer', 'queued 0', 'queued 1', 'Dropped 2 log records, the log queue was full', 'after',
+        ])
+
+    def test_sampling_keeps_or_drops_whole_requests(self):
+        sampler = SamplingFilter(rate=0.5)
+
+        def kept(ident, level=logging.INFO, **extra):
+            record = logging.makeLogRecord(dict(levelno=level, request_id=ident, **extra))
+            return sampler.filter(record)
+
+        idents = [f'request-{index}' for index in range(200)]
+        decisions = [kept(ident) for ident in idents]
+        self.assertEqual(decisions, [kept(ident) for ident in idents])
+        self.assertTrue(60 < sum(decisions) < 140)
+        self.assertTrue(all(kept(ident, logging.WARNING) for ident in idents))
+        self.assertTrue(all(kept(ident, sample=False) for ident in idents))
+
+    def test_request_id_is_echoed_and_sanitized(self):
+        response = self.client.post(reverse('user-login'), {}, format='json', HTTP_X_REQUEST_ID='abc-123')
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        response = self.client.post(reverse('user-login'), {}, format='json', HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_rotates_by_size(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        handler = RotatingFileHandler(os.path.join(directory, 'app.log'), max_bytes=100, when='midnight', backupCount=2)
+        handler.setFormatter(JSONFormatter())
+        self.addCleanup(handler.close)
+        for index in range(10):
+            handler.handle(logging.makeLogRecord({'msg': f'line {index}', 'levelno': logging.INFO}))
+        self.assertEqual(len(os.listdir(directory)), 3)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, METRICS_DIR='', METRICS_TOKEN='')
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ada@example.com', password='Secret#123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {generate_tokens(self.user)['access']}")
+
+    def test_records_requests_database_time_and_cache_lookups(self):
+        route = 'content/notes/'
+        requests = HTTP_REQUESTS.get('GET', route, 200)
+        queries = DB_QUERIES.get('default')[1]
+        misses, hits = CACHE_LOOKUPS.get('user_snapshot', 'miss'), CACHE_LOOKUPS.get('user_snapshot', 'hit')
+        for _ in range(2):
+            self.assertEqual(self.client.get(reverse('note-list')).status_code, 200)
+        self.client.get('/no/such/page/')
+
+        self.assertEqual(HTTP_REQUESTS.get('GET', route, 200), requests + 2)
+        self.assertGreater(HTTP_REQUESTS.get('GET', '<unmatched>', 404), 0)
+        self.assertGreater(HTTP_DB_QUERIES.get(route)[0], 0)
+        self.assertGreater(DB_QUERIES.get('default')[1], queries)
+        self.assertEqual(CACHE_LOOKUPS.get('user_snapshot', 'miss'), misses + 1)
+        self.assertEqual(CACHE_LOOKUPS.get('user_snapshot', 'hit'), hits + 1)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertRegex(body, r'http_request_duration_seconds_bucket\{method="GET",route="content/notes/",le="\+Inf"\} \d+')
+        self.assertIn(f'http_requests_total{{method="GET",route="content/notes/",status="200"}} {requests + 2}', body)
+
+    def test_scrapes_need_the_token_or_an_allowed_address(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=[]):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            self.client.credentials(HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 200)
+
+    def test_threads_that_end_fold_their_values_into_a_total(self):
+        counter = Counter('test_total', 'Test.', ('kind',))
+        histogram = Histogram('test_seconds', 'Test.')
+
+        def record():
+            counter.inc('a')
+            histogram.observe(0.02)
+
+        for _ in range(50):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+        record()
+        self.assertEqual(len(counter._shards), 1)
+        self.assertEqual(len(histogram._shards), 1)
+        self.assertEqual(counter.get('a'), 51)
+        self.assertEqual(histogram.get()[1], 51)
+
+    def test_sums_the_files_of_other_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry = Registry()
+        requests = registry.counter('requests_total', "Requests.", ('status',))
+        latency = registry.histogram('latency_seconds', "Latency.", buckets=(0.1, 1.0))
+        requests.inc(200)
+        latency.observe(0.05)
+        with override_settings(METRICS_DIR=directory):
+            registry.flush()
+            # Another worker's file, under a pid that isn't ours
+            os.rename(os.path.join(directory, f'{os.getpid()}.json'), os.path.join(directory, '1.json'))
+            requests.inc(200, amount=2)
+            requests.inc(500)
+            latency.observe(5.0)
+            collected = registry.collect()
+            rendered = registry.render()
+        self.assertEqual(collected['requests_total'], {(200,): 4, (500,): 1})
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2', rendered)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 2', rendered)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', rendered)
+        self.assertIn('latency_seconds_count 3', rendered)
+
+    def test_records_celery_runtime_and_queue_wait(self):
+        name = update_search_index.name
+        runs, waits = CELERY_RUNTIME.get(name, 'SUCCESS')[1], CELERY_QUEUE_WAIT.get(name)
+        # No broker or result store here: run eagerly and drop the result
+        with mock.patch.object(update_search_index, '_backend', DisabledBackend(update_search_index.app)):
+            update_search_index.apply(args=('note', 0), headers={'published_at': time.time() - 2})
+        self.assertEqual(CELERY_RUNTIME.get(name, 'SUCCESS')[1], runs + 1)
+        total, count = CELERY_QUEUE_WAIT.get(name)
+        self.assertEqual(count, waits[1] + 1)
+        self.assertGreaterEqual(total - waits[0], 2)
@@ -16,12 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from .swagger_api import schema_view
+from .metrics import metrics_view
+from .openapi import docs_view, schema_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/users/', include('accounts.urls')),
-    path('swagger.<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('content/', include('content_management.urls')),
+    path('swagger.<format>/', schema_view, name='schema-json'),
+    path('swagger/', docs_view, {'ui': 'swagger'}, name='schema-swagger-ui'),
+    path('redoc/', docs_view, {'ui': 'redoc'}, name='schema-redoc'),
+    path('metrics', metrics_view, name='metrics'),
 ]